@@ -0,0 +1,10 @@
+from typing import Optional
+from pydantic import BaseModel, Field
+
+class ChatRequest(BaseModel):
+    message: str = Field(min_length=1)
+    session_id: Optional[str] = Field(default=None, description="Conversation id; omit to start a new session")
+
+class ChatResponse(BaseModel):
+    answer: str
+    session_id: str
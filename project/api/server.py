@@ -0,0 +1,231 @@
+"""Headless HTTP API over one shared ``RAGSystem``.
+
+Run a single worker process (``python project/api_app.py``): the local Qdrant storage allows one
+client per directory, and all requests share the same graph, LLM client, query-embedding cache
+and parent-chunk cache.
+"""
+import asyncio
+import json
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from pathlib import Path
+from fastapi import FastAPI, File, HTTPException, Query, UploadFile
+from fastapi.responses import FileResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from starlette.concurrency import iterate_in_threadpool
+import config
+from api.schemas import ChatRequest, ChatResponse
+from core.rag_system import RAGSystem
+from core.document_manager import DocumentManager
+from core.chat_interface import ChatInterface
+from core.ingest_queue import IngestionJobQueue, SUPPORTED_SUFFIXES
+
+
+def _sse(event: dict) -> str:
+    return f"event: {event['event']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+
+def _parse_batch_line(line: str) -> dict:
+    """A batch line is either a JSON object with ``question`` (and optional ``id``) or a bare JSON string."""
+    item = json.loads(line)
+    if isinstance(item, str):
+        item = {"question": item}
+    if not isinstance(item, dict) or not str(item.get("question") or "").strip():
+        raise ValueError("expected a JSON string or an object with a non-empty 'question'")
+    return item
+
+
+def create_app(rag_system=None) -> FastAPI:
+    if rag_system is None:
+        rag_system = RAGSystem()
+        rag_system.initialize()
+    doc_manager = DocumentManager(rag_system)
+    ingest_queue = IngestionJobQueue(doc_manager)
+    chat_interface = ChatInterface(rag_system)
+    batch_executor = ThreadPoolExecutor(max_workers=config.API_BATCH_MAX_PARALLELISM, thread_name_prefix="rag-batch")
+
+    @asynccontextmanager
+    async def lifespan(app):
+        ingest_queue.start()
+        yield
+        ingest_queue.stop(timeout=5)
+        batch_executor.shutdown(wait=False, cancel_futures=True)
+
+    app = FastAPI(title="Agentic RAG API", lifespan=lifespan)
+    app.state.rag_system = rag_system
+
+    @app.get("/health")
+    def health():
+        return {"status": "ok" if rag_system.agent_graph else "initializing"}
+
+    @app.get("/stats")
+    def stats():
+        return {
+            "llm": rag_system.get_llm_stats(),
+            "routes": rag_system.get_route_stats(),
+            "retrieval_memo": rag_system.get_retrieval_memo_stats(),
+            "answer_cache": rag_system.get_answer_cache_stats(),
+            "embedding_cache": rag_system.get_embedding_cache_stats(),
+            "dedup": rag_system.get_dedup_stats(),
+            "resources": rag_system.get_resource_stats(),
+        }
+
+    @app.post("/chat", response_model=ChatResponse)
+    async def chat(request: ChatRequest):
+        session_id = request.session_id or str(uuid.uuid4())
+        try:
+            answer = await asyncio.to_thread(chat_interface.ask, request.message, session_id)
+        except Exception as e:
+            raise HTTPException(status_code=502, detail=str(e))
+        return ChatResponse(answer=answer, session_id=session_id)
+
+    @app.post("/chat/stream")
+    async def chat_stream(request: ChatRequest):
+        """Server-sent events: ``session``, then ``node``/``token`` progress, then ``answer`` or ``error``."""
+        session_id = request.session_id or str(uuid.uuid4())
+
+        async def events():
+            cancelled = threading.Event()
+            try:
+                yield _sse({"event": "session", "session_id": session_id})
+                async for event in iterate_in_threadpool(chat_interface.stream(request.message, session_id, cancelled)):
+                    yield _sse(event)
+            finally:
+                # 客户端断开时停止后台的图执行
+                cancelled.set()
+
+        return StreamingResponse(events(), media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+    @app.delete("/sessions/{session_id}")
+    async def clear_session(session_id: str):
+        await asyncio.to_thread(chat_interface.clear_session, session_id)
+        return {"cleared": session_id}
+
+    @app.get("/documents")
+    def list_documents(offset: int = Query(0, ge=0), limit: int = Query(50, ge=1, le=500), q: str = ""):
+        documents, total = doc_manager.list_documents(offset=offset, limit=limit, query=q)
+        return {"documents": documents, "total": total}
+
+    @app.post("/documents", status_code=202)
+    async def upload_documents(files: list[UploadFile] = File(...)):
+        """Queue the uploads for background ingestion; poll ``GET /jobs/{job_id}`` for progress."""
+        upload_dir = Path(tempfile.mkdtemp(prefix="rag_upload_"))
+        try:
+            paths = []
+            for upload in files:
+                name = Path(upload.filename or "").name
+                if Path(name).suffix.lower() not in SUPPORTED_SUFFIXES:
+                    continue
+                path = upload_dir / name
+                with path.open("wb") as out:
+                    shutil.copyfileobj(upload.file, out)
+                paths.append(str(path))
+            job_id = await asyncio.to_thread(ingest_queue.submit, paths)
+        except ValueError as e:
+            raise HTTPException(status_code=415, detail=str(e))
+        finally:
+            shutil.rmtree(upload_dir, ignore_errors=True)
+        return ingest_queue.get(job_id)
+
+    @app.delete("/documents")
+    async def clear_documents():
+        await asyncio.to_thread(doc_manager.clear_all)
+        return {"documents": []}
+
+    @app.delete("/documents/{name}")
+    async def remove_document(name: str):
+        if not doc_manager.has_document(name):
+            raise HTTPException(status_code=404, detail=f"Unknown document: {name}")
+        await asyncio.to_thread(doc_manager.remove_document, name)
+        return {"removed": name}
+
+    @app.get("/snapshot")
+    async def download_snapshot():
+        """A portable snapshot of the index (zstd-compressed tar) for warm-starting another node."""
+        snapshot_dir = Path(tempfile.mkdtemp(prefix="rag_snapshot_"))
+        path = snapshot_dir / f"index-{time.strftime('%Y%m%d-%H%M%S')}.tar.zst"
+        try:
+            await asyncio.to_thread(doc_manager.export_snapshot, path)
+        except Exception:
+            shutil.rmtree(snapshot_dir, ignore_errors=True)
+            raise
+        return FileResponse(path, media_type="application/zstd", filename=path.name,
+                            background=BackgroundTask(shutil.rmtree, snapshot_dir, ignore_errors=True))
+
+    @app.get("/jobs")
+    def list_jobs(limit: int = Query(20, ge=1, le=200)):
+        return {"jobs": ingest_queue.list_jobs(limit)}
+
+    @app.get("/jobs/{job_id}")
+    def get_job(job_id: str):
+        job = ingest_queue.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+        return job
+
+    @app.delete("/jobs/{job_id}")
+    def cancel_job(job_id: str):
+        if not ingest_queue.cancel(job_id):
+            raise HTTPException(status_code=409, detail=f"Job {job_id} is not queued or running")
+        return ingest_queue.get(job_id)
+
+    @app.post("/batch")
+    async def batch(
+        file: UploadFile = File(..., description="JSONL, one question per line"),
+        parallelism: int = Query(config.API_BATCH_PARALLELISM, ge=1, le=config.API_BATCH_MAX_PARALLELISM),
+    ):
+        """Answer independent questions concurrently and stream one JSON result per line as each finishes.
+
+        Every result carries the input line ``index``; results arrive in completion order.
+        """
+        lines = (await file.read()).decode("utf-8-sig").splitlines()
+        loop = asyncio.get_running_loop()
+
+        async def answer_one(index, line):
+            start = time.perf_counter()
+            record = {"index": index}
+            try:
+                item = _parse_batch_line(line)
+            except ValueError as e:
+                return {**record, "error": f"invalid line: {e}"}
+            record.update(id=item.get("id", index), question=item["question"])
+            # 每个问题使用独立会话，答完即释放对话记忆
+            session_id = f"batch-{uuid.uuid4()}"
+            try:
+                record["answer"] = await loop.run_in_executor(batch_executor, chat_interface.ask, item["question"], session_id)
+            except Exception as e:
+                record["error"] = str(e)
+            finally:
+                await loop.run_in_executor(batch_executor, chat_interface.clear_session, session_id)
+            record["latency_ms"] = round(1000 * (time.perf_counter() - start), 1)
+            return record
+
+        async def results():
+            pending = set()
+            try:
+                for index, line in enumerate(lines):
+                    if not line.strip():
+                        continue
+                    if len(pending) >= parallelism:
+                        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                        for task in done:
+                            yield json.dumps(task.result(), ensure_ascii=False) + "\n"
+                    pending.add(asyncio.create_task(answer_one(index, line)))
+                while pending:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        yield json.dumps(task.result(), ensure_ascii=False) + "\n"
+            finally:
+                # 客户端断开时不再启动新的问题
+                for task in pending:
+                    task.cancel()
+
+        return StreamingResponse(results(), media_type="application/x-ndjson")
+
+    return app
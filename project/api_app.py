@@ -0,0 +1,11 @@
+import uvicorn
+import config
+import telemetry
+from api.server import create_app
+
+
+if __name__ == "__main__":
+    if config.METRICS_PORT:
+        telemetry.start_metrics_server(config.METRICS_PORT)
+    print(f"\n启动：HTTP API（http://{config.API_HOST}:{config.API_PORT}/docs）...")
+    uvicorn.run(create_app(), host=config.API_HOST, port=config.API_PORT, workers=1)
@@ -4,6 +4,8 @@ import gradio as gr
 from ui.css import custom_css
 from ui.gradio_app import create_gradio_ui
 from pathlib import Path
+import config
+import telemetry
 
 
 def _print_ocr_status() -> None:
@@ -39,7 +41,10 @@ def _print_ocr_status() -> None:
 
 if __name__ == "__main__":
     _print_ocr_status()
+    if config.METRICS_PORT:
+        telemetry.start_metrics_server(config.METRICS_PORT)
     demo = create_gradio_ui()
+    demo.queue(default_concurrency_limit=config.GRADIO_CONCURRENCY_LIMIT)
     print("\n启动：智慧问答助手 ...")
     repo_root = Path(__file__).resolve().parent.parent
     favicon = repo_root / "assets" / "logo_replace.png"
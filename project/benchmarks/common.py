@@ -0,0 +1,99 @@
+"""Synthetic corpus and small measurement helpers shared by the benchmarks."""
+import os
+import random
+import resource
+import sys
+from collections import namedtuple
+from pathlib import Path
+
+PRODUCTS = ["pump", "controller", "valve", "sensor", "compressor", "inverter", "router", "turbine"]
+ATTRIBUTES = ["warranty period", "operating temperature", "rated voltage", "maintenance interval",
+              "maximum pressure", "firmware version", "certification", "service contact"]
+# Query wordings that share few terms with the document text, to separate dense from sparse retrieval.
+PARAPHRASES = {
+    "warranty period": "How long is the {product} M{doc} covered by the manufacturer guarantee?",
+    "operating temperature": "How hot can the {product} M{doc} get while running?",
+    "rated voltage": "What power supply does the {product} M{doc} need?",
+    "maintenance interval": "How often does the {product} M{doc} need servicing?",
+    "maximum pressure": "What is the highest load the {product} M{doc} withstands?",
+    "firmware version": "Which software release runs on the {product} M{doc}?",
+    "certification": "Which standards approve the {product} M{doc}?",
+    "service contact": "Who do I call for repairs on the {product} M{doc}?",
+}
+FILLER = ("installation procedure requires qualified personnel and the enclosure must remain sealed "
+          "during operation while periodic inspection records are kept by the site operator").split()
+
+Fact = namedtuple("Fact", ["doc", "product", "attribute", "value"])
+
+
+def percentile(values, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))]
+
+
+def build_corpus(directory: Path, docs: int, seed: int, filler_words=(80, 160)) -> tuple:
+    """Write ``docs`` Markdown manuals; returns (paths, facts). Every fact value is a unique token."""
+    rng = random.Random(seed)
+    directory.mkdir(parents=True, exist_ok=True)
+    paths, facts = [], []
+    for d in range(docs):
+        lines = [f"# Technical manual {d}", ""]
+        for product in rng.sample(PRODUCTS, 3):
+            lines += [f"## The {product} model M{d}", ""]
+            for attribute in rng.sample(ATTRIBUTES, 4):
+                value = f"VAL{d:04d}{PRODUCTS.index(product)}{ATTRIBUTES.index(attribute)}"
+                facts.append(Fact(d, product, attribute, value))
+                filler = " ".join(rng.choice(FILLER) for _ in range(rng.randint(*filler_words)))
+                lines += [f"### {attribute.title()}", "",
+                          f"The {attribute} of the {product} model M{d} is {value}. {filler}.", ""]
+        path = directory / f"manual_{d:04d}.md"
+        path.write_text("\n".join(lines), encoding="utf-8")
+        paths.append(str(path))
+    return paths, facts
+
+
+def build_queries(facts, count: int, seed: int, paraphrase_ratio: float = 0.0, compound_every: int = 0) -> list:
+    """Labelled queries as (query, expected fact values)."""
+    rng = random.Random(seed + 1)
+    queries = []
+    for i in range(count):
+        fact = rng.choice(facts)
+        if rng.random() < paraphrase_ratio:
+            query = PARAPHRASES[fact.attribute].format(product=fact.product, doc=fact.doc)
+        else:
+            query = f"What is the {fact.attribute} of the {fact.product} model M{fact.doc}?"
+        expected = [fact.value]
+        if compound_every and i % compound_every == compound_every - 1:
+            siblings = [f for f in facts if f.doc == fact.doc and f.product == fact.product and f != fact]
+            if siblings:
+                other = rng.choice(siblings)
+                query = query.rstrip("?") + f" and what is its {other.attribute}?"
+                expected.append(other.value)
+        queries.append((query, expected))
+    return queries
+
+
+def rss_bytes() -> int:
+    """Current resident set size (falls back to the peak where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def peak_rss_bytes() -> int:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def cpu_seconds() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def dir_size_bytes(path) -> int:
+    return sum(p.stat().st_size for p in Path(path).rglob("*") if p.is_file())
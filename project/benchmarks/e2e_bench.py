@@ -0,0 +1,198 @@
+"""Offline end-to-end benchmark: synthetic corpus, real ingestion and retrieval, scripted LLM.
+
+    cd project && python -m benchmarks.e2e_bench --docs 20 --queries 60
+    cd project && python -m benchmarks.e2e_bench --save-baseline benchmarks/e2e_baseline.json
+    cd project && python -m benchmarks.e2e_bench --baseline ci_baseline.json --tolerance 0.25
+
+Everything runs in a throw-away working directory (Qdrant, parent store, Markdown copies).
+The LLM is replaced by ScriptedChatModel, so the numbers cover graph overhead, embeddings,
+Qdrant, parent-store I/O and tool plumbing without network jitter. Stage timings come from
+the telemetry spans (node.*, tool.*, llm.*, embedding.*, qdrant.*, parent_store.*, ingest.*).
+Every run is compared against benchmarks/e2e_baseline.json (or --baseline) and exits with
+code 1 if a metric is slower than the baseline by more than the tolerance. Timings depend on
+the machine, so the baseline is not shipped: when it does not exist yet, the first run
+records itself as the baseline and later runs on the same machine are checked against it.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from benchmarks.common import build_corpus, build_queries, percentile
+
+DEFAULT_BASELINE = Path(__file__).with_name("e2e_baseline.json")
+
+
+class StageTimer:
+    """Collects wall-clock samples per stage from finished telemetry spans."""
+
+    def __init__(self):
+        self.__samples = {}
+        self.__lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float) -> None:
+        with self.__lock:
+            self.__samples.setdefault(stage, []).append(seconds)
+
+    def on_span(self, span) -> None:
+        self.record(span.name, span.duration_seconds)
+
+    def reset(self) -> None:
+        with self.__lock:
+            self.__samples.clear()
+
+    def summary(self) -> dict:
+        with self.__lock:
+            samples = {stage: list(values) for stage, values in self.__samples.items()}
+        return {
+            stage: {
+                "n": len(values),
+                "mean_ms": 1000 * sum(values) / len(values),
+                "p50_ms": 1000 * percentile(values, 50),
+                "p95_ms": 1000 * percentile(values, 95),
+                "total_s": sum(values),
+            }
+            for stage, values in sorted(samples.items())
+        }
+
+
+def compare(results: dict, baseline: dict, tolerance: float, min_ms: float) -> list:
+    """Return (metric, baseline_ms, current_ms) tuples that regressed beyond ``tolerance``."""
+    pairs = [(f"e2e.{k}", baseline.get("e2e", {}).get(k), results["e2e"].get(k)) for k in ("p50_ms", "p95_ms", "p99_ms")]
+    for stage, entry in baseline.get("stages", {}).items():
+        current = results["stages"].get(stage)
+        if current is not None:
+            pairs.append((f"{stage}.mean_ms", entry.get("mean_ms"), current["mean_ms"]))
+    return [
+        (metric, old, new) for metric, old, new in pairs
+        if old is not None and new is not None and old >= min_ms and new > old * (1 + tolerance)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=20)
+    parser.add_argument("--queries", type=int, default=60)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Simulated seconds per scripted LLM call")
+    parser.add_argument("--seed", type=int, default=13)
+    parser.add_argument("--workdir", default="", help="Working directory (default: a fresh temp dir)")
+    parser.add_argument("--keep", action="store_true", help="Keep the working directory afterwards")
+    parser.add_argument("--output", default="", help="Write the results JSON here")
+    parser.add_argument("--trace-file", default="", help="Also export OTLP/JSON spans to this file")
+    parser.add_argument("--baseline", default=str(DEFAULT_BASELINE),
+                        help="Compare against this results JSON; recorded from this run if it does not exist")
+    parser.add_argument("--no-baseline", action="store_true", help="Skip the baseline comparison")
+    parser.add_argument("--save-baseline", default="", help="Store the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative slowdown vs. baseline")
+    parser.add_argument("--min-ms", type=float, default=1.0, help="Ignore baseline metrics faster than this")
+    args = parser.parse_args()
+
+    workdir = Path(args.workdir or tempfile.mkdtemp(prefix="rag_e2e_")).resolve()
+    # Paths are read by config at import time, so they must be set before the project imports below.
+    os.environ["MARKDOWN_DIR"] = str(workdir / "markdown_docs")
+    os.environ["PARENT_STORE_PATH"] = str(workdir / "parent_store")
+    os.environ["QDRANT_DB_PATH"] = str(workdir / "qdrant_db")
+    os.environ["DOCUMENT_CATALOG_PATH"] = str(workdir / "catalog.sqlite")
+    os.environ.setdefault("LLM_CACHE_ENABLED", "false")
+    os.environ.setdefault("ANSWER_CACHE_ENABLED", "false")
+    # Queries repeat across runs and warm-up; cached query embeddings would hide the embedding cost.
+    os.environ["QUERY_EMBEDDING_CACHE_SIZE"] = "0"
+
+    from langchain_core.messages import HumanMessage
+    import telemetry
+    from benchmarks.scripted_llm import ScriptedChatModel
+    from core.rag_system import RAGSystem
+    from core.document_manager import DocumentManager
+
+    timer = StageTimer()
+    tracer = telemetry.configure(enabled=True, export_path=args.trace_file)
+    tracer.add_listener(timer.on_span)
+
+    try:
+        rag = RAGSystem()
+        rag.initialize(llm=ScriptedChatModel(latency_seconds=args.llm_latency))
+        manager = DocumentManager(rag)
+
+        corpus, facts = build_corpus(workdir / "corpus", args.docs, args.seed)
+        start = time.perf_counter()
+        added, skipped = manager.add_documents(corpus)
+        ingest_seconds = time.perf_counter() - start
+        print(f"Ingested {added} documents ({skipped} skipped) in {ingest_seconds:.2f}s")
+
+        def run_query(query):
+            request_id = uuid.uuid4().hex
+            run_config = rag.get_config(request_id, thread_id=str(uuid.uuid4()))
+            started = time.perf_counter()
+            try:
+                with telemetry.span("request", request_id=request_id, thread_id=run_config["configurable"]["thread_id"]):
+                    rag.agent_graph.invoke({"messages": [HumanMessage(content=query)]}, run_config)
+            finally:
+                rag.end_request(request_id)
+            return time.perf_counter() - started
+
+        queries = [q for q, _ in build_queries(facts, args.warmup + args.queries, args.seed, compound_every=4)]
+        for query in queries[:args.warmup]:
+            run_query(query)
+        # Warm-up samples are dropped so the stage table reflects steady state only.
+        timer.reset()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max(1, args.concurrency)) as pool:
+            latencies = list(pool.map(run_query, queries[args.warmup:]))
+        elapsed = time.perf_counter() - start
+    finally:
+        tracer.flush()
+        if not args.keep and not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    results = {
+        "config": {k: getattr(args, k) for k in ("docs", "queries", "concurrency", "llm_latency", "seed")},
+        "ingest": {"documents": added, "seconds": ingest_seconds},
+        "e2e": {
+            "n": len(latencies),
+            "mean_ms": 1000 * sum(latencies) / len(latencies) if latencies else 0.0,
+            "p50_ms": 1000 * percentile(latencies, 50),
+            "p95_ms": 1000 * percentile(latencies, 95),
+            "p99_ms": 1000 * percentile(latencies, 99),
+            "throughput_qps": len(latencies) / elapsed if elapsed else 0.0,
+        },
+        "stages": timer.summary(),
+    }
+
+    e2e = results["e2e"]
+    print(f"\nend-to-end: n={e2e['n']} p50={e2e['p50_ms']:.1f}ms p95={e2e['p95_ms']:.1f}ms "
+          f"p99={e2e['p99_ms']:.1f}ms throughput={e2e['throughput_qps']:.2f} q/s")
+    print(f"{'stage':<32}{'n':>7}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'total s':>10}")
+    for stage, s in results["stages"].items():
+        print(f"{stage:<32}{s['n']:>7}{s['mean_ms']:>10.2f}{s['p50_ms']:>10.2f}{s['p95_ms']:>10.2f}{s['total_s']:>10.2f}")
+
+    for target in (args.output, args.save_baseline):
+        if target:
+            Path(target).write_text(json.dumps(results, indent=2), encoding="utf-8")
+            print(f"Results written to {target}")
+
+    if args.no_baseline or args.save_baseline or not args.baseline:
+        return
+    baseline_path = Path(args.baseline)
+    if not baseline_path.exists():
+        baseline_path.write_text(json.dumps(results, indent=2), encoding="utf-8")
+        print(f"No baseline at {baseline_path}; recorded this run as the baseline")
+        return
+    baseline = json.loads(baseline_path.read_text(encoding="utf-8"))
+    regressions = compare(results, baseline, args.tolerance, args.min_ms)
+    for metric, old, new in regressions:
+        print(f"REGRESSION: {metric} {old:.2f}ms -> {new:.2f}ms (+{100 * (new / old - 1):.0f}%)")
+    if regressions:
+        sys.exit(1)
+    print(f"No regressions beyond {100 * args.tolerance:.0f}% against {baseline_path}")
+
+if __name__ == "__main__":
+    main()
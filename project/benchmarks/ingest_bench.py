@@ -0,0 +1,306 @@
+"""Ingestion throughput benchmark with a per-stage, per-document breakdown.
+
+    cd project && python -m benchmarks.ingest_bench --docs 50
+    cd project && python -m benchmarks.ingest_bench --inputs ~/papers --per-doc --profile cprofile
+
+Runs the documents through the real ``DocumentManager.add_documents`` path in a throw-away
+working directory. Wall time, CPU time and peak RSS are recorded per stage (conversion,
+header split, merge/split/clean passes, child split, dense and sparse embedding, Qdrant
+upsert and parent-store writes) and per document, using telemetry spans plus a background
+RSS sampler. ``--profile`` re-runs the hottest stage alone under cProfile or pyinstrument
+and writes the profile to ``--profile-dir``. ``--chunking-mode`` selects character or
+token-budget child splitting; the child-chunk token distribution (and how many chunks the
+dense model would truncate) is reported either way.
+"""
+import argparse
+import bisect
+import cProfile
+import json
+import os
+import pstats
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+from benchmarks.common import build_corpus, rss_bytes, peak_rss_bytes, cpu_seconds
+
+# Stages shown in the breakdown; qdrant.upsert is derived as ingest.index minus its embedding calls.
+STAGES = [
+    "ingest.convert", "chunk.header_split", "chunk.merge_small", "chunk.split_large", "chunk.clean_small",
+    "chunk.children", "chunk.token_count", "embedding.dense.documents", "embedding.sparse.documents", "qdrant.upsert",
+    "ingest.parent_store",
+]
+# Top-level stages a profile can target.
+PROFILE_STAGES = ["ingest.convert", "ingest.chunk", "ingest.index", "ingest.parent_store"]
+
+
+class RSSSampler(threading.Thread):
+    """Samples resident memory so each span can be given the peak RSS seen while it ran."""
+
+    def __init__(self, interval=0.01):
+        super().__init__(daemon=True, name="rss-sampler")
+        self.interval = interval
+        self.samples = []
+        self.__stop = threading.Event()
+
+    def run(self):
+        while not self.__stop.is_set():
+            self.samples.append((time.time_ns(), rss_bytes()))
+            self.__stop.wait(self.interval)
+
+    def stop(self):
+        self.__stop.set()
+        self.join()
+
+    def peak_between(self, start_ns: int, end_ns: int) -> int:
+        lo = bisect.bisect_left(self.samples, (start_ns, -1))
+        hi = bisect.bisect_right(self.samples, (end_ns, float("inf")))
+        if lo < hi:
+            return max(rss for _, rss in self.samples[lo:hi])
+        # Shorter than the sampling interval: use the last sample taken before it started.
+        return self.samples[lo - 1][1] if lo > 0 else 0
+
+
+class SpanCollector:
+    def __init__(self):
+        self.spans = []
+        self.__lock = threading.Lock()
+
+    def on_span(self, span) -> None:
+        with self.__lock:
+            self.spans.append(span)
+
+
+def _document_of(span, by_id) -> str:
+    current = span
+    while current is not None:
+        if current.name == "ingest.document":
+            return current.attributes.get("document", "")
+        current = by_id.get(current.parent_id)
+    return ""
+
+
+def breakdown(spans, sampler: RSSSampler) -> dict:
+    """Per-document stage totals: {document: {stage: {wall_s, cpu_s, peak_rss_bytes}}}."""
+    by_id = {s.span_id: s for s in spans}
+    documents = {}
+    for span in spans:
+        document = _document_of(span, by_id)
+        if not document:
+            continue
+        stages = documents.setdefault(document, {})
+        entry = stages.setdefault(span.name, {"wall_s": 0.0, "cpu_s": 0.0, "peak_rss_bytes": 0})
+        entry["wall_s"] += span.duration_seconds
+        entry["cpu_s"] += span.attributes.get("cpu_seconds", 0.0)
+        entry["peak_rss_bytes"] = max(entry["peak_rss_bytes"], sampler.peak_between(span.start_ns, span.end_ns))
+        for key in ("parent_chunks", "child_chunks"):
+            if key in span.attributes:
+                stages.setdefault("_counts", {})[key] = span.attributes[key]
+
+    for stages in documents.values():
+        index = stages.get("ingest.index")
+        if index is not None:
+            embeddings = [stages[n] for n in ("embedding.dense.documents", "embedding.sparse.documents") if n in stages]
+            stages["qdrant.upsert"] = {
+                "wall_s": max(0.0, index["wall_s"] - sum(e["wall_s"] for e in embeddings)),
+                "cpu_s": max(0.0, index["cpu_s"] - sum(e["cpu_s"] for e in embeddings)),
+                "peak_rss_bytes": index["peak_rss_bytes"],
+            }
+    return documents
+
+
+def _collect_inputs(inputs) -> list:
+    paths = []
+    for raw in inputs:
+        path = Path(raw).expanduser()
+        if path.is_dir():
+            paths += sorted(p for p in path.rglob("*") if p.suffix.lower() in (".pdf", ".md"))
+        elif path.suffix.lower() in (".pdf", ".md"):
+            paths.append(path)
+    return [str(p) for p in paths]
+
+
+def profile_stage(stage: str, rag, input_paths, workdir: Path, profiler: str, profile_dir: Path) -> Path:
+    """Re-run one stage over all documents under a profiler and write the result."""
+    import config
+    from db.parent_store_manager import ParentStoreManager
+    from util import pdf_to_markdown
+
+    md_paths = sorted(Path(config.MARKDOWN_DIR).glob("*.md"))
+    scratch = workdir / "profile_scratch"
+    scratch.mkdir(parents=True, exist_ok=True)
+    chunked = [rag.chunker.create_chunks_single(p) for p in md_paths] if stage in ("ingest.index", "ingest.parent_store") else []
+
+    def work():
+        if stage == "ingest.convert":
+            for path in input_paths:
+                if path.lower().endswith(".pdf"):
+                    pdf_to_markdown(path, scratch)
+                else:
+                    shutil.copy(path, scratch / Path(path).name)
+        elif stage == "ingest.chunk":
+            for path in md_paths:
+                rag.chunker.create_chunks_single(path)
+        elif stage == "ingest.index":
+            rag.vector_db.create_collection("ingest_bench_profile")
+            collection = rag.vector_db.get_collection("ingest_bench_profile")
+            for _, children in chunked:
+                collection.add_documents(children)
+        elif stage == "ingest.parent_store":
+            store = ParentStoreManager(store_path=scratch / "parent_store")
+            for parents, _ in chunked:
+                store.save_many(parents)
+
+    profile_dir.mkdir(parents=True, exist_ok=True)
+    if profiler == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            print("pyinstrument is not installed; falling back to cProfile")
+            profiler = "cprofile"
+    if profiler == "pyinstrument":
+        prof = Profiler()
+        prof.start()
+        work()
+        prof.stop()
+        target = profile_dir / f"{stage}.html"
+        target.write_text(prof.output_html(), encoding="utf-8")
+        print(prof.output_text(unicode=True, color=False))
+    else:
+        prof = cProfile.Profile()
+        prof.runcall(work)
+        target = profile_dir / f"{stage}.prof"
+        prof.dump_stats(str(target))
+        pstats.Stats(prof).sort_stats("cumulative").print_stats(25)
+    if stage == "ingest.index":
+        rag.vector_db.delete_collection("ingest_bench_profile")
+    return target
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--inputs", nargs="*", default=[], help="PDF/Markdown files or directories (default: synthetic corpus)")
+    parser.add_argument("--docs", type=int, default=30, help="Synthetic documents to generate")
+    parser.add_argument("--doc-scale", type=int, default=1, help="Multiplies the filler text per synthetic section")
+    parser.add_argument("--seed", type=int, default=13)
+    parser.add_argument("--per-doc", action="store_true", help="Print the per-document breakdown")
+    parser.add_argument("--profile", choices=["none", "cprofile", "pyinstrument"], default="none")
+    parser.add_argument("--profile-stage", choices=PROFILE_STAGES, default=None, help="Stage to profile (default: hottest)")
+    parser.add_argument("--profile-dir", default="ingest_profiles")
+    parser.add_argument("--chunking-mode", choices=["chars", "tokens"], default=None, help="Override CHUNKING_MODE")
+    parser.add_argument("--output", default="", help="Write the JSON report here")
+    parser.add_argument("--workdir", default="", help="Working directory (default: a fresh temp dir)")
+    args = parser.parse_args()
+
+    workdir = Path(args.workdir or tempfile.mkdtemp(prefix="rag_ingest_")).resolve()
+    # Paths are read by config at import time, so they must be set before the project imports below.
+    os.environ["MARKDOWN_DIR"] = str(workdir / "markdown_docs")
+    os.environ["PARENT_STORE_PATH"] = str(workdir / "parent_store")
+    os.environ["QDRANT_DB_PATH"] = str(workdir / "qdrant_db")
+    os.environ["DOCUMENT_CATALOG_PATH"] = str(workdir / "catalog.sqlite")
+    os.environ["CHUNK_TOKEN_STATS"] = "true"
+    if args.chunking_mode:
+        os.environ["CHUNKING_MODE"] = args.chunking_mode
+
+    import telemetry
+    from core.rag_system import RAGSystem
+    from core.document_manager import DocumentManager
+
+    collector = SpanCollector()
+    tracer = telemetry.configure(enabled=True, export_path="", capture_resources=True)
+    tracer.add_listener(collector.on_span)
+    sampler = RSSSampler()
+
+    try:
+        if args.inputs:
+            input_paths = _collect_inputs(args.inputs)
+        else:
+            scale = max(1, args.doc_scale)
+            input_paths, _ = build_corpus(workdir / "corpus", args.docs, args.seed, filler_words=(80 * scale, 160 * scale))
+        if not input_paths:
+            parser.error("no PDF or Markdown inputs found")
+
+        rag = RAGSystem()
+        rag.vector_db.create_collection(rag.collection_name)
+        manager = DocumentManager(rag)
+
+        sampler.start()
+        rss_before, cpu_before, start = rss_bytes(), cpu_seconds(), time.perf_counter()
+        added, skipped = manager.add_documents(input_paths)
+        wall = time.perf_counter() - start
+        cpu = cpu_seconds() - cpu_before
+        sampler.stop()
+
+        documents = breakdown(collector.spans, sampler)
+        child_chunks = sum(d.get("_counts", {}).get("child_chunks", 0) for d in documents.values())
+        parent_chunks = sum(d.get("_counts", {}).get("parent_chunks", 0) for d in documents.values())
+
+        totals = {}
+        for stages in documents.values():
+            for stage in STAGES + PROFILE_STAGES:
+                entry = stages.get(stage)
+                if entry is None:
+                    continue
+                total = totals.setdefault(stage, {"wall_s": 0.0, "cpu_s": 0.0, "peak_rss_bytes": 0})
+                total["wall_s"] += entry["wall_s"]
+                total["cpu_s"] += entry["cpu_s"]
+                total["peak_rss_bytes"] = max(total["peak_rss_bytes"], entry["peak_rss_bytes"])
+
+        print(f"\n{added} documents ingested ({skipped} skipped), {parent_chunks} parents, {child_chunks} child chunks")
+        print(f"wall={wall:.2f}s cpu={cpu:.2f}s docs/s={added / wall:.2f} chunks/s={child_chunks / wall:.1f} "
+              f"rss: start={rss_before / 2**20:.0f}MB peak={peak_rss_bytes() / 2**20:.0f}MB")
+        print(f"\n{'stage':<30}{'wall s':>9}{'cpu s':>9}{'share':>8}{'peak RSS MB':>13}")
+        for stage in STAGES:
+            if stage in totals:
+                t = totals[stage]
+                print(f"{stage:<30}{t['wall_s']:>9.2f}{t['cpu_s']:>9.2f}{100 * t['wall_s'] / wall:>7.1f}%{t['peak_rss_bytes'] / 2**20:>13.0f}")
+
+        token_stats = rag.chunker.token_stats.stats()
+        if token_stats["chunks"]:
+            print(f"\nchild tokens ({rag.chunker.chunking_mode} mode): p50={token_stats['p50']} p90={token_stats['p90']} "
+                  f"p99={token_stats['p99']} max={token_stats['max']} fill={100 * token_stats['fill_ratio']:.0f}% "
+                  f"truncated={token_stats['truncated_chunks']} chunks / {token_stats['truncated_tokens']} tokens "
+                  f"(limit {token_stats['max_tokens']})")
+
+        if args.per_doc:
+            for document, stages in sorted(documents.items()):
+                cells = ", ".join(f"{s}={stages[s]['wall_s'] * 1000:.0f}ms" for s in STAGES if s in stages)
+                print(f"  {document}: {cells}")
+
+        report = {
+            "config": {k: getattr(args, k) for k in ("docs", "doc_scale", "seed")} | {"inputs": len(input_paths)},
+            "documents_added": added,
+            "documents_skipped": skipped,
+            "parent_chunks": parent_chunks,
+            "child_chunks": child_chunks,
+            "wall_s": wall,
+            "cpu_s": cpu,
+            "docs_per_s": added / wall if wall else 0.0,
+            "chunks_per_s": child_chunks / wall if wall else 0.0,
+            "peak_rss_bytes": peak_rss_bytes(),
+            "stages": totals,
+            "chunking_mode": rag.chunker.chunking_mode,
+            "child_tokens": token_stats,
+            "documents": {d: {s: v for s, v in stages.items() if s != "_counts"} for d, stages in documents.items()},
+        }
+
+        if args.profile != "none":
+            stage = args.profile_stage or max(
+                (s for s in PROFILE_STAGES if s in totals), key=lambda s: totals[s]["wall_s"])
+            print(f"\nProfiling hottest stage: {stage}")
+            report["profile"] = str(profile_stage(stage, rag, input_paths, workdir, args.profile, Path(args.profile_dir)))
+            print(f"Profile written to {report['profile']}")
+
+        if args.output:
+            Path(args.output).write_text(json.dumps(report, indent=2), encoding="utf-8")
+            print(f"Report written to {args.output}")
+    finally:
+        if sampler.is_alive():
+            sampler.stop()
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
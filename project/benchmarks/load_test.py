@@ -0,0 +1,248 @@
+"""Concurrent multi-user load test with a local mock LLM.
+
+    cd project && python -m benchmarks.load_test --levels 1 2 4 8 16 --duration 30
+    cd project && python -m benchmarks.load_test --target http --url http://127.0.0.1:7860 --mock-port 8900
+
+``inproc`` (default) ingests a synthetic corpus into a throw-away working directory and
+drives ``ChatInterface.chat`` directly, with the DeepSeek client pointed at an in-process
+mock server. ``http`` drives a running app through its Gradio ``/chat`` endpoint; start the
+app with ``DEEPSEEK_BASE_URL=http://127.0.0.1:<mock-port>/v1 DEEPSEEK_API_KEY=mock`` and
+pass ``--mock-port`` so this script serves the mock LLM there.
+
+Each simulated user runs multi-turn conversations (a question, then follow-ups that refer
+back to it) in its own session, with exponential think time between turns. Concurrency is
+stepped through ``--levels``; for each level the script reports throughput, p50/p99 turn
+latency, error rate and memory growth, and finally the saturation point: the last level
+that still raised throughput by ``--min-gain`` while keeping p99 under ``--slo-ms``.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+from benchmarks.common import build_corpus, percentile, rss_bytes
+from benchmarks.mock_openai_server import MockOpenAIServer, LatencyModel, rag_responder
+
+FOLLOW_UPS = [
+    "And what is its {attribute}?",
+    "What about the {attribute} of that model?",
+    "Can you also tell me its {attribute}?",
+]
+
+
+def conversation_script(facts, rng: random.Random, turns: int) -> list:
+    fact = rng.choice(facts)
+    script = [f"What is the {fact.attribute} of the {fact.product} model M{fact.doc}?"]
+    siblings = [f for f in facts if f.doc == fact.doc and f.product == fact.product and f != fact]
+    for _ in range(turns - 1):
+        other = rng.choice(siblings) if siblings else fact
+        script.append(rng.choice(FOLLOW_UPS).format(attribute=other.attribute))
+    return script
+
+
+class InProcessSession:
+    def __init__(self, chat_interface):
+        self.chat_interface = chat_interface
+        self.session_id = str(uuid.uuid4())
+        self.history = []
+
+    def send(self, message: str) -> str:
+        answer = self.chat_interface.chat(message, self.history, session_id=self.session_id)
+        self.history += [{"role": "user", "content": message}, {"role": "assistant", "content": answer}]
+        return answer
+
+    def close(self) -> None:
+        self.chat_interface.clear_session(self.session_id)
+
+
+class HttpSession:
+    """One gradio_client per simulated user, so each gets its own session state (thread id)."""
+
+    def __init__(self, url: str):
+        from gradio_client import Client
+        self.client = Client(url, verbose=False)
+        self.history = []
+
+    def send(self, message: str) -> str:
+        _, self.history, _ = self.client.predict(message, self.history, api_name="/chat")
+        last = self.history[-1] if self.history else {}
+        return last.get("content", "") if isinstance(last, dict) else str(last)
+
+    def close(self) -> None:
+        try:
+            self.client.predict(api_name="/clear_chat")
+        except Exception:
+            pass
+
+
+def _is_error(answer: str) -> bool:
+    return not answer or answer.startswith(("❌", "⚠️"))
+
+
+def run_level(make_session, facts, sessions: int, duration: float, turns: int, think_time: float, seed: int,
+              server_rss=rss_bytes) -> dict:
+    latencies, errors, lock = [], [], threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def user(index):
+        rng = random.Random(seed * 1000 + index)
+        while True:
+            session = make_session()
+            try:
+                for message in conversation_script(facts, rng, turns):
+                    if time.perf_counter() >= deadline:
+                        return
+                    start = time.perf_counter()
+                    try:
+                        failed = _is_error(session.send(message))
+                    except Exception as e:
+                        failed = repr(e)
+                    with lock:
+                        latencies.append(time.perf_counter() - start)
+                        if failed:
+                            errors.append(failed)
+                    if think_time > 0:
+                        time.sleep(rng.expovariate(1 / think_time))
+            finally:
+                session.close()
+            if duration <= 0:
+                return
+
+    rss_start, start = server_rss(), time.perf_counter()
+    threads = [threading.Thread(target=user, args=(i,), daemon=True) for i in range(sessions)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    rss_end = server_rss()
+
+    n = len(latencies)
+    return {
+        "sessions": sessions,
+        "turns": n,
+        "errors": len(errors),
+        "error_rate": len(errors) / n if n else 0.0,
+        "throughput_tps": n / elapsed if elapsed else 0.0,
+        "p50_ms": 1000 * percentile(latencies, 50),
+        "p99_ms": 1000 * percentile(latencies, 99),
+        "rss_start_bytes": rss_start,
+        "rss_growth_bytes": rss_end - rss_start,
+        "sample_errors": [str(e)[:200] for e in errors[:3]],
+    }
+
+
+def saturation_point(levels, min_gain: float, slo_ms: float):
+    best = None
+    for level in levels:
+        if slo_ms and level["p99_ms"] > slo_ms:
+            break
+        if best is not None and level["throughput_tps"] < best["throughput_tps"] * (1 + min_gain):
+            break
+        best = level
+    return best["sessions"] if best else None
+
+
+def _process_rss(pid: int):
+    def read():
+        try:
+            with open(f"/proc/{pid}/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError, IndexError):
+            return 0
+    return read
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", choices=["inproc", "http"], default="inproc")
+    parser.add_argument("--url", default="http://127.0.0.1:7860", help="Gradio app URL for --target http")
+    parser.add_argument("--server-pid", type=int, default=0, help="PID of the app for RSS tracking with --target http")
+    parser.add_argument("--mock-port", type=int, default=0, help="Port for the mock LLM (0 = ephemeral, inproc only)")
+    parser.add_argument("--levels", nargs="+", type=int, default=[1, 2, 4, 8, 16])
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds per level (0 = one conversation per user)")
+    parser.add_argument("--turns", type=int, default=3, help="Turns per conversation")
+    parser.add_argument("--think-time", type=float, default=0.5, help="Mean seconds between turns")
+    parser.add_argument("--median-latency", type=float, default=0.4, help="Mock LLM median latency in seconds")
+    parser.add_argument("--sigma", type=float, default=0.6, help="Log-normal sigma of the mock LLM latency")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0, help="Fraction of mock LLM calls answered with 429")
+    parser.add_argument("--docs", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=13)
+    parser.add_argument("--min-gain", type=float, default=0.1, help="Throughput gain a level must add to count as scaling")
+    parser.add_argument("--slo-ms", type=float, default=0.0, help="p99 latency objective (0 = none)")
+    parser.add_argument("--output", default="", help="Write the JSON report here")
+    args = parser.parse_args()
+
+    mock = MockOpenAIServer(
+        port=args.mock_port,
+        latency=LatencyModel(args.median_latency, args.sigma, seed=args.seed),
+        error_rate=args.llm_error_rate,
+        responder=rag_responder,
+        seed=args.seed,
+    ).start()
+    print(f"Mock LLM listening on {mock.base_url}")
+
+    workdir = Path(tempfile.mkdtemp(prefix="rag_load_")).resolve()
+    corpus, facts = build_corpus(workdir / "corpus", args.docs, args.seed)
+    try:
+        if args.target == "inproc":
+            # Paths and the LLM endpoint are read by config at import time.
+            os.environ.update({
+                "MARKDOWN_DIR": str(workdir / "markdown_docs"),
+                "PARENT_STORE_PATH": str(workdir / "parent_store"),
+                "QDRANT_DB_PATH": str(workdir / "qdrant_db"),
+                "DOCUMENT_CATALOG_PATH": str(workdir / "catalog.sqlite"),
+                "DEEPSEEK_BASE_URL": mock.base_url,
+                "DEEPSEEK_API_KEY": "mock",
+            })
+            from core.rag_system import RAGSystem
+            from core.document_manager import DocumentManager
+            from core.chat_interface import ChatInterface
+
+            rag = RAGSystem()
+            rag.initialize()
+            DocumentManager(rag).add_documents(corpus)
+            chat_interface = ChatInterface(rag)
+            make_session, server_rss = (lambda: InProcessSession(chat_interface)), rss_bytes
+        else:
+            # The remote app needs documents whose facts match the scripts; upload the corpus there first.
+            print(f"Synthetic corpus for the remote app: {workdir / 'corpus'}")
+            make_session = lambda: HttpSession(args.url)
+            server_rss = _process_rss(args.server_pid) if args.server_pid else (lambda: 0)
+
+        levels = []
+        for sessions in args.levels:
+            before = dict(mock.stats)
+            level = run_level(make_session, facts, sessions, args.duration, args.turns, args.think_time, args.seed, server_rss)
+            level["llm_calls"] = mock.stats["requests"] - before["requests"]
+            levels.append(level)
+            print(f"sessions={sessions:<4} turns={level['turns']:<5} throughput={level['throughput_tps']:.2f}/s "
+                  f"p50={level['p50_ms']:.0f}ms p99={level['p99_ms']:.0f}ms errors={100 * level['error_rate']:.1f}% "
+                  f"rss_growth={level['rss_growth_bytes'] / 2**20:+.1f}MB llm_calls={level['llm_calls']}")
+            for sample in level["sample_errors"]:
+                print(f"    error: {sample}")
+    finally:
+        mock.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    saturation = saturation_point(levels, args.min_gain, args.slo_ms)
+    print(f"\nSaturation point: {saturation} concurrent sessions" if saturation else "\nNo level met the SLO")
+    report = {
+        "config": {k: getattr(args, k) for k in ("target", "levels", "duration", "turns", "think_time",
+                                                 "median_latency", "sigma", "llm_error_rate", "slo_ms")},
+        "levels": levels,
+        "saturation_sessions": saturation,
+        "mock_llm": mock.stats,
+    }
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+"""Local OpenAI-compatible chat completions server for offline tests and benchmarks.
+
+Run standalone from the ``project`` directory:
+
+    python -m benchmarks.mock_openai_server --port 8900 --median-latency 0.3
+
+and point the app at it with ``DEEPSEEK_BASE_URL=http://127.0.0.1:8900 DEEPSEEK_API_KEY=mock``.
+"""
+import argparse
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class LatencyModel:
+    """Log-normal latency around ``median`` seconds; ``sigma`` controls the tail."""
+
+    def __init__(self, median=0.0, sigma=0.0, seed=None):
+        self.median = median
+        self.sigma = sigma
+        self.__rng = random.Random(seed)
+        self.__lock = threading.Lock()
+
+    def sample(self) -> float:
+        if self.median <= 0:
+            return 0.0
+        with self.__lock:
+            if self.sigma <= 0:
+                return self.median
+            return self.__rng.lognormvariate(math.log(self.median), self.sigma)
+
+
+def _message_text(message) -> str:
+    content = message.get("content") or ""
+    if isinstance(content, list):
+        return " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return str(content)
+
+
+def _last_user_text(messages) -> str:
+    for message in reversed(messages):
+        if message.get("role") == "user":
+            text = _message_text(message)
+            if "User Query:" in text:
+                text = text.split("User Query:", 1)[1]
+            return text.strip().splitlines()[0] if text.strip() else ""
+    return ""
+
+
+def _sample_value(schema: dict, text: str):
+    kind = schema.get("type")
+    if "default" in schema:
+        return schema["default"]
+    if kind == "boolean":
+        return True
+    if kind == "integer":
+        return 5
+    if kind == "number":
+        return 1.0
+    if kind == "array":
+        return [_sample_value(schema.get("items") or {"type": "string"}, text)]
+    if kind == "object":
+        return {k: _sample_value(v, text) for k, v in (schema.get("properties") or {}).items()}
+    return text
+
+
+def _tool_call_message(name: str, args: dict) -> dict:
+    return {
+        "role": "assistant",
+        "content": "",
+        "tool_calls": [{
+            "id": f"call_{uuid.uuid4().hex[:12]}",
+            "type": "function",
+            "function": {"name": name, "arguments": json.dumps(args, ensure_ascii=False)},
+        }],
+    }
+
+
+def default_responder(body: dict) -> dict:
+    """Build an assistant message: forced tool -> tool call, tools before any tool result -> first tool, else text."""
+    messages = body.get("messages") or []
+    tools = body.get("tools") or []
+    tool_choice = body.get("tool_choice")
+    text = _last_user_text(messages) or "mock"
+
+    tool = None
+    if isinstance(tool_choice, dict):
+        name = (tool_choice.get("function") or {}).get("name")
+        tool = next((t for t in tools if t.get("function", {}).get("name") == name), None)
+    elif tools and tool_choice != "none" and not any(m.get("role") == "tool" for m in messages):
+        tool = tools[0]
+
+    if tool is not None:
+        function = tool["function"]
+        return _tool_call_message(function["name"], _sample_value(function.get("parameters") or {"type": "object"}, text))
+    return {"role": "assistant", "content": f"Mock answer: {text}"}
+
+
+_PARENT_ID_RE = re.compile(r'"parent_id":\s*"([^"]+)"')
+
+
+def rag_responder(body: dict) -> dict:
+    """Like ``default_responder`` but walks the agent's real tool sequence:
+    search_child_chunks -> retrieve_parent_chunks (ids from the search result) -> answer."""
+    messages = body.get("messages") or []
+    names = {t.get("function", {}).get("name") for t in body.get("tools") or []}
+    if "search_child_chunks" not in names or body.get("tool_choice") == "none":
+        return default_responder(body)
+    tool_results = [m for m in messages if m.get("role") == "tool"]
+    text = _last_user_text(messages) or "mock"
+    if not tool_results:
+        return _tool_call_message("search_child_chunks", {"query": text, "k": 5})
+    if len(tool_results) == 1:
+        parent_ids = list(dict.fromkeys(_PARENT_ID_RE.findall(_message_text(tool_results[0]))))[:2]
+        if parent_ids:
+            return _tool_call_message("retrieve_parent_chunks", {"parent_ids": parent_ids})
+    return {"role": "assistant", "content": f"Mock answer: {text}"}
+
+
+class MockOpenAIServer:
+    def __init__(self, host="127.0.0.1", port=0, latency=None, error_rate=0.0, max_concurrency=0,
+                 responder=default_responder, record_requests=False, simulate_prefix_cache=False, seed=None):
+        self.latency = latency or LatencyModel()
+        self.error_rate = error_rate
+        self.max_concurrency = max_concurrency
+        self.responder = responder
+        self.record_requests = record_requests
+        self.simulate_prefix_cache = simulate_prefix_cache
+        self.requests = []
+        self.__seen_prefixes = set()
+        self.stats = {"requests": 0, "completed": 0, "rate_limited": 0, "injected_errors": 0, "max_in_flight": 0}
+        self.__in_flight = 0
+        self.__lock = threading.Lock()
+        self.__rng = random.Random(seed)
+        self.__httpd = ThreadingHTTPServer((host, port), self.__make_handler())
+        self.__httpd.daemon_threads = True
+        self.__thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.__httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "MockOpenAIServer":
+        self.__thread = threading.Thread(target=self.__httpd.serve_forever, daemon=True)
+        self.__thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self.__thread is not None:
+            self.__httpd.shutdown()
+            self.__thread = None
+        self.__httpd.server_close()
+
+    def serve_forever(self) -> None:
+        self.__httpd.serve_forever()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _admit(self, body: dict) -> str:
+        with self.__lock:
+            self.stats["requests"] += 1
+            if self.record_requests:
+                self.requests.append(body)
+            if self.max_concurrency and self.__in_flight >= self.max_concurrency:
+                self.stats["rate_limited"] += 1
+                return "rate_limited"
+            if self.error_rate and self.__rng.random() < self.error_rate:
+                self.stats["injected_errors"] += 1
+                return "injected_error"
+            self.__in_flight += 1
+            self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self.__in_flight)
+            return ""
+
+    def _finish(self) -> None:
+        with self.__lock:
+            self.__in_flight -= 1
+            self.stats["completed"] += 1
+
+    # DeepSeek-style context caching works on fixed-size prefix units (~64 tokens).
+    PREFIX_UNIT_CHARS = 192
+
+    def _prefix_cache_hit_chars(self, body: dict) -> int:
+        serialized = json.dumps(body.get("tools") or [], sort_keys=True, ensure_ascii=False)
+        for m in body.get("messages") or []:
+            serialized += f"\n<{m.get('role')}>" + _message_text(m) + json.dumps(m.get("tool_calls") or [], sort_keys=True)
+        hit, boundaries = 0, range(self.PREFIX_UNIT_CHARS, len(serialized) + 1, self.PREFIX_UNIT_CHARS)
+        digests = [hashlib.sha1(serialized[:end].encode("utf-8")).hexdigest() for end in boundaries]
+        with self.__lock:
+            for end, digest in zip(boundaries, digests):
+                if digest not in self.__seen_prefixes:
+                    break
+                hit = end
+            self.__seen_prefixes.update(digests)
+        return hit
+
+    def usage_for(self, body: dict, message: dict) -> dict:
+        prompt_tokens = sum(len(_message_text(m)) for m in body.get("messages") or []) // 3 + 1
+        completion_tokens = len(message.get("content") or "") // 3 + 1
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        if self.simulate_prefix_cache:
+            hit_tokens = min(prompt_tokens, self._prefix_cache_hit_chars(body) // 3)
+            usage.update({
+                "prompt_cache_hit_tokens": hit_tokens,
+                "prompt_cache_miss_tokens": prompt_tokens - hit_tokens,
+                "prompt_tokens_details": {"cached_tokens": hit_tokens},
+            })
+        return usage
+
+    def __make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send_json(self, status, payload, headers=None):
+                data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self._send_json(404, {"error": {"message": "not found"}})
+                    return
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}")
+
+                rejected = server._admit(body)
+                if rejected:
+                    self._send_json(429, {"error": {"message": f"mock {rejected}", "type": "rate_limit_error"}})
+                    return
+                try:
+                    time.sleep(server.latency.sample())
+                    message = server.responder(body)
+                    usage = server.usage_for(body, message)
+                    completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+                    if body.get("stream"):
+                        self._stream(completion_id, body, message, usage)
+                    else:
+                        self._send_json(200, {
+                            "id": completion_id,
+                            "object": "chat.completion",
+                            "created": int(time.time()),
+                            "model": body.get("model", "mock"),
+                            "choices": [{
+                                "index": 0,
+                                "message": message,
+                                "finish_reason": "tool_calls" if message.get("tool_calls") else "stop",
+                            }],
+                            "usage": usage,
+                        })
+                finally:
+                    server._finish()
+
+            def _stream(self, completion_id, body, message, usage):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.end_headers()
+
+                def emit(delta, finish_reason=None, extra=None):
+                    chunk = {
+                        "id": completion_id,
+                        "object": "chat.completion.chunk",
+                        "created": int(time.time()),
+                        "model": body.get("model", "mock"),
+                        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+                    }
+                    chunk.update(extra or {})
+                    self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+
+                if message.get("tool_calls"):
+                    calls = [{**call, "index": i} for i, call in enumerate(message["tool_calls"])]
+                    emit({"role": "assistant", "content": "", "tool_calls": calls})
+                    emit({}, "tool_calls")
+                else:
+                    emit({"role": "assistant", "content": ""})
+                    for word in (message.get("content") or "").split(" "):
+                        emit({"content": word + " "})
+                    emit({}, "stop")
+                if (body.get("stream_options") or {}).get("include_usage"):
+                    chunk = {"id": completion_id, "object": "chat.completion.chunk", "choices": [], "usage": usage}
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock OpenAI-compatible chat completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--median-latency", type=float, default=0.3, help="Median response latency in seconds")
+    parser.add_argument("--sigma", type=float, default=0.5, help="Log-normal sigma of the latency distribution")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 429")
+    parser.add_argument("--max-concurrency", type=int, default=0, help="Reject requests above this many in flight (0 = unlimited)")
+    parser.add_argument("--rag-script", action="store_true", help="Answer agent turns with the search -> retrieve -> answer sequence")
+    args = parser.parse_args()
+
+    server = MockOpenAIServer(
+        host=args.host, port=args.port,
+        latency=LatencyModel(args.median_latency, args.sigma),
+        error_rate=args.error_rate, max_concurrency=args.max_concurrency,
+        responder=rag_responder if args.rag_script else default_responder,
+    )
+    print(f"Mock OpenAI server listening on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
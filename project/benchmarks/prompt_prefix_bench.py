@@ -0,0 +1,86 @@
+"""Check that each graph node sends a byte-stable prompt prefix, using the mock server's
+prefix-cache simulation.
+
+    cd project && python -m benchmarks.prompt_prefix_bench --questions 8
+
+Prints the per-node provider cache-hit ratio and the number of distinct static prefixes
+(system messages + tool schemas) each node produced. Fails (exit code 1) if any node sent
+more than one distinct prefix across requests.
+"""
+import argparse
+import json
+import sys
+import uuid
+from langchain_core.messages import HumanMessage
+from langchain_core.tools import tool
+from benchmarks.mock_openai_server import MockOpenAIServer
+from core.llm_client import ScheduledChatDeepSeek, PromptCacheStats
+from rag_agent.graph import create_agent_graph
+
+QUESTIONS = [
+    "What is the warranty period for the pump?",
+    "How do I reset the controller to factory settings?",
+    "Which safety standards does the device comply with?",
+    "What is the maximum operating temperature?",
+    "How often should the filter be replaced?",
+    "Who is the manufacturer's service contact?",
+    "What voltage does the power supply require?",
+    "How is the calibration procedure documented?",
+]
+
+
+@tool
+def search_child_chunks(query: str, k: int = 5) -> list:
+    """Search for the top K most relevant child chunks.
+
+    Args:
+        query: Search query string
+        k: Number of results to return
+    """
+    return [{"content": f"Stub passage about {query}.", "parent_id": "doc_parent_0", "source": "stub.pdf"}]
+
+
+@tool
+def retrieve_parent_chunks(parent_ids: list) -> list:
+    """Retrieve full parent chunks by their IDs.
+
+    Args:
+        parent_ids: List of parent chunk IDs to retrieve
+    """
+    return [{"content": "Stub parent chunk.", "parent_id": pid, "metadata": {"source": "stub.pdf"}} for pid in parent_ids]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=len(QUESTIONS))
+    parser.add_argument("--separate-front-end", action="store_true", help="Use the two-call summarize + rewrite front end")
+    args = parser.parse_args()
+
+    with MockOpenAIServer(simulate_prefix_cache=True) as server:
+        llm = ScheduledChatDeepSeek(model="mock", api_key="mock", base_url=server.base_url, temperature=0)
+        llm.prompt_cache_stats = PromptCacheStats()
+        graph = create_agent_graph(
+            llm,
+            [search_child_chunks, retrieve_parent_chunks],
+            combined_front_end=not args.separate_front_end,
+            context_token_budget=0,
+        )
+        for i in range(args.questions):
+            question = QUESTIONS[i % len(QUESTIONS)]
+            graph.invoke(
+                {"messages": [HumanMessage(content=question)]},
+                {"configurable": {"thread_id": str(uuid.uuid4())}},
+            )
+
+    stats = llm.prompt_cache_stats.stats()
+    print(f"server: {server.stats}")
+    print(json.dumps(stats, indent=2))
+
+    unstable = [node for node, entry in stats.items() if entry["distinct_prefixes"] > 1]
+    for node in unstable:
+        print(f"FAIL: node '{node}' sent {stats[node]['distinct_prefixes']} distinct static prefixes")
+    sys.exit(1 if unstable else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""Retrieval quality versus latency across retrieval modes, k, chunk sizes and score thresholds.
+
+    cd project && python -m benchmarks.retrieval_bench --docs 40 --queries 200
+    cd project && python -m benchmarks.retrieval_bench --modes hybrid dense --k 5 10 --chunk-sizes 300 500 \\
+        --thresholds none 0.7 --output retrieval_report.json --history retrieval_history.jsonl
+
+Every synthetic fact carries a unique value token, so a query counts as answered at rank r
+when the r-th retrieved child chunk contains the expected value. Reports recall@k, MRR,
+p50/p99 search latency (through ToolFactory, i.e. including query embedding) and index size
+per chunk size. The JSON report can be appended to a history file to track it over time.
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from benchmarks.common import build_corpus, build_queries, percentile, rss_bytes, dir_size_bytes
+
+
+def _threshold(value: str):
+    return None if value.lower() in ("none", "") else float(value)
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+
+def evaluate(tool_factory, queries, k: int) -> dict:
+    latencies, reciprocal_ranks, hits = [], [], 0
+    for query, expected in queries:
+        start = time.perf_counter()
+        results = tool_factory._search_child_chunks(query, k)
+        latencies.append(time.perf_counter() - start)
+        # Compound queries count as found when their first fact is retrieved; MRR uses the same fact.
+        rank = next((i for i, r in enumerate(results, start=1) if expected[0] in r["content"]), None)
+        if rank is not None:
+            hits += 1
+            reciprocal_ranks.append(1.0 / rank)
+        else:
+            reciprocal_ranks.append(0.0)
+    n = len(queries)
+    return {
+        "queries": n,
+        "recall_at_k": hits / n if n else 0.0,
+        "mrr": sum(reciprocal_ranks) / n if n else 0.0,
+        "p50_ms": 1000 * percentile(latencies, 50),
+        "p99_ms": 1000 * percentile(latencies, 99),
+        "mean_ms": 1000 * sum(latencies) / n if n else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=40)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--paraphrase-ratio", type=float, default=0.5, help="Share of queries worded without document terms")
+    parser.add_argument("--modes", nargs="+", default=["hybrid", "dense", "sparse"], choices=["hybrid", "dense", "sparse"])
+    parser.add_argument("--k", nargs="+", type=int, default=[3, 5, 10])
+    parser.add_argument("--chunk-sizes", nargs="+", type=int, default=[300, 500, 800])
+    parser.add_argument("--chunk-overlap-ratio", type=float, default=0.2)
+    parser.add_argument("--thresholds", nargs="+", type=_threshold, default=[None, 0.7],
+                        help="Score thresholds to try; 'none' disables filtering")
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=13)
+    parser.add_argument("--workdir", default="", help="Working directory (default: a fresh temp dir)")
+    parser.add_argument("--output", default="retrieval_report.json")
+    parser.add_argument("--history", default="", help="Append the report as one JSON line to this file")
+    args = parser.parse_args()
+
+    workdir = Path(args.workdir or tempfile.mkdtemp(prefix="rag_retrieval_")).resolve()
+    # Paths are read by config at import time, so they must be set before the project imports below.
+    os.environ["QDRANT_DB_PATH"] = str(workdir / "qdrant_db")
+    os.environ["PARENT_STORE_PATH"] = str(workdir / "parent_store")
+    # Every configuration must embed its own queries; a shared query-embedding cache would favour later runs.
+    os.environ["QUERY_EMBEDDING_CACHE_SIZE"] = "0"
+
+    from db.vector_db_manager import VectorDbManager
+    from document_chunker import DocumentChuncker
+    from rag_agent.tools import ToolFactory
+
+    results = []
+    try:
+        corpus, facts = build_corpus(workdir / "corpus", args.docs, args.seed)
+        queries = build_queries(facts, args.queries, args.seed, paraphrase_ratio=args.paraphrase_ratio)
+        vector_db = VectorDbManager()
+
+        for chunk_size in args.chunk_sizes:
+            collection_name = f"retrieval_bench_cs{chunk_size}"
+            vector_db.delete_collection(collection_name)
+            vector_db.create_collection(collection_name)
+            chunker = DocumentChuncker(child_chunk_size=chunk_size, child_chunk_overlap=int(chunk_size * args.chunk_overlap_ratio))
+            child_chunks = [c for path in corpus for c in chunker.create_chunks_single(path)[1]]
+
+            rss_before, start = rss_bytes(), time.perf_counter()
+            store = vector_db.get_collection(collection_name, retrieval_mode="hybrid")
+            store.add_documents(child_chunks)
+            index = {
+                "points": store.client.count(collection_name).count,
+                "build_seconds": time.perf_counter() - start,
+                "disk_bytes": dir_size_bytes(Path(os.environ["QDRANT_DB_PATH"]) / "collection" / collection_name),
+                "rss_delta_bytes": rss_bytes() - rss_before,
+            }
+            print(f"chunk_size={chunk_size}: {index['points']} chunks indexed in {index['build_seconds']:.1f}s")
+
+            for mode in args.modes:
+                collection = vector_db.get_collection(collection_name, retrieval_mode=mode)
+                for threshold in args.thresholds:
+                    tool_factory = ToolFactory(collection, score_threshold=threshold)
+                    for query, _ in queries[:args.warmup]:
+                        tool_factory._search_child_chunks(query, max(args.k))
+                    for k in args.k:
+                        metrics = evaluate(tool_factory, queries, k)
+                        results.append({"chunk_size": chunk_size, "mode": mode, "k": k,
+                                        "score_threshold": threshold, **metrics, "index": index})
+                        print(f"  {mode:<7} k={k:<3} threshold={threshold!s:<5} recall={metrics['recall_at_k']:.3f} "
+                              f"mrr={metrics['mrr']:.3f} p50={metrics['p50_ms']:.1f}ms p99={metrics['p99_ms']:.1f}ms")
+                    tool_factory.close()
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_revision": _git_revision(),
+        "config": {k: getattr(args, k) for k in ("docs", "queries", "paraphrase_ratio", "chunk_overlap_ratio", "seed")},
+        "results": results,
+    }
+    if results:
+        best = max(results, key=lambda r: (r["recall_at_k"] / max(r["p50_ms"], 1e-3), r["mrr"]))
+        report["best_recall_per_ms"] = {k: best[k] for k in ("chunk_size", "mode", "k", "score_threshold", "recall_at_k", "p50_ms")}
+        print(f"\nBest recall per ms: {report['best_recall_per_ms']}")
+
+    Path(args.output).write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print(f"Report written to {args.output}")
+    if args.history:
+        with open(args.history, "a", encoding="utf-8") as f:
+            f.write(json.dumps(report) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Latency and recall of two-stage (routed) child search versus flat search as the corpus grows.
+
+    cd project && python -m benchmarks.routing_bench --docs 200 1000 --queries 200
+    cd project && python -m benchmarks.routing_bench --docs 2000 --levels document section --top-m 4 8 16 \\
+        --output routing_report.json
+
+For each corpus size the synthetic manuals are indexed once; the routing collection is built
+from the stored child vectors. Every configuration (flat, or routed at a level / top-M, with and
+without heading BM25) is measured with the same labelled queries through ToolFactory, reporting
+recall@k, MRR and p50/p99 search latency (query embedding, routing and child search).
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from benchmarks.common import build_corpus, build_queries
+from benchmarks.retrieval_bench import evaluate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", nargs="+", type=int, default=[200, 1000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--paraphrase-ratio", type=float, default=0.5)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--levels", nargs="+", default=["document", "section"], choices=["document", "section"])
+    parser.add_argument("--top-m", nargs="+", type=int, default=[4, 8, 16])
+    parser.add_argument("--bm25", nargs="+", type=int, default=[0, 1], choices=[0, 1],
+                        help="Heading BM25 fusion settings to try (0 = dense centroids only)")
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=13)
+    parser.add_argument("--workdir", default="", help="Working directory (default: a fresh temp dir)")
+    parser.add_argument("--output", default="routing_report.json")
+    args = parser.parse_args()
+
+    workdir = Path(args.workdir or tempfile.mkdtemp(prefix="rag_routing_")).resolve()
+    # Paths are read by config at import time, so they must be set before the project imports below.
+    os.environ["QDRANT_DB_PATH"] = str(workdir / "qdrant_db")
+    os.environ["PARENT_STORE_PATH"] = str(workdir / "parent_store")
+    # Every configuration must embed its own queries; a shared query-embedding cache would favour later runs.
+    os.environ["QUERY_EMBEDDING_CACHE_SIZE"] = "0"
+
+    from db.vector_db_manager import VectorDbManager
+    from db.document_router import DocumentRouter
+    from document_chunker import DocumentChuncker
+    from rag_agent.tools import ToolFactory
+
+    results = []
+    try:
+        vector_db = VectorDbManager()
+        chunker = DocumentChuncker()
+        for docs in args.docs:
+            corpus, facts = build_corpus(workdir / f"corpus_{docs}", docs, args.seed)
+            queries = build_queries(facts, args.queries, args.seed, paraphrase_ratio=args.paraphrase_ratio)
+            collection_name = f"routing_bench_{docs}"
+            vector_db.delete_collection(collection_name)
+            vector_db.create_collection(collection_name)
+            start = time.perf_counter()
+            collection = vector_db.get_collection(collection_name)
+            collection.add_documents([c for path in corpus for c in chunker.create_chunks_single(path)[1]])
+            index_seconds = time.perf_counter() - start
+            print(f"docs={docs}: {collection.client.count(collection_name).count} chunks indexed in {index_seconds:.1f}s")
+
+            configs = [("flat", None, 0, False)]
+            configs += [(f"{level} m={m}{' +bm25' if bm25 else ''}", level, m, bool(bm25))
+                        for level in args.levels for m in args.top_m for bm25 in args.bm25]
+            routers = {}
+            for name, level, top_m, bm25 in configs:
+                router = None
+                if level is not None:
+                    if level not in routers:
+                        start = time.perf_counter()
+                        routers[level] = DocumentRouter(vector_db, child_collection=collection_name,
+                                                        collection_name=f"{collection_name}_routing_{level}", level=level)
+                        points = routers[level].rebuild()
+                        print(f"  {level} routing index: {points} centroids in {time.perf_counter() - start:.1f}s")
+                    router = routers[level]
+                    router.top_m, router.heading_bm25 = top_m, bm25
+                tool_factory = ToolFactory(collection, router=router)
+                for query, _ in queries[:args.warmup]:
+                    tool_factory._search_child_chunks(query, args.k)
+                metrics = evaluate(tool_factory, queries, args.k)
+                tool_factory.close()
+                results.append({"docs": docs, "config": name, "level": level, "top_m": top_m, "heading_bm25": bm25,
+                                "k": args.k, **metrics, "index_seconds": index_seconds})
+                print(f"  {name:<22} recall={metrics['recall_at_k']:.3f} mrr={metrics['mrr']:.3f} "
+                      f"p50={metrics['p50_ms']:.1f}ms p99={metrics['p99_ms']:.1f}ms")
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "config": {k: getattr(args, k) for k in ("queries", "paraphrase_ratio", "k", "seed")},
+        "results": results,
+    }
+    Path(args.output).write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Exercise the LLM scheduler against the local mock server.
+
+    cd project && python -m benchmarks.scheduler_check --calls 60 --max-concurrency 4
+
+Fails (exit code 1) if the provider ever sees more concurrent calls than the scheduler
+allows, if an injected 429 leaks to the caller, or if higher-priority calls do not
+finish ahead of lower-priority ones on average.
+"""
+import argparse
+import statistics
+import sys
+import threading
+import time
+from langchain_core.messages import HumanMessage
+from benchmarks.mock_openai_server import MockOpenAIServer, LatencyModel
+from core.llm_client import ScheduledChatDeepSeek
+from core.llm_scheduler import LLMScheduler, SchedulerRejected, NODE_PRIORITIES
+
+NODES = ["summarize", "agent", "aggregate"]
+
+
+def run_burst(llm, calls):
+    finished, errors, rejected = [], [], []
+    lock = threading.Lock()
+    start = time.perf_counter()
+
+    def worker(i):
+        node = NODES[i % len(NODES)]
+        try:
+            llm.invoke([HumanMessage(content=f"question {i}")], config={"metadata": {"langgraph_node": node}})
+            with lock:
+                finished.append((node, time.perf_counter() - start))
+        except SchedulerRejected:
+            with lock:
+                rejected.append(node)
+        except Exception as e:
+            with lock:
+                errors.append(repr(e))
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(calls)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return finished, errors, rejected, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=60)
+    parser.add_argument("--max-concurrency", type=int, default=4)
+    parser.add_argument("--rpm", type=float, default=0, help="Scheduler requests per minute (0 = unlimited)")
+    parser.add_argument("--median-latency", type=float, default=0.1)
+    parser.add_argument("--error-rate", type=float, default=0.1)
+    parser.add_argument("--max-queue", type=int, default=1000)
+    args = parser.parse_args()
+
+    server = MockOpenAIServer(
+        latency=LatencyModel(args.median_latency, 0.5, seed=7),
+        error_rate=args.error_rate,
+        max_concurrency=args.max_concurrency,
+        seed=7,
+    ).start()
+    scheduler = LLMScheduler(
+        max_concurrency=args.max_concurrency, requests_per_minute=args.rpm, tokens_per_minute=0,
+        max_queue=args.max_queue, queue_timeout=120, max_retries=8, backoff_base=0.05, backoff_max=1.0,
+    )
+    llm = ScheduledChatDeepSeek(model="mock", api_key="mock", base_url=server.base_url, max_retries=0)
+    llm.scheduler = scheduler
+
+    try:
+        finished, errors, rejected, elapsed = run_burst(llm, args.calls)
+    finally:
+        server.stop()
+
+    print(f"calls={args.calls} elapsed={elapsed:.2f}s throughput={len(finished) / elapsed:.1f}/s")
+    print(f"server: {server.stats}")
+    print(f"scheduler: {scheduler.stats()}")
+    by_node = {}
+    for node, t in finished:
+        by_node.setdefault(node, []).append(t)
+    for node in sorted(by_node, key=lambda n: NODE_PRIORITIES[n]):
+        print(f"  {node:<10} priority={NODE_PRIORITIES[node]} n={len(by_node[node])} mean_finish={statistics.mean(by_node[node]):.2f}s")
+
+    failures = []
+    if server.stats["max_in_flight"] > args.max_concurrency or server.stats["rate_limited"]:
+        failures.append("provider saw more concurrent calls than the scheduler cap")
+    if errors:
+        failures.append(f"{len(errors)} calls failed: {errors[:3]}")
+    if rejected and args.max_queue >= args.calls:
+        failures.append(f"{len(rejected)} calls rejected despite queue capacity")
+    means = [statistics.mean(by_node[n]) for n in ("aggregate", "agent", "summarize") if n in by_node]
+    if len(means) == 3 and not (means[0] <= means[1] <= means[2]):
+        failures.append("priority classes did not finish in order aggregate < agent < summarize")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
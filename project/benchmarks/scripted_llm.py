@@ -0,0 +1,90 @@
+"""Deterministic chat model that plays the agent's part without any API calls."""
+import json
+import re
+import time
+from typing import Any, List, Optional
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+_PARENT_ID_RE = re.compile(r'"parent_id":\s*"([^"]+)"')
+
+
+def _user_query(messages) -> str:
+    for message in messages:
+        if isinstance(message, HumanMessage):
+            text = str(message.content)
+            for marker in ("User Query:", "Original user question:"):
+                if marker in text:
+                    text = text.split(marker, 1)[1]
+            return text.strip().splitlines()[0].strip() if text.strip() else ""
+    return ""
+
+
+def _parent_ids(content) -> List[str]:
+    try:
+        items = json.loads(content)
+        ids = [item.get("parent_id") for item in items if isinstance(item, dict)]
+    except (TypeError, ValueError, AttributeError):
+        ids = _PARENT_ID_RE.findall(str(content))
+    return list(dict.fromkeys(i for i in ids if i))
+
+
+def _tool_call(name: str, args: dict, step: int) -> AIMessage:
+    return AIMessage(content="", tool_calls=[{"name": name, "args": args, "id": f"call_{name}_{step}", "type": "tool_call"}])
+
+
+class ScriptedChatModel(BaseChatModel):
+    """Scripted stand-in for ChatDeepSeek.
+
+    - structured output (QueryAnalysis / ConversationAnalysis): the query is clear; queries
+      joined by " and " are rewritten into two questions, everything else is kept as-is
+    - agent with tools: search_child_chunks -> retrieve_parent_chunks -> final answer
+    - everything else (summary, aggregation, forced final answer): a short text answer
+    """
+
+    latency_seconds: float = 0.0
+    search_k: int = 5
+    max_parents: int = 2
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def bind_tools(self, tools, tool_choice=None, **kwargs):
+        formatted = [convert_to_openai_tool(t) for t in tools]
+        return self.bind(tools=formatted, tool_choice=tool_choice, **kwargs)
+
+    def _generate(self, messages, stop=None, run_manager=None, tools: Optional[List[dict]] = None,
+                  tool_choice: Any = None, **kwargs) -> ChatResult:
+        if self.latency_seconds > 0:
+            time.sleep(self.latency_seconds)
+        message = self._respond(messages, tools or [], tool_choice)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _respond(self, messages, tools, tool_choice) -> AIMessage:
+        names = [t.get("function", {}).get("name") for t in tools]
+        query = _user_query(messages) or "unknown"
+
+        if names in (["QueryAnalysis"], ["ConversationAnalysis"]):
+            questions = [q.strip().rstrip("?") + "?" for q in query.split(" and ")] if " and " in query else [query]
+            args = {"is_clear": True, "questions": questions, "clarification_needed": ""}
+            if names[0] == "ConversationAnalysis":
+                args["conversation_summary"] = ""
+            return _tool_call(names[0], args, 0)
+
+        tool_messages = [m for m in messages if isinstance(m, ToolMessage)]
+        if "search_child_chunks" in names and tool_choice != "none":
+            if not tool_messages:
+                return _tool_call("search_child_chunks", {"query": query, "k": self.search_k}, 1)
+            if len(tool_messages) == 1:
+                parent_ids = _parent_ids(tool_messages[0].content)[:self.max_parents]
+                if parent_ids:
+                    return _tool_call("retrieve_parent_chunks", {"parent_ids": parent_ids, "query": query}, 2)
+
+        sources = sorted({pid.rsplit("_parent_", 1)[0] for m in tool_messages for pid in _parent_ids(m.content)})
+        answer = f"Scripted answer for: {query}"
+        if sources:
+            answer += "\n\n---\n**Sources:**\n" + "\n".join(f"- {s}" for s in sources)
+        return AIMessage(content=answer)
@@ -22,9 +22,24 @@ def _resolve_path(env_var: str, default_rel: str) -> str:
         path = _REPO_ROOT / path
     return str(path.resolve())
 
+def _env_flag(env_var: str, default: bool = False) -> bool:
+    raw = (os.getenv(env_var) or "").strip().lower()
+    if not raw:
+        return default
+    return raw in ("1", "true", "yes", "on")
+
+def collection_path(path: str, collection_name: str) -> str:
+    """Per-collection variant of a store path; the default collection keeps the configured path."""
+    if collection_name == CHILD_COLLECTION:
+        return path
+    path = Path(path)
+    return str(path.with_name(f"{path.stem}_{collection_name}{path.suffix}"))
+
 MARKDOWN_DIR = _resolve_path("MARKDOWN_DIR", "markdown_docs")
 PARENT_STORE_PATH = _resolve_path("PARENT_STORE_PATH", "parent_store")
 QDRANT_DB_PATH = _resolve_path("QDRANT_DB_PATH", "qdrant_db")
+# 文档目录（SQLite）：记录每个文档的哈希、页数、块数、嵌入模型与入库耗时，作为列表与去重/更新判断的依据
+DOCUMENT_CATALOG_PATH = _resolve_path("DOCUMENT_CATALOG_PATH", "document_catalog/catalog.sqlite")
 
 # --- Qdrant Configuration ---
 CHILD_COLLECTION = "document_child_chunks"
@@ -40,13 +55,144 @@ DEEPSEEK_BASE_URL = os.getenv("DEEPSEEK_BASE_URL", "https://api.deepseek.com").s
 DEEPSEEK_MODEL = os.getenv("DEEPSEEK_MODEL", "deepseek-chat").strip()
 LLM_TEMPERATURE = float(os.getenv("LLM_TEMPERATURE", "0"))
 
+# --- LLM Scheduler ---
+# 进程内共享的 LLM 调用调度：并发上限、RPM/TPM 令牌桶、优先级队列（汇总 > agent > 摘要）与抖动退避重试
+LLM_SCHEDULER_ENABLED = _env_flag("LLM_SCHEDULER_ENABLED", False)
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "0"))
+LLM_TOKENS_PER_MINUTE = float(os.getenv("LLM_TOKENS_PER_MINUTE", "0"))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "64"))
+LLM_QUEUE_TIMEOUT_SECONDS = float(os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", "60"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_BACKOFF_BASE_SECONDS = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", "0.5"))
+LLM_BACKOFF_MAX_SECONDS = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "20"))
+
+# 对冲请求：调用耗时超过该节点滚动延迟分位数时再发一份，取先返回者；对冲比例受上限约束
+LLM_HEDGING_ENABLED = _env_flag("LLM_HEDGING_ENABLED", False)
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "0.95"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+LLM_HEDGE_MAX_RATE = float(os.getenv("LLM_HEDGE_MAX_RATE", "0.05"))
+LLM_HEDGE_WINDOW = int(os.getenv("LLM_HEDGE_WINDOW", "200"))
+
+# --- LLM Response Cache ---
+# 仅在 LLM_TEMPERATURE 为 0 时生效：相同模型/参数/工具/消息的调用直接复用持久化结果
+LLM_CACHE_ENABLED = _env_flag("LLM_CACHE_ENABLED", False)
+LLM_CACHE_BYPASS = _env_flag("LLM_CACHE_BYPASS", False)
+LLM_CACHE_PATH = _resolve_path("LLM_CACHE_PATH", "llm_cache/llm_cache.sqlite")
+LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+
+# --- Ingestion Queue ---
+# 后台入库任务队列：任务记录与上传文件暂存在本地，重启后自动恢复未完成任务
+INGEST_QUEUE_PATH = _resolve_path("INGEST_QUEUE_PATH", "ingest_jobs/jobs.sqlite")
+INGEST_UPLOAD_DIR = _resolve_path("INGEST_UPLOAD_DIR", "ingest_jobs/uploads")
+# 同时执行的入库任务数（每个任务内逐个文档处理）
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "1"))
+
+# --- Gradio Configuration ---
+# 每个事件（如发送消息）允许同时处理的请求数；Gradio 默认为 1，即所有会话串行排队
+GRADIO_CONCURRENCY_LIMIT = int(os.getenv("GRADIO_CONCURRENCY_LIMIT", "1"))
+
+# --- HTTP API Configuration ---
+API_HOST = os.getenv("API_HOST", "127.0.0.1").strip()
+API_PORT = int(os.getenv("API_PORT", "8000"))
+# 批量问答默认并发数与上限（请求可通过 parallelism 参数在上限内调整）
+API_BATCH_PARALLELISM = int(os.getenv("API_BATCH_PARALLELISM", "4"))
+API_BATCH_MAX_PARALLELISM = int(os.getenv("API_BATCH_MAX_PARALLELISM", "16"))
+
 # --- LangGraph Configuration ---
 # 防止 agent 工具循环在复杂问题上过早触发默认递归上限（默认 25）
 LANGGRAPH_RECURSION_LIMIT = int(os.getenv("LANGGRAPH_RECURSION_LIMIT", "50"))
+# 子问题 agent 预算（0 表示不限制，默认关闭）：超出任一预算时基于已检索内容强制作答
+# 时间预算是硬上限：剩余时间作为每次 LLM 请求的超时，工具执行到期即中断；
+# 之后的强制作答调用与调度器排队（LLM_QUEUE_TIMEOUT_SECONDS）不在其内
+AGENT_TIMEOUT_SECONDS = float(os.getenv("AGENT_TIMEOUT_SECONDS", "0"))
+AGENT_MAX_TOOL_CALLS = int(os.getenv("AGENT_MAX_TOOL_CALLS", "0"))
+AGENT_MAX_PROMPT_TOKENS = int(os.getenv("AGENT_MAX_PROMPT_TOKENS", "0"))
+# agent 工具循环的上下文预算（估算 token，0 表示关闭，默认关闭；如 12000）：超出时将已读过的旧工具结果压缩为摘录，保留 parent_id 与来源
+AGENT_CONTEXT_TOKEN_BUDGET = int(os.getenv("AGENT_CONTEXT_TOKEN_BUDGET", "0"))
+COMPACT_EXCERPT_CHARS = int(os.getenv("COMPACT_EXCERPT_CHARS", "300"))
+# 单次请求预算，按子问题数量平均分配到各分支
+REQUEST_TIMEOUT_SECONDS = float(os.getenv("REQUEST_TIMEOUT_SECONDS", "0"))
+REQUEST_MAX_TOOL_CALLS = int(os.getenv("REQUEST_MAX_TOOL_CALLS", "0"))
+REQUEST_MAX_PROMPT_TOKENS = int(os.getenv("REQUEST_MAX_PROMPT_TOKENS", "0"))
+# 合并“对话摘要 + 查询改写”为一次结构化调用，每轮节省一次 LLM 往返；解析失败时自动回退两步流程
+COMBINED_FRONT_END = _env_flag("COMBINED_FRONT_END", False)
+# 快速路径：只有一个子答案时直接返回，跳过聚合 LLM 调用
+FAST_PATH_AGGREGATE = _env_flag("FAST_PATH_AGGREGATE", False)
+# 快速路径：首轮、简短且自包含的查询跳过改写 LLM 调用（启发式预检）
+FAST_PATH_REWRITE = _env_flag("FAST_PATH_REWRITE", False)
+FAST_PATH_MAX_QUERY_WORDS = int(os.getenv("FAST_PATH_MAX_QUERY_WORDS", "25"))
+
+# --- Telemetry Configuration ---
+# 结构化追踪：节点/工具/LLM/向量/父块/入库各阶段的 span；关闭时几乎零开销
+TELEMETRY_ENABLED = _env_flag("TELEMETRY_ENABLED", False)
+# 以 OTLP JSON 行格式写入本地追踪文件
+TRACE_EXPORT_ENABLED = _env_flag("TRACE_EXPORT_ENABLED", True)
+TRACE_EXPORT_PATH = _resolve_path("TRACE_EXPORT_PATH", "traces/traces.otlp.jsonl")
+# Prometheus /metrics 端口（0 表示不启动）
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+# --- Retrieval Configuration ---
+# 子块检索模式：hybrid / dense / sparse
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid").strip().lower()
+if RETRIEVAL_MODE not in ("hybrid", "dense", "sparse"):
+    raise ValueError(f"RETRIEVAL_MODE must be one of hybrid, dense, sparse (got {RETRIEVAL_MODE!r})")
+# 子块检索分数阈值；hybrid 模式下是 RRF 融合分数而非余弦相似度，设为空字符串表示不过滤
+_score_threshold = os.getenv("SEARCH_SCORE_THRESHOLD", "0.7").strip()
+SEARCH_SCORE_THRESHOLD = float(_score_threshold) if _score_threshold else None
+# 父块内存 LRU 缓存条数（0 表示关闭）
+PARENT_CACHE_SIZE = int(os.getenv("PARENT_CACHE_SIZE", "256"))
+# 查询向量（稠密/稀疏）内存 LRU 缓存条数，重复或并发的相同查询不再重复编码（0 表示关闭，默认关闭；如 1024）
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "0"))
+# 单次请求内并行子 agent 共享检索结果（相同查询/父块只执行一次）
+RETRIEVAL_MEMO_ENABLED = _env_flag("RETRIEVAL_MEMO_ENABLED", True)
+# 在改写查询的同时，用原始问题预先执行一次混合检索并预取父块
+SPECULATIVE_RETRIEVAL = _env_flag("SPECULATIVE_RETRIEVAL", False)
+SPECULATIVE_K = int(os.getenv("SPECULATIVE_K", "5"))
+SPECULATIVE_WAIT_SECONDS = float(os.getenv("SPECULATIVE_WAIT_SECONDS", "5"))
+# 语义答案缓存：按改写后子问题的向量相似度复用子答案，文档变更时自动失效
+ANSWER_CACHE_ENABLED = _env_flag("ANSWER_CACHE_ENABLED", False)
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+# 父块摘录模式：按查询命中的子块位置截取父块片段（附带上下文），而非返回整个父块
+PARENT_EXCERPT_MODE = _env_flag("PARENT_EXCERPT_MODE", False)
+PARENT_EXCERPT_CONTEXT_CHARS = int(os.getenv("PARENT_EXCERPT_CONTEXT_CHARS", "400"))
+PARENT_EXCERPT_MAX_CHARS = int(os.getenv("PARENT_EXCERPT_MAX_CHARS", "2500"))
+
+# --- Near-Duplicate Detection ---
+# 入库时用 SimHash 识别近重复子块（免责声明、页眉、手册修订版等）：每个重复簇只索引一次，其余记录为来源引用；检索结果按簇折叠
+DEDUP_ENABLED = _env_flag("DEDUP_ENABLED", False)
+DEDUP_INDEX_PATH = _resolve_path("DEDUP_INDEX_PATH", "dedup_index/signatures.sqlite")
+# 64 位签名的汉明距离阈值（分 4 段检索，阈值不超过 3 时不漏检）
+DEDUP_MAX_HAMMING = int(os.getenv("DEDUP_MAX_HAMMING", "3"))
+DEDUP_SHINGLE_CHARS = int(os.getenv("DEDUP_SHINGLE_CHARS", "5"))
+# 过短的子块（如单独的标题）签名不可靠，不参与去重
+DEDUP_MIN_CHARS = int(os.getenv("DEDUP_MIN_CHARS", "80"))
+
+# --- Document Routing ---
+# 两阶段检索：先用文档/章节质心向量（可叠加标题 BM25）选出 top-M 范围，再只在该范围内做子块检索，适合大语料
+ROUTING_ENABLED = _env_flag("ROUTING_ENABLED", False)
+# 路由粒度：document（按文档过滤）/ section（按 H1/H2 章节的父块过滤）
+ROUTING_LEVEL = os.getenv("ROUTING_LEVEL", "document").strip().lower()
+ROUTING_TOP_M = int(os.getenv("ROUTING_TOP_M", "8"))
+ROUTING_HEADING_BM25 = _env_flag("ROUTING_HEADING_BM25", True)
+
+# --- Index Snapshots ---
+# 快照（子块向量 + 父块 + Markdown + 目录）的 zstd 压缩级别，新节点导入快照即可热启动，无需重新入库
+SNAPSHOT_COMPRESSION_LEVEL = int(os.getenv("SNAPSHOT_COMPRESSION_LEVEL", "3"))
 
 # --- Text Splitter Configuration ---
 CHILD_CHUNK_SIZE = 500
 CHILD_CHUNK_OVERLAP = 100
+# 子块切分单位：chars（按字符）或 tokens（按稠密模型分词器计数，子块不超过模型最大序列长度）
+CHUNKING_MODE = os.getenv("CHUNKING_MODE", "chars").strip().lower()
+# 稠密模型最大序列长度（all-mpnet-base-v2 为 384），超出部分会被模型截断
+DENSE_MAX_SEQ_LENGTH = int(os.getenv("DENSE_MAX_SEQ_LENGTH", "384"))
+CHILD_CHUNK_TOKENS = int(os.getenv("CHILD_CHUNK_TOKENS", "320"))
+CHILD_CHUNK_OVERLAP_TOKENS = int(os.getenv("CHILD_CHUNK_OVERLAP_TOKENS", "48"))
+# 统计子块 token 长度分布与截断数量（tokens 模式下始终统计）
+CHUNK_TOKEN_STATS = _env_flag("CHUNK_TOKEN_STATS", False)
 MIN_PARENT_SIZE = 2000
 MAX_PARENT_SIZE = 10000
 HEADERS_TO_SPLIT_ON = [
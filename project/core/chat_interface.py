@@ -1,25 +1,89 @@
-from langchain_core.messages import HumanMessage
+import queue
+import threading
+import uuid
+import telemetry
+from langchain_core.messages import HumanMessage, SystemMessage
 
 class ChatInterface:
     
     def __init__(self, rag_system):
         self.rag_system = rag_system
         
-    def chat(self, message, history):
+    def chat(self, message, history, session_id=None):
 
         if not self.rag_system.agent_graph:
             return "⚠️ 系统尚未初始化，请稍后重试。"
             
         try:
-            result = self.rag_system.agent_graph.invoke(
-                {"messages": [HumanMessage(content=message.strip())]},
-                self.rag_system.get_config()
-            )
-            return result["messages"][-1].content
-            
+            return self.ask(message, session_id=session_id)
         except Exception as e:
             return f"❌ 发生错误：{str(e)}"
 
+    def ask(self, message, session_id=None):
+        """Answer one message in a session and return the answer text; errors propagate to the caller."""
+        request_id = str(uuid.uuid4())
+        thread_id = session_id or self.rag_system.thread_id
+        try:
+            with telemetry.span("request", request_id=request_id, thread_id=thread_id):
+                result = self.rag_system.agent_graph.invoke(
+                    {"messages": [HumanMessage(content=message.strip())]},
+                    self.rag_system.get_config(request_id=request_id, thread_id=thread_id)
+                )
+            return result["messages"][-1].content
+        finally:
+            self.rag_system.end_request(request_id)
+
+    def stream(self, message, session_id=None, cancelled=None):
+        """Yield progress events for one message: ``node`` per finished graph step, ``token`` for the
+        final answer as it is synthesized, then ``answer`` (or ``error``).
+
+        The graph runs on its own thread so the request span stays in one context even when the
+        consumer pulls events from different threads (e.g. a streaming HTTP response). Setting
+        ``cancelled`` (a ``threading.Event``), or closing the generator, stops the run at the next
+        graph event.
+        """
+        request_id = str(uuid.uuid4())
+        thread_id = session_id or self.rag_system.thread_id
+        run_config = self.rag_system.get_config(request_id=request_id, thread_id=thread_id)
+        run_config["configurable"]["stream_answer"] = True
+        events = queue.Queue()
+        cancelled = cancelled or threading.Event()
+
+        def run():
+            try:
+                with telemetry.span("request", request_id=request_id, thread_id=thread_id, streaming=True) as request_span:
+                    # custom 模式只携带汇总节点写出的 token；其余节点照常 invoke，保留对冲与缓存统计
+                    for mode, payload in self.rag_system.agent_graph.stream(
+                        {"messages": [HumanMessage(content=message.strip())]},
+                        run_config,
+                        stream_mode=["updates", "custom"],
+                    ):
+                        if cancelled.is_set():
+                            # 客户端已断开：停止图的执行，不再调用后续节点
+                            request_span.set_attribute("cancelled", True)
+                            return
+                        if mode == "updates":
+                            for node in payload:
+                                if not node.startswith("__"):
+                                    events.put({"event": "node", "node": node})
+                        elif payload.get("token"):
+                            events.put({"event": "token", "content": payload["token"]})
+                answer = self.rag_system.agent_graph.get_state(run_config).values["messages"][-1].content
+                events.put({"event": "answer", "content": answer, "request_id": request_id})
+            except Exception as e:
+                events.put({"event": "error", "message": str(e), "request_id": request_id})
+            finally:
+                self.rag_system.end_request(request_id)
+                events.put(None)
+
+        threading.Thread(target=run, daemon=True).start()
+        try:
+            while (event := events.get()) is not None:
+                yield event
+        finally:
+            # Runs when the consumer closes the generator early (e.g. the SSE client disconnected)
+            cancelled.set()
+
     def format_for_excel(self, text: str) -> str:
         """
         可选的“二次整理”：调用底层 LLM 将文本整理为严格 JSON，便于导出 Excel。
@@ -32,24 +96,23 @@ class ChatInterface:
         if not raw:
             return text
 
-        prompt = (
-            "你是数据整理助手。请把下面的内容整理为【严格 JSON】以便导入 Excel。\n"
+        # 固定指令放在 SystemMessage，原文放在其后，保证请求前缀在多次导出间逐字节一致
+        instructions = (
+            "你是数据整理助手。请把用户提供的内容整理为【严格 JSON】以便导入 Excel。\n"
             "要求：\n"
             "1) 只输出 JSON，不要输出任何解释/Markdown/代码块。\n"
             "2) 优先输出 JSON 数组（数组元素为对象），对象字段名尽量统一。\n"
             "3) 如果内容无法结构化为表格，请输出：{\"raw\": \"...\"}（保留原文，必要时做最小转义）。\n"
-            "4) 输出必须能被 json.loads 直接解析。\n"
-            "下面是原文：\n"
-            f"{raw}"
+            "4) 输出必须能被 json.loads 直接解析。"
         )
 
         try:
-            resp = self.rag_system.llm.invoke([HumanMessage(content=prompt)])
+            resp = self.rag_system.llm.invoke([SystemMessage(content=instructions), HumanMessage(content=raw)])
             # langchain message/content 兼容
             formatted = getattr(resp, "content", None) or str(resp)
             return (formatted or "").strip() or text
         except Exception:
             return text
     
-    def clear_session(self):
-        self.rag_system.reset_thread()
\ No newline at end of file
+    def clear_session(self, session_id=None):
+        self.rag_system.reset_thread(session_id)
\ No newline at end of file
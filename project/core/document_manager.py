@@ -1,72 +1,197 @@
 from pathlib import Path
 import shutil
+import threading
+import time
 import config
-from util import pdfs_to_markdowns
+import telemetry
+from core import snapshot
+from db.document_catalog import file_sha256, embedding_model_id
+from util import pdfs_to_markdowns, pdf_page_count
 
 class DocumentManager:
 
     def __init__(self, rag_system):
         self.rag_system = rag_system
-        self.markdown_dir = Path(config.MARKDOWN_DIR)
+        self.catalog = rag_system.catalog
+        self.markdown_dir = Path(rag_system.markdown_dir)
         self.markdown_dir.mkdir(parents=True, exist_ok=True)
-        
+        # 写入向量库/父块存储与删除操作串行执行；转换与切块在锁外进行
+        self.__lock = threading.RLock()
+        self.__in_progress = set()
+        migrated = self.catalog.migrate_from_markdown(self.markdown_dir)
+        if migrated:
+            print(f"✓ Registered {migrated} existing documents in the catalog")
+
+    def plan(self, doc_path, content_hash=None):
+        """Decide what ingesting ``doc_path`` would do: ``"add"``, ``"update"`` or ``"skip"``.
+
+        A known name is updated when its content hash or embedding model changed; documents
+        registered without a hash (pre-catalog) are kept. New names whose content is already
+        ingested under another name are skipped as duplicates.
+        """
+        existing = self.catalog.get(Path(doc_path).stem)
+        content_hash = content_hash or file_sha256(doc_path)
+        if existing is None:
+            return "skip" if self.catalog.find_by_hash(content_hash) else "add"
+        if existing["content_hash"] is None:
+            return "skip"
+        if existing["content_hash"] != content_hash or existing["embedding_model"] != embedding_model_id():
+            return "update"
+        return "skip"
+
     def add_documents(self, document_paths, progress_callback=None):
         if not document_paths:
             return 0, 0
-            
+
         document_paths = [document_paths] if isinstance(document_paths, str) else document_paths
         document_paths = [p for p in document_paths if p and Path(p).suffix.lower() in [".pdf", ".md"]]
-        
+
         if not document_paths:
             return 0, 0
-            
+
         added = 0
         skipped = 0
-            
+
         for i, doc_path in enumerate(document_paths):
             if progress_callback:
                 progress_callback((i + 1) / len(document_paths), f"Processing {Path(doc_path).name}")
-                
+
             doc_name = Path(doc_path).stem
             md_path = self.markdown_dir / f"{doc_name}.md"
-            
-            if md_path.exists():
+
+            try:
+                content_hash = file_sha256(doc_path)
+            except OSError as e:
+                print(f"Error reading {doc_path}: {e}")
                 skipped += 1
                 continue
-                
-            try:            
-                if Path(doc_path).suffix.lower() == ".md":
-                    shutil.copy(doc_path, md_path)
-                else:
-                    pdfs_to_markdowns(str(doc_path), overwrite=False)            
-                parent_chunks, child_chunks = self.rag_system.chunker.create_chunks_single(md_path)
-                
-                if not child_chunks:
+            with self.__lock:
+                action = "skip" if doc_name in self.__in_progress else self.plan(doc_path, content_hash)
+                if action == "skip":
                     skipped += 1
                     continue
-                
-                collection = self.rag_system.vector_db.get_collection(self.rag_system.collection_name)
-                collection.add_documents(child_chunks)
-                self.rag_system.parent_store.save_many(parent_chunks)
-                
+                self.__in_progress.add(doc_name)
+
+            try:
+                start = time.perf_counter()
+                if action == "update":
+                    print(f"Updating changed document: {Path(doc_path).name}")
+                    self.remove_document(doc_name)
+                with telemetry.span("ingest.document", document=Path(doc_path).name, action=action):
+                    with telemetry.span("ingest.convert"):
+                        if Path(doc_path).suffix.lower() == ".md":
+                            shutil.copy(doc_path, md_path)
+                        else:
+                            pdfs_to_markdowns(str(doc_path), overwrite=True, output_dir=self.markdown_dir)
+                    with telemetry.span("ingest.chunk") as chunk_span:
+                        parent_chunks, child_chunks = self.rag_system.chunker.create_chunks_single(md_path)
+                        chunk_span.set_attribute("parent_chunks", len(parent_chunks))
+                        chunk_span.set_attribute("child_chunks", len(child_chunks))
+
+                    if not child_chunks:
+                        md_path.unlink(missing_ok=True)
+                        skipped += 1
+                        continue
+
+                    with self.__lock:
+                        indexed_chunks = child_chunks
+                        if self.rag_system.dedup_index is not None:
+                            with telemetry.span("ingest.dedup", chunks=len(child_chunks)) as dedup_span:
+                                indexed_chunks = self.rag_system.dedup_index.filter_new(child_chunks)
+                                dedup_span.set_attribute("duplicates", len(child_chunks) - len(indexed_chunks))
+                        with telemetry.span("ingest.index"):
+                            if indexed_chunks:
+                                collection = self.rag_system.vector_db.get_collection(self.rag_system.collection_name)
+                                collection.add_documents(indexed_chunks)
+                        if self.rag_system.router is not None:
+                            with telemetry.span("ingest.routing"):
+                                self.rag_system.router.index_document(f"{doc_name}.pdf")
+                        with telemetry.span("ingest.parent_store"):
+                            self.rag_system.parent_store.save_many(parent_chunks)
+                        # 目录记录最后写入：存在记录即表示该文档已完整入库
+                        self.catalog.upsert({
+                            "name": doc_name,
+                            "original_name": Path(doc_path).name,
+                            "content_hash": content_hash,
+                            "size_bytes": Path(doc_path).stat().st_size,
+                            "page_count": pdf_page_count(doc_path) if Path(doc_path).suffix.lower() == ".pdf" else None,
+                            "parent_count": len(parent_chunks),
+                            "child_count": len(child_chunks),
+                            "embedding_model": embedding_model_id(),
+                            "duration_seconds": time.perf_counter() - start,
+                        })
+
                 added += 1
-                
+
             except Exception as e:
                 print(f"Error processing {doc_path}: {e}")
+                self.remove_document(doc_name)
                 skipped += 1
-            
+            finally:
+                with self.__lock:
+                    self.__in_progress.discard(doc_name)
+
+        if added:
+            self.rag_system.invalidate_caches()
+
         return added, skipped
-    
+
+    def has_document(self, doc_name):
+        return self.catalog.get(Path(doc_name).stem) is not None
+
+    def remove_document(self, doc_name):
+        """Remove one document's catalog entry, Markdown, child chunks and parent chunks; safe on partially ingested documents."""
+        doc_name = Path(doc_name).stem
+        with self.__lock:
+            self.catalog.delete(doc_name)
+            self.rag_system.vector_db.delete_by_source(self.rag_system.collection_name, f"{doc_name}.pdf")
+            if self.rag_system.dedup_index is not None:
+                # 该文档持有的去重簇代表块改由仍引用它的其他文档承载
+                promoted = self.rag_system.dedup_index.remove_source(f"{doc_name}.pdf")
+                if promoted:
+                    collection = self.rag_system.vector_db.get_collection(self.rag_system.collection_name)
+                    collection.add_documents(promoted)
+                    if self.rag_system.router is not None:
+                        for source in {doc.metadata["source"] for doc in promoted}:
+                            self.rag_system.router.index_document(source)
+            if self.rag_system.router is not None:
+                self.rag_system.router.delete_source(f"{doc_name}.pdf")
+            self.rag_system.parent_store.delete_document(doc_name)
+            (self.markdown_dir / f"{doc_name}.md").unlink(missing_ok=True)
+        self.rag_system.invalidate_caches()
+
     def get_markdown_files(self):
-        if not self.markdown_dir.exists():
-            return []
-        return sorted([p.name.replace(".md", ".pdf") for p in self.markdown_dir.glob("*.md")])
-    
+        documents, _ = self.catalog.list(limit=-1)
+        return [doc["original_name"] for doc in documents]
+
+    def list_documents(self, offset=0, limit=50, query=""):
+        """One page of catalog records (optionally filtered by name) and the total number of matches."""
+        return self.catalog.list(offset=offset, limit=limit, query=query)
+
+    def export_snapshot(self, output_path):
+        """Pack the index into one archive; ingestion and removals wait until it is written."""
+        with self.__lock:
+            return snapshot.export_snapshot(self.rag_system, self.markdown_dir, output_path)
+
+    def import_snapshot(self, snapshot_path):
+        """Replace the whole index with a verified snapshot built with the same embedding model."""
+        with self.__lock:
+            if self.__in_progress:
+                raise RuntimeError("Cannot import a snapshot while documents are being ingested.")
+            return snapshot.import_snapshot(self, snapshot_path)
+
     def clear_all(self):
-        if self.markdown_dir.exists():
-            shutil.rmtree(self.markdown_dir)
-            self.markdown_dir.mkdir(parents=True, exist_ok=True)
-        
-        self.rag_system.parent_store.clear_store()
-        self.rag_system.vector_db.delete_collection(self.rag_system.collection_name)
-        self.rag_system.vector_db.create_collection(self.rag_system.collection_name)
\ No newline at end of file
+        with self.__lock:
+            self.catalog.clear()
+            if self.rag_system.dedup_index is not None:
+                self.rag_system.dedup_index.clear()
+            if self.markdown_dir.exists():
+                shutil.rmtree(self.markdown_dir)
+                self.markdown_dir.mkdir(parents=True, exist_ok=True)
+
+            self.rag_system.parent_store.clear_store()
+            self.rag_system.vector_db.delete_collection(self.rag_system.collection_name)
+            self.rag_system.vector_db.create_collection(self.rag_system.collection_name)
+            if self.rag_system.router is not None:
+                self.rag_system.router.clear()
+        self.rag_system.invalidate_caches()
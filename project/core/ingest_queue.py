@@ -0,0 +1,205 @@
+import json
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+import config
+
+SUPPORTED_SUFFIXES = (".pdf", ".md")
+ACTIVE_STATES = ("queued", "running")
+
+class IngestionJobQueue:
+    """Persistent background queue for document ingestion.
+
+    Jobs are rows in a local SQLite file and their uploads are staged under
+    ``upload_dir/<job_id>``, so a job survives a restart: ``start`` re-queues jobs that were
+    ``running`` after rolling back the document that was in flight, and the job resumes at
+    the next unprocessed file. A bounded pool of worker threads processes one document at a
+    time per job and checks for cancellation between documents.
+    """
+
+    def __init__(self, doc_manager, db_path=config.INGEST_QUEUE_PATH, upload_dir=config.INGEST_UPLOAD_DIR,
+                 workers=config.INGEST_WORKERS):
+        self.doc_manager = doc_manager
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.upload_dir = Path(upload_dir)
+        self.upload_dir.mkdir(parents=True, exist_ok=True)
+        self.workers = max(1, workers)
+        self.__lock = threading.Lock()
+        self.__wakeup = threading.Condition(self.__lock)
+        self.__threads = []
+        self.__stopping = False
+        self.__conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self.__conn.row_factory = sqlite3.Row
+        self.__conn.execute("PRAGMA journal_mode=WAL")
+        self.__conn.execute(
+            "CREATE TABLE IF NOT EXISTS ingest_jobs ("
+            "id TEXT PRIMARY KEY, status TEXT NOT NULL, files TEXT NOT NULL, total INTEGER NOT NULL, "
+            "processed INTEGER NOT NULL DEFAULT 0, added INTEGER NOT NULL DEFAULT 0, skipped INTEGER NOT NULL DEFAULT 0, "
+            "current TEXT, error TEXT, cancel_requested INTEGER NOT NULL DEFAULT 0, "
+            "created_at REAL NOT NULL, started_at REAL, finished_at REAL)"
+        )
+        self.__conn.execute("CREATE INDEX IF NOT EXISTS idx_ingest_jobs_status ON ingest_jobs(status, created_at)")
+        self.__conn.commit()
+
+    def start(self) -> "IngestionJobQueue":
+        self.__recover()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self.__worker, name=f"ingest-worker-{i}", daemon=True)
+            thread.start()
+            self.__threads.append(thread)
+        return self
+
+    def stop(self, timeout=None) -> None:
+        """Stop the workers after their current document; unfinished jobs resume on the next ``start``."""
+        with self.__wakeup:
+            self.__stopping = True
+            self.__wakeup.notify_all()
+        for thread in self.__threads:
+            thread.join(timeout)
+
+    def submit(self, paths) -> str:
+        """Stage the files and enqueue them; returns the job id immediately."""
+        paths = [paths] if isinstance(paths, str) else list(paths or [])
+        paths = [Path(p) for p in paths if p and Path(p).suffix.lower() in SUPPORTED_SUFFIXES]
+        if not paths:
+            raise ValueError("No PDF or Markdown files to ingest.")
+
+        job_id = uuid.uuid4().hex
+        staging_dir = self.upload_dir / job_id
+        staging_dir.mkdir(parents=True)
+        staged = []
+        for path in paths:
+            # 保留原始文件名：文档名取自文件名（去扩展名）
+            target = staging_dir / path.name
+            shutil.copy(path, target)
+            staged.append(str(target))
+
+        with self.__wakeup:
+            self.__conn.execute(
+                "INSERT INTO ingest_jobs (id, status, files, total, created_at) VALUES (?, 'queued', ?, ?, ?)",
+                (job_id, json.dumps(staged, ensure_ascii=False), len(staged), time.time()),
+            )
+            self.__conn.commit()
+            self.__wakeup.notify()
+        return job_id
+
+    def cancel(self, job_id) -> bool:
+        """Cancel a queued job at once, or ask a running job to stop after its current document."""
+        with self.__lock:
+            row = self.__conn.execute("SELECT status FROM ingest_jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None or row["status"] not in ACTIVE_STATES:
+                return False
+            if row["status"] == "queued":
+                self.__conn.execute(
+                    "UPDATE ingest_jobs SET status = 'cancelled', finished_at = ? WHERE id = ?", (time.time(), job_id)
+                )
+            else:
+                self.__conn.execute("UPDATE ingest_jobs SET cancel_requested = 1 WHERE id = ?", (job_id,))
+            self.__conn.commit()
+            queued = row["status"] == "queued"
+        if queued:
+            self.__discard_staging(job_id)
+        return True
+
+    def get(self, job_id):
+        with self.__lock:
+            row = self.__conn.execute("SELECT * FROM ingest_jobs WHERE id = ?", (job_id,)).fetchone()
+        return self.__to_dict(row) if row else None
+
+    def list_jobs(self, limit=20):
+        with self.__lock:
+            rows = self.__conn.execute("SELECT * FROM ingest_jobs ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+        return [self.__to_dict(row) for row in rows]
+
+    def has_active_jobs(self) -> bool:
+        with self.__lock:
+            row = self.__conn.execute("SELECT 1 FROM ingest_jobs WHERE status IN ('queued', 'running') LIMIT 1").fetchone()
+        return row is not None
+
+    @staticmethod
+    def __to_dict(row) -> dict:
+        job = dict(row)
+        job["files"] = [Path(p).name for p in json.loads(job["files"])]
+        job["cancel_requested"] = bool(job["cancel_requested"])
+        job["progress"] = job["processed"] / job["total"] if job["total"] else 1.0
+        return job
+
+    def __update(self, job_id, **fields) -> None:
+        assignments = ", ".join(f"{key} = ?" for key in fields)
+        with self.__lock:
+            self.__conn.execute(f"UPDATE ingest_jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+            self.__conn.commit()
+
+    def __discard_staging(self, job_id) -> None:
+        shutil.rmtree(self.upload_dir / job_id, ignore_errors=True)
+
+    def __recover(self) -> None:
+        with self.__lock:
+            rows = self.__conn.execute("SELECT id, current FROM ingest_jobs WHERE status = 'running'").fetchall()
+        for row in rows:
+            if row["current"]:
+                # 上次退出时正在入库的文档可能只写入了一部分，先整体回滚再重新处理
+                print(f"Rolling back partially ingested document: {row['current']}")
+                self.doc_manager.remove_document(row["current"])
+            self.__update(row["id"], status="queued", current=None)
+            print(f"Re-queued interrupted ingestion job {row['id']}")
+
+    def __claim(self):
+        with self.__wakeup:
+            while not self.__stopping:
+                row = self.__conn.execute(
+                    "SELECT * FROM ingest_jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+                ).fetchone()
+                if row is not None:
+                    self.__conn.execute(
+                        "UPDATE ingest_jobs SET status = 'running', started_at = COALESCE(started_at, ?) WHERE id = ?",
+                        (time.time(), row["id"]),
+                    )
+                    self.__conn.commit()
+                    return row
+                self.__wakeup.wait()
+        return None
+
+    def __worker(self) -> None:
+        while (row := self.__claim()) is not None:
+            try:
+                self.__run(row)
+            except Exception as e:
+                print(f"Ingestion job {row['id']} failed: {e}")
+                self.__update(row["id"], status="failed", error=str(e), current=None, finished_at=time.time())
+                self.__discard_staging(row["id"])
+
+    def __run(self, row) -> None:
+        job_id = row["id"]
+        files = json.loads(row["files"])
+        processed, added, skipped = row["processed"], row["added"], row["skipped"]
+
+        for path in files[processed:]:
+            with self.__lock:
+                state = self.__conn.execute(
+                    "SELECT cancel_requested FROM ingest_jobs WHERE id = ?", (job_id,)
+                ).fetchone()
+            if self.__stopping:
+                # 留在 running 状态，下次启动时自动恢复
+                return
+            if state["cancel_requested"]:
+                self.__update(job_id, status="cancelled", current=None, finished_at=time.time())
+                self.__discard_staging(job_id)
+                return
+
+            name = Path(path).name
+            if self.doc_manager.plan(path) == "skip":
+                skipped += 1
+            else:
+                self.__update(job_id, current=name)
+                doc_added, doc_skipped = self.doc_manager.add_documents([path])
+                added, skipped = added + doc_added, skipped + doc_skipped
+            processed += 1
+            self.__update(job_id, processed=processed, added=added, skipped=skipped, current=None)
+
+        self.__update(job_id, status="done", finished_at=time.time())
+        self.__discard_staging(job_id)
@@ -0,0 +1,101 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Sequence
+from langchain_core.caches import BaseCache
+from langchain_core.load import dumps, loads
+from langchain_core.outputs import Generation
+import config
+
+class PersistentLLMCache(BaseCache):
+    """SQLite-backed LangChain cache for deterministic (temperature 0) chat calls.
+
+    LangChain hands over ``prompt`` as the serialized message list and ``llm_string`` as the
+    model parameters plus bound kwargs (tools schema, tool_choice, structured-output
+    settings), so the key covers everything that influences the response. Cached values are
+    the full generations, which keeps tool calls and structured outputs intact.
+    """
+
+    def __init__(self, db_path=config.LLM_CACHE_PATH, ttl_seconds=config.LLM_CACHE_TTL_SECONDS,
+                 max_entries=config.LLM_CACHE_MAX_ENTRIES, bypass=config.LLM_CACHE_BYPASS):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        # Bypass skips reads but still refreshes entries with the new responses.
+        self.bypass = bypass
+        self.hits = 0
+        self.misses = 0
+        self.__lock = threading.Lock()
+        self.__conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self.__conn.execute("PRAGMA journal_mode=WAL")
+        self.__conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self.__conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_accessed ON llm_cache(accessed_at)")
+        self.__conn.commit()
+
+    @staticmethod
+    def _make_key(prompt: str, llm_string: str) -> str:
+        return hashlib.sha256(f"{llm_string}\x00{prompt}".encode("utf-8")).hexdigest()
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[Sequence[Generation]]:
+        if self.bypass:
+            return None
+        key = self._make_key(prompt, llm_string)
+        now = time.time()
+        with self.__lock:
+            row = self.__conn.execute("SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None or (self.ttl_seconds and now - row[1] > self.ttl_seconds):
+                if row is not None:
+                    self.__conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                    self.__conn.commit()
+                self.misses += 1
+                return None
+            self.__conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            self.__conn.commit()
+        try:
+            generations = [loads(item) for item in json.loads(row[0])]
+        except Exception as e:
+            print(f"Warning: dropping unreadable LLM cache entry: {e}")
+            return None
+        self.hits += 1
+        return generations
+
+    def update(self, prompt: str, llm_string: str, return_val: Sequence[Generation]) -> None:
+        key = self._make_key(prompt, llm_string)
+        value = json.dumps([dumps(gen) for gen in return_val], ensure_ascii=False)
+        now = time.time()
+        with self.__lock:
+            self.__conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            if self.max_entries:
+                self.__conn.execute(
+                    "DELETE FROM llm_cache WHERE key IN ("
+                    "SELECT key FROM llm_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                )
+            self.__conn.commit()
+
+    def clear(self, **kwargs) -> None:
+        with self.__lock:
+            self.__conn.execute("DELETE FROM llm_cache")
+            self.__conn.commit()
+
+    def stats(self) -> dict:
+        with self.__lock:
+            entries = self.__conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            "bypass": self.bypass,
+        }
@@ -0,0 +1,130 @@
+import hashlib
+import json
+import threading
+from typing import Any, Optional
+from langchain_deepseek import ChatDeepSeek
+from core.llm_scheduler import NODE_PRIORITIES, DEFAULT_PRIORITY
+from rag_agent.context import estimate_tokens
+from rag_agent.budget import remaining_seconds
+
+def _node_name(run_manager) -> str:
+    metadata = getattr(run_manager, "metadata", None) or {}
+    return metadata.get("langgraph_node", "")
+
+def _estimate_prompt_tokens(messages) -> int:
+    return sum(estimate_tokens(m.content) for m in messages)
+
+def _total_tokens(result) -> int:
+    for gen in getattr(result, "generations", None) or []:
+        usage = getattr(getattr(gen, "message", None), "usage_metadata", None) or {}
+        if usage.get("total_tokens"):
+            return usage["total_tokens"]
+    token_usage = (getattr(result, "llm_output", None) or {}).get("token_usage") or {}
+    return token_usage.get("total_tokens", 0)
+
+
+def _cache_hit_tokens(result) -> tuple:
+    """(prompt_tokens, cache_hit_tokens) as reported by the provider."""
+    token_usage = (getattr(result, "llm_output", None) or {}).get("token_usage") or {}
+    prompt_tokens = token_usage.get("prompt_tokens", 0)
+    if "prompt_cache_hit_tokens" in token_usage:
+        return prompt_tokens, token_usage["prompt_cache_hit_tokens"] or 0
+    for gen in getattr(result, "generations", None) or []:
+        usage = getattr(getattr(gen, "message", None), "usage_metadata", None) or {}
+        details = usage.get("input_token_details") or {}
+        return usage.get("input_tokens", prompt_tokens), details.get("cache_read", 0) or 0
+    return prompt_tokens, 0
+
+
+def static_prefix_fingerprint(messages, kwargs) -> str:
+    """Hash of the leading system messages plus the bound tool schemas."""
+    digest = hashlib.sha256()
+    for message in messages:
+        if getattr(message, "type", "") != "system":
+            break
+        digest.update(str(message.content).encode("utf-8"))
+    digest.update(json.dumps(kwargs.get("tools") or [], sort_keys=True, ensure_ascii=False, default=str).encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+class PromptCacheStats:
+    """Per-node provider prompt-cache hits and the distinct static prefixes each node sent."""
+
+    def __init__(self, max_fingerprints=32):
+        self.max_fingerprints = max_fingerprints
+        self.__nodes = {}
+        self.__lock = threading.Lock()
+
+    def record(self, node: str, fingerprint: str, prompt_tokens: int, cache_hit_tokens: int) -> None:
+        with self.__lock:
+            entry = self.__nodes.setdefault(node or "-", {"calls": 0, "prompt_tokens": 0, "cache_hit_tokens": 0, "prefixes": set()})
+            entry["calls"] += 1
+            entry["prompt_tokens"] += prompt_tokens
+            entry["cache_hit_tokens"] += cache_hit_tokens
+            if len(entry["prefixes"]) < self.max_fingerprints:
+                entry["prefixes"].add(fingerprint)
+
+    def stats(self) -> dict:
+        with self.__lock:
+            return {
+                node: {
+                    "calls": e["calls"],
+                    "prompt_tokens": e["prompt_tokens"],
+                    "cache_hit_tokens": e["cache_hit_tokens"],
+                    "cache_hit_ratio": e["cache_hit_tokens"] / e["prompt_tokens"] if e["prompt_tokens"] else 0.0,
+                    "distinct_prefixes": len(e["prefixes"]),
+                }
+                for node, e in self.__nodes.items()
+            }
+
+
+class ScheduledChatDeepSeek(ChatDeepSeek):
+    """ChatDeepSeek whose API calls go through a shared LLMScheduler and optional HedgingPolicy,
+    recording provider prompt-cache usage per node.
+
+    These helpers are assigned after construction so they never become part of the
+    serialized model parameters (and therefore of LLM cache keys).
+    """
+
+    scheduler: Optional[Any] = None
+    hedging: Optional[Any] = None
+    prompt_cache_stats: Optional[Any] = None
+
+    def _priority(self, run_manager) -> int:
+        return NODE_PRIORITIES.get(_node_name(run_manager), DEFAULT_PRIORITY)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        parent_generate = super()._generate
+        node = _node_name(run_manager)
+        remaining = remaining_seconds()
+        if remaining is not None and "timeout" not in kwargs:
+            # 请求超时取分支剩余时间；在缓存查找之后才加入，不影响 LLM 缓存键
+            kwargs = {**kwargs, "timeout": max(remaining, 1.0)}
+
+        def call():
+            return parent_generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+        def admit(fn):
+            if self.scheduler is None:
+                return fn()
+            return self.scheduler.run(
+                fn,
+                priority=self._priority(run_manager),
+                est_tokens=_estimate_prompt_tokens(messages),
+                usage_of=_total_tokens,
+            )
+
+        # 对冲发生在调度槽内部：排队时间不计入延迟分位数与对冲计时
+        result = admit(call) if self.hedging is None else self.hedging.call(call, node, admit=admit)
+        if self.prompt_cache_stats is not None:
+            prompt_tokens, cache_hit_tokens = _cache_hit_tokens(result)
+            self.prompt_cache_stats.record(node, static_prefix_fingerprint(messages, kwargs), prompt_tokens, cache_hit_tokens)
+        return result
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        if self.scheduler is None:
+            yield from super()._stream(messages, stop=stop, run_manager=run_manager, **kwargs)
+            return
+        # Streams hold their slot for the whole response and are not retried mid-way.
+        with self.scheduler.slot(self._priority(run_manager), _estimate_prompt_tokens(messages)):
+            yield from super()._stream(messages, stop=stop, run_manager=run_manager, **kwargs)
@@ -0,0 +1,131 @@
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import config
+
+_ABANDONED = object()
+
+class _Race:
+    """Shared state of one hedged call: who was admitted, who won, and which attempts failed."""
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.started = False
+        self.settled = False
+        self.launched = 1
+        self.winner = None
+        self.result = None
+        self.errors = []
+
+class HedgingPolicy:
+    """Duplicates slow LLM calls once they exceed a rolling per-node latency percentile.
+
+    ``fn`` is the raw provider call and ``admit(run)`` runs it under admission control (the
+    scheduler slot), so latencies and the hedge timer only cover time spent at the provider,
+    never time waiting for a slot. Calls below ``min_samples`` run directly on the caller's
+    thread. Once a node is armed, the primary runs on its own short-lived thread and only
+    hedges use the bounded pool. The first attempt to succeed wins; a loser that has not yet
+    been admitted stops before calling the provider, one already in flight runs to completion
+    and its result is discarded. Hedges are capped at ``max_hedge_rate`` of all calls.
+    """
+
+    def __init__(self, percentile=config.LLM_HEDGE_PERCENTILE, min_samples=config.LLM_HEDGE_MIN_SAMPLES,
+                 max_hedge_rate=config.LLM_HEDGE_MAX_RATE, window=config.LLM_HEDGE_WINDOW, max_workers=32):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.max_hedge_rate = max_hedge_rate
+        self.window = window
+        self.__latencies = {}
+        self.__lock = threading.Lock()
+        self.__executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-hedge")
+        self.__stats = {"calls": 0, "hedges_fired": 0, "hedges_won": 0, "hedges_skipped_by_cap": 0,
+                        "losers_abandoned": 0}
+
+    def threshold(self, node: str):
+        with self.__lock:
+            samples = self.__latencies.get(node)
+            if not samples or len(samples) < self.min_samples:
+                return None
+            ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(self.percentile * len(ordered)))]
+
+    def __record(self, node: str, latency: float) -> None:
+        with self.__lock:
+            self.__latencies.setdefault(node, deque(maxlen=self.window)).append(latency)
+
+    def __try_reserve_hedge(self) -> bool:
+        with self.__lock:
+            if self.__stats["hedges_fired"] + 1 > self.max_hedge_rate * self.__stats["calls"]:
+                self.__stats["hedges_skipped_by_cap"] += 1
+                return False
+            self.__stats["hedges_fired"] += 1
+            return True
+
+    def __timed(self, fn, node: str):
+        start = time.monotonic()
+        result = fn()
+        self.__record(node, time.monotonic() - start)
+        return result
+
+    def __attempt(self, race: _Race, role: str, fn, admit, node: str) -> None:
+        def run():
+            with race.cond:
+                if race.settled:
+                    # 另一个请求已经返回：拿到调度槽后不再调用模型，立即归还
+                    return _ABANDONED
+                race.started = True
+                race.cond.notify_all()
+            return self.__timed(fn, node)
+
+        try:
+            result = _ABANDONED if race.settled else admit(run)
+        except Exception as e:
+            with race.cond:
+                race.errors.append(e)
+                if not race.settled and len(race.errors) >= race.launched:
+                    race.settled = True
+                race.cond.notify_all()
+            return
+        with race.cond:
+            if result is _ABANDONED:
+                with self.__lock:
+                    self.__stats["losers_abandoned"] += 1
+            elif not race.settled:
+                race.settled, race.winner, race.result = True, role, result
+            race.cond.notify_all()
+
+    def call(self, fn, node: str = "", admit=None):
+        admit = admit or (lambda run: run())
+        with self.__lock:
+            self.__stats["calls"] += 1
+        threshold = self.threshold(node)
+        if threshold is None:
+            return admit(lambda: self.__timed(fn, node))
+
+        race = _Race()
+        threading.Thread(
+            target=contextvars.copy_context().run, args=(self.__attempt, race, "primary", fn, admit, node),
+            name="llm-primary", daemon=True,
+        ).start()
+        with race.cond:
+            # 排队等待调度槽的时间不计入对冲计时
+            race.cond.wait_for(lambda: race.started or race.settled)
+            if not race.cond.wait_for(lambda: race.settled, timeout=threshold) and self.__try_reserve_hedge():
+                race.launched += 1
+                self.__executor.submit(contextvars.copy_context().run, self.__attempt, race, "hedge", fn, admit, node)
+            race.cond.wait_for(lambda: race.settled)
+            if race.winner is None:
+                raise race.errors[0]
+            if race.winner == "hedge":
+                with self.__lock:
+                    self.__stats["hedges_won"] += 1
+            return race.result
+
+    def stats(self) -> dict:
+        with self.__lock:
+            stats = dict(self.__stats)
+        stats["hedge_rate"] = stats["hedges_fired"] / stats["calls"] if stats["calls"] else 0.0
+        stats["thresholds"] = {node: self.threshold(node) for node in list(self.__latencies)}
+        return stats
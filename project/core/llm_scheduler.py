@@ -0,0 +1,189 @@
+import itertools
+import random
+import threading
+import time
+from contextlib import contextmanager
+import config
+
+# Lower value = served first.
+NODE_PRIORITIES = {
+    "aggregate": 0,
+    "agent": 1,
+    "summarize": 2,
+    "analyze_rewrite": 2,
+}
+DEFAULT_PRIORITY = 1
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+RETRYABLE_ERROR_NAMES = {"RateLimitError", "APIConnectionError", "APITimeoutError", "InternalServerError"}
+
+
+class SchedulerRejected(RuntimeError):
+    """Raised when the scheduler queue is full or a caller waited longer than the queue timeout."""
+
+
+class TokenBucket:
+    """Refills ``per_minute`` units per minute; a limit of 0 disables the bucket."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def __refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        if self.capacity <= 0:
+            return 0.0
+        self.__refill(now)
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float) -> None:
+        if self.capacity > 0:
+            self.tokens -= min(amount, self.capacity)
+
+    def adjust(self, delta: float) -> None:
+        """Charge (or refund) the difference between estimated and actual usage; may go negative."""
+        if self.capacity > 0:
+            self.tokens = min(self.capacity, self.tokens - delta)
+
+
+def _is_retryable(error: Exception) -> bool:
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    return status in RETRYABLE_STATUS_CODES or type(error).__name__ in RETRYABLE_ERROR_NAMES
+
+
+def _retry_after_seconds(error: Exception) -> float:
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after", 0))
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class LLMScheduler:
+    """Process-wide admission control for LLM calls.
+
+    Callers wait in a bounded priority queue until a concurrency slot and enough
+    request/token budget are available. Retryable failures are retried with full-jitter
+    exponential backoff, re-entering the queue each time.
+    """
+
+    def __init__(self, max_concurrency=config.LLM_MAX_CONCURRENCY,
+                 requests_per_minute=config.LLM_REQUESTS_PER_MINUTE,
+                 tokens_per_minute=config.LLM_TOKENS_PER_MINUTE,
+                 max_queue=config.LLM_MAX_QUEUE,
+                 queue_timeout=config.LLM_QUEUE_TIMEOUT_SECONDS,
+                 max_retries=config.LLM_MAX_RETRIES,
+                 backoff_base=config.LLM_BACKOFF_BASE_SECONDS,
+                 backoff_max=config.LLM_BACKOFF_MAX_SECONDS):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.__request_bucket = TokenBucket(requests_per_minute)
+        self.__token_bucket = TokenBucket(tokens_per_minute)
+        self.__cond = threading.Condition()
+        self.__waiters = []
+        self.__seq = itertools.count()
+        self.__active = 0
+        self.__stats = {"admitted": 0, "completed": 0, "failed": 0, "rejected": 0, "retries": 0}
+
+    def acquire(self, priority: int = DEFAULT_PRIORITY, est_tokens: int = 0) -> None:
+        ticket = (priority, next(self.__seq))
+        deadline = time.monotonic() + self.queue_timeout if self.queue_timeout else None
+        with self.__cond:
+            if len(self.__waiters) >= self.max_queue:
+                self.__stats["rejected"] += 1
+                raise SchedulerRejected(f"LLM queue is full ({self.max_queue} waiting)")
+            self.__waiters.append(ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = None
+                    if min(self.__waiters) == ticket and self.__active < self.max_concurrency:
+                        wait = max(
+                            self.__request_bucket.wait_time(1, now),
+                            self.__token_bucket.wait_time(est_tokens, now),
+                        )
+                        if wait <= 0:
+                            self.__request_bucket.consume(1)
+                            self.__token_bucket.consume(est_tokens)
+                            self.__active += 1
+                            self.__stats["admitted"] += 1
+                            return
+                    if deadline is not None:
+                        remaining = deadline - now
+                        if remaining <= 0:
+                            self.__stats["rejected"] += 1
+                            raise SchedulerRejected(f"Waited more than {self.queue_timeout}s for an LLM slot")
+                        wait = remaining if wait is None else min(wait, remaining)
+                    self.__cond.wait(wait)
+            finally:
+                self.__waiters.remove(ticket)
+                self.__cond.notify_all()
+
+    def release(self, actual_tokens: int = 0, est_tokens: int = 0, failed: bool = False) -> None:
+        with self.__cond:
+            self.__active -= 1
+            self.__stats["failed" if failed else "completed"] += 1
+            if actual_tokens:
+                self.__token_bucket.adjust(actual_tokens - est_tokens)
+            self.__cond.notify_all()
+
+    @contextmanager
+    def slot(self, priority: int = DEFAULT_PRIORITY, est_tokens: int = 0):
+        self.acquire(priority, est_tokens)
+        failed = False
+        try:
+            yield
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self.release(est_tokens=est_tokens, failed=failed)
+
+    def run(self, fn, priority: int = DEFAULT_PRIORITY, est_tokens: int = 0, usage_of=None):
+        """Call ``fn`` under admission control; ``usage_of(result)`` reports actual tokens used."""
+        attempt = 0
+        while True:
+            self.acquire(priority, est_tokens)
+            try:
+                result = fn()
+            except Exception as e:
+                self.release(est_tokens=est_tokens, failed=True)
+                if attempt >= self.max_retries or not _is_retryable(e):
+                    raise
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+                delay = max(delay, _retry_after_seconds(e))
+                with self.__cond:
+                    self.__stats["retries"] += 1
+                attempt += 1
+                time.sleep(delay)
+                continue
+            self.release(usage_of(result) if usage_of else 0, est_tokens)
+            return result
+
+    def stats(self) -> dict:
+        with self.__cond:
+            return {**self.__stats, "active": self.__active, "queued": len(self.__waiters)}
+
+
+_default_scheduler = None
+_default_lock = threading.Lock()
+
+def get_default_scheduler() -> LLMScheduler:
+    """Scheduler shared by every RAGSystem in the process."""
+    global _default_scheduler
+    with _default_lock:
+        if _default_scheduler is None:
+            _default_scheduler = LLMScheduler()
+        return _default_scheduler
@@ -0,0 +1,95 @@
+import threading
+import time
+from typing import Callable, Dict, List
+
+def _resident_bytes(resource) -> int:
+    """Best-effort parameter/buffer size of a torch model behind an embeddings wrapper; 0 when unknown."""
+    model = getattr(getattr(resource, "inner", resource), "_client", None)
+    if model is None or not hasattr(model, "parameters"):
+        return 0
+    try:
+        tensors = list(model.parameters()) + list(model.buffers())
+        return sum(t.numel() * t.element_size() for t in tensors)
+    except Exception:
+        return 0
+
+class ModelRegistry:
+    """Process-wide, refcounted registry of heavy shared resources.
+
+    Resources (embedding models, Qdrant clients, parent stores) are keyed by ``(kind, key)``
+    such as ``("dense", model_name)`` or ``("qdrant", path)``. ``acquire`` builds a resource on
+    first use and hands out the same instance afterwards; ``release`` drops a reference and
+    closes the resource (when it has ``close``) once nobody holds it.
+    """
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__entries: Dict[tuple, dict] = {}
+        self.__building: Dict[tuple, threading.Event] = {}
+
+    def acquire(self, kind: str, key: str, factory: Callable):
+        name = (kind, key)
+        while True:
+            with self.__lock:
+                entry = self.__entries.get(name)
+                if entry is not None:
+                    entry["refs"] += 1
+                    return entry["resource"]
+                building = self.__building.get(name)
+                if building is None:
+                    # 由当前线程负责加载，其他线程等待，避免同一模型被并发加载两次
+                    self.__building[name] = threading.Event()
+                    break
+            building.wait()
+
+        try:
+            start = time.perf_counter()
+            resource = factory()
+            with self.__lock:
+                self.__entries[name] = {
+                    "resource": resource,
+                    "refs": 1,
+                    "load_seconds": time.perf_counter() - start,
+                    "resident_bytes": _resident_bytes(resource),
+                }
+            return resource
+        finally:
+            with self.__lock:
+                self.__building.pop(name).set()
+
+    def release(self, kind: str, key: str) -> None:
+        name = (kind, key)
+        with self.__lock:
+            entry = self.__entries.get(name)
+            if entry is None:
+                return
+            entry["refs"] -= 1
+            if entry["refs"] > 0:
+                return
+            del self.__entries[name]
+        close = getattr(entry["resource"], "close", None)
+        if callable(close):
+            try:
+                close()
+            except Exception as e:
+                print(f"Warning: could not close {kind} resource {key}: {e}")
+
+    def stats(self) -> List[dict]:
+        """What is resident, how many holders each resource has and (for torch models) its size."""
+        with self.__lock:
+            return [
+                {"kind": kind, "key": key, "refs": entry["refs"], "load_seconds": round(entry["load_seconds"], 3),
+                 "resident_bytes": entry["resident_bytes"]}
+                for (kind, key), entry in sorted(self.__entries.items())
+            ]
+
+_default_registry = None
+_default_lock = threading.Lock()
+
+def get_model_registry() -> ModelRegistry:
+    """Registry shared by every RAGSystem in the process."""
+    global _default_registry
+    with _default_lock:
+        if _default_registry is None:
+            _default_registry = ModelRegistry()
+        return _default_registry
@@ -1,119 +1,165 @@
 import uuid
-from langchain_deepseek import ChatDeepSeek
+from pathlib import Path
 import config
+import telemetry
 from db.vector_db_manager import VectorDbManager
 from db.parent_store_manager import ParentStoreManager
+from db.document_catalog import DocumentCatalog
+from db.dedup_index import NearDuplicateIndex
+from db.document_router import DocumentRouter
 from document_chunker import DocumentChuncker
 from rag_agent.tools import ToolFactory
+from rag_agent.speculative import SpeculativeRetriever
+from rag_agent.answer_cache import SemanticAnswerCache
+from rag_agent.retrieval_memo import RetrievalMemo
+from rag_agent.fast_paths import RouteStats
+from core.llm_cache import PersistentLLMCache
+from core.llm_client import ScheduledChatDeepSeek, PromptCacheStats
+from core.llm_scheduler import get_default_scheduler
+from core.llm_hedging import HedgingPolicy
+from core.model_registry import get_model_registry
 from rag_agent.graph import create_agent_graph
-import json
-import time
-from pathlib import Path
 
 class RAGSystem:
+    """One collection's retrieval stack and agent.
+
+    Embedding models and the Qdrant client are shared by every RAGSystem in the process; the
+    parent store, Markdown directory, document catalog, dedup index and routing collection
+    belong to the collection (the default collection keeps the configured paths, others get
+    ``<path>_<collection>`` siblings).
+    """
     
     def __init__(self, collection_name=config.CHILD_COLLECTION):
         self.collection_name = collection_name
-        self.vector_db = VectorDbManager()
-        self.parent_store = ParentStoreManager()
+        self.registry = get_model_registry()
+        self.vector_db = VectorDbManager(self.registry)
+        self.markdown_dir = config.collection_path(config.MARKDOWN_DIR, collection_name)
+        self.__parent_store_key = str(Path(config.collection_path(config.PARENT_STORE_PATH, collection_name)).resolve())
+        self.parent_store = self.registry.acquire(
+            "parent_store", self.__parent_store_key, lambda: ParentStoreManager(self.__parent_store_key)
+        )
+        self.catalog = DocumentCatalog(config.collection_path(config.DOCUMENT_CATALOG_PATH, collection_name))
+        self.dedup_index = (NearDuplicateIndex(config.collection_path(config.DEDUP_INDEX_PATH, collection_name))
+                            if config.DEDUP_ENABLED else None)
+        self.router = DocumentRouter(self.vector_db, child_collection=collection_name) if config.ROUTING_ENABLED else None
         self.chunker = DocumentChuncker()
         self.agent_graph = None
         self.llm = None
+        self.llm_cache = None
+        self.retrieval_memo = RetrievalMemo() if config.RETRIEVAL_MEMO_ENABLED else None
+        self.answer_cache = SemanticAnswerCache(self.vector_db.get_dense_embeddings()) if config.ANSWER_CACHE_ENABLED else None
+        self.route_stats = RouteStats()
         self.thread_id = str(uuid.uuid4())
+        self.telemetry_callback = telemetry.TelemetryCallbackHandler()
         
-    def initialize(self):
-        # region agent log
-        try:
-            Path("/Users/leida/Cline/agentic-rag-for-dummies/.cursor/debug.log").open("a", encoding="utf-8").write(
-                json.dumps(
-                    {
-                        "sessionId": "debug-session",
-                        "runId": "pre-fix",
-                        "hypothesisId": "H1",
-                        "location": "project/core/rag_system.py:initialize:entry",
-                        "message": "RAGSystem.initialize entered",
-                        "data": {"collection_name": self.collection_name},
-                        "timestamp": int(time.time() * 1000),
-                    },
-                    ensure_ascii=False,
-                )
-                + "\n"
-            )
-        except Exception:
-            pass
-        # endregion agent log
-
+    def initialize(self, llm=None):
+        """Build the agent graph; ``llm`` overrides the DeepSeek client (e.g. a scripted model for benchmarks)."""
         self.vector_db.create_collection(self.collection_name)
         collection = self.vector_db.get_collection(self.collection_name)
-        
-        # region agent log
-        try:
-            Path("/Users/leida/Cline/agentic-rag-for-dummies/.cursor/debug.log").open("a", encoding="utf-8").write(
-                json.dumps(
-                    {
-                        "sessionId": "debug-session",
-                        "runId": "pre-fix",
-                        "hypothesisId": "H2",
-                        "location": "project/core/rag_system.py:initialize:llm_config",
-                        "message": "Preparing DeepSeek LLM config (no secrets)",
-                        "data": {
-                            "model": getattr(config, "DEEPSEEK_MODEL", None),
-                            "base_url": getattr(config, "DEEPSEEK_BASE_URL", None),
-                            "temperature": getattr(config, "LLM_TEMPERATURE", None),
-                            "has_api_key": bool(getattr(config, "DEEPSEEK_API_KEY", "")),
-                            "llm_class": "ChatDeepSeek",
-                        },
-                        "timestamp": int(time.time() * 1000),
-                    },
-                    ensure_ascii=False,
-                )
-                + "\n"
-            )
-        except Exception:
-            pass
-        # endregion agent log
+        if self.router is not None:
+            self.router.ensure_ready()
 
-        llm = ChatDeepSeek(
-            model=config.DEEPSEEK_MODEL,
-            temperature=config.LLM_TEMPERATURE,
-            api_key=config.DEEPSEEK_API_KEY,
-            base_url=config.DEEPSEEK_BASE_URL,
-        )
-        self.llm = llm
-        tools = ToolFactory(collection).create_tools()
-        self.agent_graph = create_agent_graph(llm, tools)
+        if llm is None:
+            if config.LLM_CACHE_ENABLED:
+                if config.LLM_TEMPERATURE == 0:
+                    self.llm_cache = PersistentLLMCache()
+                else:
+                    print("LLM cache disabled: responses are only cached when LLM_TEMPERATURE is 0.")
 
-        # region agent log
-        try:
-            Path("/Users/leida/Cline/agentic-rag-for-dummies/.cursor/debug.log").open("a", encoding="utf-8").write(
-                json.dumps(
-                    {
-                        "sessionId": "debug-session",
-                        "runId": "pre-fix",
-                        "hypothesisId": "H3",
-                        "location": "project/core/rag_system.py:initialize:exit",
-                        "message": "RAGSystem.initialize completed",
-                        "data": {"agent_graph_ready": self.agent_graph is not None},
-                        "timestamp": int(time.time() * 1000),
-                    },
-                    ensure_ascii=False,
-                )
-                + "\n"
+            llm = ScheduledChatDeepSeek(
+                model=config.DEEPSEEK_MODEL,
+                temperature=config.LLM_TEMPERATURE,
+                api_key=config.DEEPSEEK_API_KEY,
+                base_url=config.DEEPSEEK_BASE_URL,
+                cache=self.llm_cache,
+                # 启用调度器时由调度器统一负责带抖动的退避重试
+                max_retries=0 if config.LLM_SCHEDULER_ENABLED else 2,
             )
-        except Exception:
-            pass
-        # endregion agent log
+            llm.prompt_cache_stats = PromptCacheStats()
+            if config.LLM_SCHEDULER_ENABLED:
+                llm.scheduler = get_default_scheduler()
+            if config.LLM_HEDGING_ENABLED:
+                llm.hedging = HedgingPolicy()
+        self.llm = llm
+        tool_factory = ToolFactory(collection, retrieval_memo=self.retrieval_memo, parent_store=self.parent_store,
+                                   dedup_index=self.dedup_index, router=self.router)
+        tools = tool_factory.create_tools()
+        speculative_retriever = SpeculativeRetriever(tool_factory) if config.SPECULATIVE_RETRIEVAL else None
+        self.agent_graph = create_agent_graph(
+            llm, tools,
+            speculative_retriever=speculative_retriever,
+            answer_cache=self.answer_cache,
+            route_stats=self.route_stats
+        )
+
         
-    def get_config(self):
+    def get_config(self, request_id=None, thread_id=None):
         # recursion_limit: LangGraph 每次 invoke 的最大“步数/递归”上限（默认 25，容易触发）
-        return {
-            "configurable": {"thread_id": self.thread_id},
+        # thread_id: 每个会话独立的对话记忆；未指定时使用默认会话
+        configurable = {"thread_id": thread_id or self.thread_id}
+        if request_id:
+            configurable["request_id"] = request_id
+        run_config = {
+            "configurable": configurable,
             "recursion_limit": getattr(config, "LANGGRAPH_RECURSION_LIMIT", 50),
         }
+        if telemetry.get_tracer().enabled:
+            run_config["callbacks"] = [self.telemetry_callback]
+        return run_config
+
+    def end_request(self, request_id):
+        """Release request-scoped state once a graph invocation finished."""
+        if self.retrieval_memo is not None:
+            self.retrieval_memo.release(request_id)
     
-    def reset_thread(self):
+    def get_llm_stats(self):
+        stats = {}
+        if getattr(self.llm, "scheduler", None) is not None:
+            stats["scheduler"] = self.llm.scheduler.stats()
+        if getattr(self.llm, "hedging", None) is not None:
+            stats["hedging"] = self.llm.hedging.stats()
+        if self.llm_cache is not None:
+            stats["cache"] = self.llm_cache.stats()
+        if getattr(self.llm, "prompt_cache_stats", None) is not None:
+            stats["prompt_cache"] = self.llm.prompt_cache_stats.stats()
+        return stats
+
+    def get_retrieval_memo_stats(self):
+        return self.retrieval_memo.stats() if self.retrieval_memo else {}
+
+    def get_answer_cache_stats(self):
+        return self.answer_cache.stats() if self.answer_cache else {}
+
+    def get_route_stats(self):
+        return self.route_stats.stats()
+
+    def get_embedding_cache_stats(self):
+        return self.vector_db.get_embedding_cache_stats()
+
+    def get_dedup_stats(self):
+        return self.dedup_index.stats() if self.dedup_index else {}
+
+    def get_resource_stats(self):
+        return self.registry.stats()
+
+    def close(self):
+        """Release this system's shared models, Qdrant client and parent store."""
+        if self.parent_store is not None:
+            self.registry.release("parent_store", self.__parent_store_key)
+            self.parent_store = None
+        self.vector_db.close()
+
+    def invalidate_caches(self):
+        """Drop cached answers after the corpus changed."""
+        if self.answer_cache:
+            self.answer_cache.invalidate()
+
+    def reset_thread(self, thread_id=None):
+        """Drop a session's conversation memory; without ``thread_id`` the default session is rotated."""
+        target = thread_id or self.thread_id
         try:
-            self.agent_graph.checkpointer.delete_thread(self.thread_id)
+            self.agent_graph.checkpointer.delete_thread(target)
         except Exception as e:
-            print(f"Warning: Could not delete thread {self.thread_id}: {e}")
-        self.thread_id = str(uuid.uuid4())
+            print(f"Warning: Could not delete thread {target}: {e}")
+        if thread_id is None:
+            self.thread_id = str(uuid.uuid4())
@@ -0,0 +1,183 @@
+"""Portable index snapshots: one zstd-compressed tar stream with a manifest and per-member checksums.
+
+Layout (in stream order)::
+
+    manifest.json            format version, embedding model, chunking settings and counts
+    points/000000.jsonl ...  child-collection points with their dense and sparse vectors
+    parents/<id>.json        parent store files
+    markdown/<name>.md       converted Markdown sources
+    catalog.jsonl            document catalog rows
+    dedup/<table>/000000.jsonl  near-duplicate clusters and references (only with DEDUP_ENABLED)
+    checksums.json           sha256 of every member above
+
+Restoring streams the archive and upserts the stored vectors instead of converting, chunking
+and embedding again; nothing is staged on disk.
+"""
+import hashlib
+import io
+import json
+import tarfile
+import time
+from pathlib import Path
+import zstandard
+import config
+from db.document_catalog import embedding_model_id
+
+SNAPSHOT_FORMAT_VERSION = 1
+
+def _manifest(rag_system, documents: int) -> dict:
+    return {
+        "format_version": SNAPSHOT_FORMAT_VERSION,
+        "created_at": time.time(),
+        "embedding_model": embedding_model_id(),
+        "dense_model": config.DENSE_MODEL,
+        "sparse_model": config.SPARSE_MODEL,
+        "collection": rag_system.collection_name,
+        # 去重开启时 Qdrant 中只有每个簇的代表块，簇与引用表必须随快照一起恢复
+        "dedup_enabled": rag_system.dedup_index is not None,
+        "chunking": {
+            "mode": config.CHUNKING_MODE,
+            "child_chunk_size": config.CHILD_CHUNK_SIZE,
+            "child_chunk_overlap": config.CHILD_CHUNK_OVERLAP,
+            "child_chunk_tokens": config.CHILD_CHUNK_TOKENS,
+            "child_chunk_overlap_tokens": config.CHILD_CHUNK_OVERLAP_TOKENS,
+        },
+        "documents": documents,
+    }
+
+class _SnapshotWriter:
+    def __init__(self, tar):
+        self.tar = tar
+        self.checksums = {}
+
+    def add(self, name: str, data: bytes) -> None:
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mtime = int(time.time())
+        self.tar.addfile(info, io.BytesIO(data))
+        self.checksums[name] = hashlib.sha256(data).hexdigest()
+
+def export_snapshot(rag_system, markdown_dir, output_path, level=config.SNAPSHOT_COMPRESSION_LEVEL) -> dict:
+    """Write the current index to ``output_path``; the caller must hold off writers. Returns the manifest."""
+    documents, _ = rag_system.catalog.list(limit=-1)
+    manifest = _manifest(rag_system, len(documents))
+    counts = {"points": 0, "parents": 0, "markdown": 0, "dedup_clusters": 0, "dedup_refs": 0}
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, "wb") as raw:
+        with zstandard.ZstdCompressor(level=level, threads=-1).stream_writer(raw) as compressed:
+            with tarfile.open(fileobj=compressed, mode="w|") as tar:
+                writer = _SnapshotWriter(tar)
+                writer.add("manifest.json", json.dumps(manifest, indent=2).encode("utf-8"))
+                for i, batch in enumerate(rag_system.vector_db.export_points(rag_system.collection_name)):
+                    lines = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in batch)
+                    writer.add(f"points/{i:06d}.jsonl", lines.encode("utf-8"))
+                    counts["points"] += len(batch)
+                for path in rag_system.parent_store.iter_files():
+                    writer.add(f"parents/{path.name}", path.read_bytes())
+                    counts["parents"] += 1
+                for path in sorted(Path(markdown_dir).glob("*.md")):
+                    writer.add(f"markdown/{path.name}", path.read_bytes())
+                    counts["markdown"] += 1
+                writer.add("catalog.jsonl", "".join(
+                    json.dumps(doc, ensure_ascii=False) + "\n" for doc in documents
+                ).encode("utf-8"))
+                if rag_system.dedup_index is not None:
+                    for table in ("clusters", "refs"):
+                        for i, rows in enumerate(rag_system.dedup_index.export_rows(table)):
+                            lines = "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows)
+                            writer.add(f"dedup/{table}/{i:06d}.jsonl", lines.encode("utf-8"))
+                            counts[f"dedup_{table}"] += len(rows)
+                # 校验和放在最后，导入时流式读取每个成员并逐一比对
+                writer.add("checksums.json", json.dumps({"counts": counts, "sha256": writer.checksums}, indent=2).encode("utf-8"))
+    manifest["counts"] = counts
+    return manifest
+
+def _check_manifest(manifest: dict) -> None:
+    if manifest.get("format_version") != SNAPSHOT_FORMAT_VERSION:
+        raise ValueError(f"Unsupported snapshot format version: {manifest.get('format_version')}")
+    if manifest.get("embedding_model") != embedding_model_id():
+        raise ValueError(
+            f"Snapshot was built with embedding model / chunking {manifest.get('embedding_model')!r}, "
+            f"but this node uses {embedding_model_id()!r}; re-ingest the documents instead."
+        )
+    if manifest.get("dedup_enabled", False) != config.DEDUP_ENABLED:
+        raise ValueError(
+            f"Snapshot was built with DEDUP_ENABLED={manifest.get('dedup_enabled', False)}, "
+            f"but this node has DEDUP_ENABLED={config.DEDUP_ENABLED}; re-ingest the documents instead."
+        )
+
+def _iter_members(snapshot_path):
+    """Stream ``(name, data)`` for every archive member, verifying as it goes.
+
+    The manifest must come first and is checked as soon as it is read, so a snapshot built
+    with another embedding model, chunking or dedup setting is refused before anything else is
+    decompressed. Every later member is hashed on the fly; ``checksums.json`` comes last and
+    is only yielded (as a parsed dict) once all digests matched.
+    """
+    manifest, digests = None, {}
+    with open(snapshot_path, "rb") as raw:
+        with zstandard.ZstdDecompressor().stream_reader(raw) as decompressed:
+            with tarfile.open(fileobj=decompressed, mode="r|") as tar:
+                for member in tar:
+                    if not member.isfile():
+                        continue
+                    name = member.name
+                    if Path(name).is_absolute() or ".." in Path(name).parts:
+                        raise ValueError(f"Unsafe path in snapshot: {name}")
+                    data = tar.extractfile(member).read()
+                    if name == "checksums.json":
+                        checksums = json.loads(data)
+                        if digests != checksums["sha256"]:
+                            bad = sorted(set(digests.items()) ^ set(checksums["sha256"].items()))
+                            raise ValueError(f"Snapshot checksum mismatch for: {', '.join(sorted({n for n, _ in bad}))}")
+                        yield name, checksums
+                        return
+                    if name == "manifest.json":
+                        manifest = json.loads(data)
+                        _check_manifest(manifest)
+                    elif manifest is None:
+                        raise ValueError("Snapshot does not start with a manifest")
+                    digests[name] = hashlib.sha256(data).hexdigest()
+                    yield name, data
+    raise ValueError("Snapshot is truncated: checksums.json is missing")
+
+def import_snapshot(doc_manager, snapshot_path) -> dict:
+    """Replace the node's index with the snapshot's; the caller must hold off writers. Returns the manifest.
+
+    Members are restored straight from the decompressed stream. Only the catalog is held back
+    until the checksums verified, so a corrupt or truncated archive never registers documents:
+    the partially restored index is cleared again and the error re-raised.
+    """
+    rag_system = doc_manager.rag_system
+    manifest, catalog_rows = None, []
+    try:
+        for name, data in _iter_members(snapshot_path):
+            if name == "manifest.json":
+                manifest = json.loads(data)
+                doc_manager.clear_all()
+            elif name.startswith("points/"):
+                batch = [json.loads(line) for line in data.decode("utf-8").splitlines() if line]
+                rag_system.vector_db.import_points(rag_system.collection_name, batch)
+            elif name.startswith("parents/"):
+                rag_system.parent_store.restore_file(Path(name).name, data)
+            elif name.startswith("markdown/"):
+                (doc_manager.markdown_dir / Path(name).name).write_bytes(data)
+            elif name == "catalog.jsonl":
+                catalog_rows = [json.loads(line) for line in data.decode("utf-8").splitlines() if line]
+            elif name.startswith("dedup/") and rag_system.dedup_index is not None:
+                table = Path(name).parent.name
+                rows = [json.loads(line) for line in data.decode("utf-8").splitlines() if line]
+                rag_system.dedup_index.import_rows(table, rows)
+            elif name == "checksums.json":
+                manifest["counts"] = data.get("counts", {})
+    except Exception:
+        if manifest is not None:
+            doc_manager.clear_all()
+        raise
+    for row in catalog_rows:
+        rag_system.catalog.upsert(row)
+    if rag_system.router is not None:
+        rag_system.router.rebuild()
+    rag_system.invalidate_caches()
+    return manifest
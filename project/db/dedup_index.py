@@ -0,0 +1,205 @@
+import re
+import sqlite3
+import threading
+import uuid
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List
+import numpy as np
+import xxhash
+from langchain_core.documents import Document
+import config
+
+_MASK64 = (1 << 64) - 1
+_BANDS = 4
+_BAND_BITS = 64 // _BANDS
+_WHITESPACE = re.compile(r"\s+")
+
+def simhash(text: str, shingle_size=config.DEDUP_SHINGLE_CHARS) -> int:
+    """64-bit SimHash over character shingles of the normalized text (works for CJK and Latin alike)."""
+    normalized = _WHITESPACE.sub(" ", text.lower()).strip()
+    if len(normalized) <= shingle_size:
+        shingles = Counter([normalized])
+    else:
+        shingles = Counter(normalized[i:i + shingle_size] for i in range(len(normalized) - shingle_size + 1))
+    hashes = np.fromiter((xxhash.xxh64_intdigest(s) for s in shingles), dtype=np.uint64, count=len(shingles))
+    counts = np.fromiter(shingles.values(), dtype=np.int64, count=len(shingles))
+    # (shingles, 64) matrix of hash bits, column i = bit i
+    bits = np.unpackbits(hashes.astype("<u8").view(np.uint8).reshape(-1, 8), axis=1, bitorder="little")
+    weights = counts @ (2 * bits.astype(np.int64) - 1)
+    return int(np.packbits(weights > 0, bitorder="little").view("<u8")[0])
+
+def _signed(value: int) -> int:
+    # SQLite INTEGER is a signed 64-bit value
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+def _bands(signature: int) -> List[int]:
+    return [(signature >> (i * _BAND_BITS)) & ((1 << _BAND_BITS) - 1) for i in range(_BANDS)]
+
+class NearDuplicateIndex:
+    """Persistent SimHash index that stores each near-duplicate child chunk once.
+
+    Every indexed child belongs to a cluster; the first occurrence is the canonical chunk that
+    goes into Qdrant (tagged with ``dup_cluster``), later near-duplicates (Hamming distance up
+    to ``max_distance``) only add a source reference. Candidates are found by banding the
+    64-bit signature into four 16-bit bands, which is exact for distances up to 3. When the
+    document holding a canonical chunk is removed, another reference is promoted in its place.
+    """
+
+    def __init__(self, db_path=config.DEDUP_INDEX_PATH, max_distance=config.DEDUP_MAX_HAMMING,
+                 min_chars=config.DEDUP_MIN_CHARS):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_distance = max_distance
+        self.min_chars = min_chars
+        self.__lock = threading.Lock()
+        self.__stats = {"checked": 0, "duplicates": 0, "promoted": 0}
+        self.__conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self.__conn.row_factory = sqlite3.Row
+        self.__conn.execute("PRAGMA journal_mode=WAL")
+        self.__conn.execute(
+            "CREATE TABLE IF NOT EXISTS clusters ("
+            "cluster_id TEXT PRIMARY KEY, signature INTEGER NOT NULL, b0 INTEGER, b1 INTEGER, b2 INTEGER, b3 INTEGER, "
+            "content TEXT NOT NULL, canonical_source TEXT NOT NULL, canonical_parent_id TEXT NOT NULL)"
+        )
+        self.__conn.execute(
+            "CREATE TABLE IF NOT EXISTS refs ("
+            "cluster_id TEXT NOT NULL, source TEXT NOT NULL, parent_id TEXT NOT NULL, start_index INTEGER, "
+            "PRIMARY KEY (cluster_id, parent_id, start_index))"
+        )
+        for i in range(_BANDS):
+            self.__conn.execute(f"CREATE INDEX IF NOT EXISTS idx_clusters_b{i} ON clusters(b{i})")
+        self.__conn.execute("CREATE INDEX IF NOT EXISTS idx_clusters_source ON clusters(canonical_source)")
+        self.__conn.execute("CREATE INDEX IF NOT EXISTS idx_refs_source ON refs(source)")
+        self.__conn.commit()
+
+    def __find(self, signature: int):
+        bands = _bands(signature)
+        rows = self.__conn.execute(
+            "SELECT cluster_id, signature FROM clusters WHERE b0 = ? OR b1 = ? OR b2 = ? OR b3 = ?", bands
+        ).fetchall()
+        best, best_distance = None, self.max_distance + 1
+        for row in rows:
+            distance = bin(signature ^ (row["signature"] & _MASK64)).count("1")
+            if distance < best_distance:
+                best, best_distance = row["cluster_id"], distance
+        return best
+
+    def filter_new(self, child_chunks: List[Document]) -> List[Document]:
+        """Register ``child_chunks`` and return only those that need indexing.
+
+        Kept chunks get a ``dup_cluster`` metadata entry; near-duplicates of an existing
+        cluster (including earlier chunks of the same batch) are recorded as references.
+        """
+        kept = []
+        with self.__lock:
+            for chunk in child_chunks:
+                if len(chunk.page_content) < self.min_chars:
+                    kept.append(chunk)
+                    continue
+                self.__stats["checked"] += 1
+                signature = simhash(chunk.page_content)
+                cluster_id = self.__find(signature)
+                source = chunk.metadata.get("source", "")
+                parent_id = chunk.metadata.get("parent_id", "")
+                start_index = chunk.metadata.get("start_index")
+                if cluster_id is None:
+                    cluster_id = uuid.uuid4().hex
+                    self.__conn.execute(
+                        "INSERT INTO clusters (cluster_id, signature, b0, b1, b2, b3, content, canonical_source, canonical_parent_id) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (cluster_id, _signed(signature), *_bands(signature), chunk.page_content, source, parent_id),
+                    )
+                    chunk.metadata["dup_cluster"] = cluster_id
+                    kept.append(chunk)
+                else:
+                    self.__stats["duplicates"] += 1
+                self.__conn.execute(
+                    "INSERT OR IGNORE INTO refs (cluster_id, source, parent_id, start_index) VALUES (?, ?, ?, ?)",
+                    (cluster_id, source, parent_id, start_index),
+                )
+            self.__conn.commit()
+        return kept
+
+    def references(self, cluster_ids) -> Dict[str, List[dict]]:
+        cluster_ids = list({c for c in cluster_ids if c})
+        if not cluster_ids:
+            return {}
+        with self.__lock:
+            rows = self.__conn.execute(
+                f"SELECT cluster_id, source, parent_id FROM refs WHERE cluster_id IN ({', '.join('?' * len(cluster_ids))}) "
+                "ORDER BY source, parent_id",
+                cluster_ids,
+            ).fetchall()
+        refs = {}
+        for row in rows:
+            refs.setdefault(row["cluster_id"], []).append({"source": row["source"], "parent_id": row["parent_id"]})
+        return refs
+
+    def remove_source(self, source: str) -> List[Document]:
+        """Forget one document's references; returns canonical chunks to re-index under a remaining reference."""
+        promoted = []
+        with self.__lock:
+            self.__conn.execute("DELETE FROM refs WHERE source = ?", (source,))
+            clusters = self.__conn.execute(
+                "SELECT cluster_id, content FROM clusters WHERE canonical_source = ?", (source,)
+            ).fetchall()
+            for cluster in clusters:
+                ref = self.__conn.execute(
+                    "SELECT source, parent_id, start_index FROM refs WHERE cluster_id = ? ORDER BY source, parent_id LIMIT 1",
+                    (cluster["cluster_id"],),
+                ).fetchone()
+                if ref is None:
+                    self.__conn.execute("DELETE FROM clusters WHERE cluster_id = ?", (cluster["cluster_id"],))
+                    continue
+                self.__conn.execute(
+                    "UPDATE clusters SET canonical_source = ?, canonical_parent_id = ? WHERE cluster_id = ?",
+                    (ref["source"], ref["parent_id"], cluster["cluster_id"]),
+                )
+                metadata = {"source": ref["source"], "parent_id": ref["parent_id"], "dup_cluster": cluster["cluster_id"]}
+                if ref["start_index"] is not None:
+                    metadata["start_index"] = ref["start_index"]
+                promoted.append(Document(page_content=cluster["content"], metadata=metadata))
+            self.__conn.commit()
+            self.__stats["promoted"] += len(promoted)
+        return promoted
+
+    def export_rows(self, table: str, batch_size=1024):
+        """Yield batches of rows of ``clusters`` or ``refs`` as plain dicts, for snapshots."""
+        if table not in ("clusters", "refs"):
+            raise ValueError(f"Unknown dedup table: {table!r}")
+        offset = 0
+        while True:
+            with self.__lock:
+                rows = self.__conn.execute(
+                    f"SELECT * FROM {table} ORDER BY rowid LIMIT ? OFFSET ?", (batch_size, offset)
+                ).fetchall()
+            if not rows:
+                return
+            yield [dict(row) for row in rows]
+            offset += len(rows)
+
+    def import_rows(self, table: str, rows: List[dict]) -> None:
+        if table not in ("clusters", "refs"):
+            raise ValueError(f"Unknown dedup table: {table!r}")
+        if not rows:
+            return
+        columns = list(rows[0])
+        with self.__lock:
+            self.__conn.executemany(
+                f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                [tuple(row[c] for c in columns) for row in rows],
+            )
+            self.__conn.commit()
+
+    def clear(self) -> None:
+        with self.__lock:
+            self.__conn.execute("DELETE FROM refs")
+            self.__conn.execute("DELETE FROM clusters")
+            self.__conn.commit()
+
+    def stats(self) -> dict:
+        with self.__lock:
+            clusters = self.__conn.execute("SELECT COUNT(*) FROM clusters").fetchone()[0]
+            refs = self.__conn.execute("SELECT COUNT(*) FROM refs").fetchone()[0]
+        return {**self.__stats, "clusters": clusters, "references": refs}
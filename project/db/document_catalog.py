@@ -0,0 +1,114 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import config
+
+COLUMNS = ("name", "original_name", "content_hash", "size_bytes", "page_count", "parent_count", "child_count",
+           "embedding_model", "ingested_at", "duration_seconds")
+
+def file_sha256(path, block_size=1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while block := f.read(block_size):
+            digest.update(block)
+    return digest.hexdigest()
+
+def embedding_model_id() -> str:
+    """Models plus child-chunking settings; a document indexed under a different id is re-ingested."""
+    if config.CHUNKING_MODE == "tokens":
+        chunking = f"tokens:{config.CHILD_CHUNK_TOKENS}/{config.CHILD_CHUNK_OVERLAP_TOKENS}@{config.DENSE_MAX_SEQ_LENGTH}"
+    else:
+        chunking = f"chars:{config.CHILD_CHUNK_SIZE}/{config.CHILD_CHUNK_OVERLAP}"
+    return f"{config.DENSE_MODEL}+{config.SPARSE_MODEL}|{chunking}"
+
+class DocumentCatalog:
+    """SQLite manifest of ingested documents, keyed by document name (file stem).
+
+    It is the source of truth for listing and for skip/update decisions, so neither needs a
+    directory scan. Rows migrated from an existing Markdown directory have no hash or counts.
+    """
+
+    def __init__(self, db_path=config.DOCUMENT_CATALOG_PATH):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.__lock = threading.Lock()
+        self.__conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self.__conn.row_factory = sqlite3.Row
+        self.__conn.execute("PRAGMA journal_mode=WAL")
+        self.__conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            "name TEXT PRIMARY KEY, original_name TEXT NOT NULL, content_hash TEXT, size_bytes INTEGER, "
+            "page_count INTEGER, parent_count INTEGER, child_count INTEGER, embedding_model TEXT, "
+            "ingested_at REAL, duration_seconds REAL)"
+        )
+        self.__conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_hash ON documents(content_hash)")
+        self.__conn.commit()
+
+    def get(self, name: str) -> Optional[Dict]:
+        with self.__lock:
+            row = self.__conn.execute("SELECT * FROM documents WHERE name = ?", (name,)).fetchone()
+        return dict(row) if row else None
+
+    def find_by_hash(self, content_hash: str) -> Optional[Dict]:
+        with self.__lock:
+            row = self.__conn.execute("SELECT * FROM documents WHERE content_hash = ? LIMIT 1", (content_hash,)).fetchone()
+        return dict(row) if row else None
+
+    def upsert(self, record: Dict) -> None:
+        values = {column: record.get(column) for column in COLUMNS}
+        values["ingested_at"] = values["ingested_at"] or time.time()
+        with self.__lock:
+            self.__conn.execute(
+                f"INSERT OR REPLACE INTO documents ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                tuple(values.values()),
+            )
+            self.__conn.commit()
+
+    def delete(self, name: str) -> None:
+        with self.__lock:
+            self.__conn.execute("DELETE FROM documents WHERE name = ?", (name,))
+            self.__conn.commit()
+
+    def clear(self) -> None:
+        with self.__lock:
+            self.__conn.execute("DELETE FROM documents")
+            self.__conn.commit()
+
+    def count(self, query: str = "") -> int:
+        where, params = self.__search_clause(query)
+        with self.__lock:
+            return self.__conn.execute(f"SELECT COUNT(*) FROM documents {where}", params).fetchone()[0]
+
+    def list(self, offset: int = 0, limit: int = 50, query: str = "") -> Tuple[List[Dict], int]:
+        """One page of documents ordered by name, optionally filtered by a name substring, plus the total."""
+        where, params = self.__search_clause(query)
+        with self.__lock:
+            rows = self.__conn.execute(
+                f"SELECT * FROM documents {where} ORDER BY original_name LIMIT ? OFFSET ?", (*params, limit, offset)
+            ).fetchall()
+            total = self.__conn.execute(f"SELECT COUNT(*) FROM documents {where}", params).fetchone()[0]
+        return [dict(row) for row in rows], total
+
+    def migrate_from_markdown(self, markdown_dir) -> int:
+        """Register Markdown files that predate the catalog; only runs while the catalog is empty."""
+        if self.count():
+            return 0
+        paths = sorted(Path(markdown_dir).glob("*.md"))
+        with self.__lock:
+            self.__conn.executemany(
+                "INSERT OR IGNORE INTO documents (name, original_name, size_bytes, ingested_at) VALUES (?, ?, ?, ?)",
+                [(p.stem, f"{p.stem}.pdf", p.stat().st_size, p.stat().st_mtime) for p in paths],
+            )
+            self.__conn.commit()
+        return len(paths)
+
+    @staticmethod
+    def __search_clause(query: str):
+        query = (query or "").strip()
+        if not query:
+            return "", ()
+        pattern = "%" + query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        return "WHERE original_name LIKE ? ESCAPE '\\'", (pattern,)
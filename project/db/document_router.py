@@ -0,0 +1,244 @@
+import math
+import re
+import threading
+import uuid
+from collections import Counter
+from typing import Dict, List, Optional
+import numpy as np
+from qdrant_client.http import models as qmodels
+import config
+import telemetry
+
+ROUTING_LEVELS = ("document", "section")
+_TOKEN = re.compile(r"[a-z0-9]+|[\u4e00-\u9fff]")
+_RRF_K = 60
+
+def _section_key(metadata: dict) -> str:
+    return " > ".join(str(metadata[h]) for h in ("H1", "H2") if metadata.get(h))
+
+def _tokenize(text: str) -> List[str]:
+    return _TOKEN.findall(text.lower())
+
+class HeadingBM25:
+    """Okapi BM25 over short heading texts; small enough to rebuild in memory after every corpus change."""
+
+    def __init__(self, texts: List[str], k1=1.5, b=0.75):
+        self.k1, self.b = k1, b
+        self.__docs = [Counter(_tokenize(t)) for t in texts]
+        self.__lengths = [sum(d.values()) for d in self.__docs]
+        self.__avg_length = sum(self.__lengths) / len(self.__lengths) if self.__lengths else 0.0
+        df = Counter(term for d in self.__docs for term in d)
+        n = len(self.__docs)
+        self.__idf = {term: math.log(1 + (n - f + 0.5) / (f + 0.5)) for term, f in df.items()}
+
+    def scores(self, query: str) -> List[float]:
+        terms = [t for t in set(_tokenize(query)) if t in self.__idf]
+        results = []
+        for doc, length in zip(self.__docs, self.__lengths):
+            norm = self.k1 * (1 - self.b + self.b * length / (self.__avg_length or 1))
+            results.append(sum(
+                self.__idf[t] * doc[t] * (self.k1 + 1) / (doc[t] + norm) for t in terms if t in doc
+            ))
+        return results
+
+class DocumentRouter:
+    """Coarse document/section index that narrows child search to the most relevant part of the corpus.
+
+    At ingestion the dense vectors of a document's child chunks are read back from the child
+    collection (no re-embedding) and averaged into one centroid per document and one per H1/H2
+    section, stored in a small dense-only collection with the section's headings and parent ids.
+    ``search_filter`` routes a query to the top-M documents or sections by centroid similarity,
+    optionally fused (RRF) with BM25 over the headings, and returns a payload filter for the
+    regular hybrid child search.
+    """
+
+    def __init__(self, vector_db, child_collection=config.CHILD_COLLECTION, collection_name=None,
+                 level=config.ROUTING_LEVEL, top_m=config.ROUTING_TOP_M, heading_bm25=config.ROUTING_HEADING_BM25):
+        if level not in ROUTING_LEVELS:
+            raise ValueError(f"Unknown routing level: {level!r} (expected one of {ROUTING_LEVELS})")
+        self.vector_db = vector_db
+        self.child_collection = child_collection
+        # 每个子块集合（租户）有自己的路由集合
+        self.collection_name = collection_name or f"{child_collection}_routing"
+        self.level = level
+        self.top_m = top_m
+        self.heading_bm25 = heading_bm25
+        self.__client = vector_db.get_client()
+        self.__embeddings = vector_db.get_dense_embeddings()
+        self.__lock = threading.Lock()
+        self.__bm25 = None
+
+    def ensure_ready(self) -> None:
+        """Create the routing collection and bring it in line with the child collection.
+
+        Documents ingested while routing was disabled get their centroids, and centroids of
+        documents no longer in the child collection are dropped; otherwise routing would filter
+        them out of (or route to nothing in) every search.
+        """
+        if self.__ensure_collection() and self.__client.count(self.child_collection).count:
+            print("Building document routing index from existing child chunks...")
+            self.rebuild()
+            return
+        child_sources = self.vector_db.list_sources(self.child_collection)
+        routed_sources = self.__routed_sources()
+        missing, stale = child_sources - routed_sources, routed_sources - child_sources
+        if missing or stale:
+            print(f"Syncing document routing index: {len(missing)} missing, {len(stale)} stale documents")
+        for source in sorted(stale):
+            self.delete_source(source)
+        for source in sorted(missing):
+            self.index_document(source)
+
+    def __routed_sources(self) -> set:
+        sources, offset = set(), None
+        while True:
+            points, offset = self.__client.scroll(
+                collection_name=self.collection_name, limit=1024, offset=offset,
+                scroll_filter=qmodels.Filter(must=[qmodels.FieldCondition(key="level", match=qmodels.MatchValue(value="document"))]),
+                with_payload=["source"], with_vectors=False,
+            )
+            sources.update(point.payload["source"] for point in points)
+            if offset is None:
+                return sources
+
+    def __ensure_collection(self) -> bool:
+        if self.__client.collection_exists(self.collection_name):
+            return False
+        self.__client.create_collection(
+            collection_name=self.collection_name,
+            vectors_config=qmodels.VectorParams(size=len(self.__embeddings.embed_query("test")), distance=qmodels.Distance.COSINE),
+        )
+        for field in ("source", "level"):
+            self.__client.create_payload_index(self.collection_name, field, qmodels.PayloadSchemaType.KEYWORD)
+        return True
+
+    def rebuild(self) -> int:
+        self.clear()
+        return self.__upsert(self.vector_db.iter_dense_vectors(self.child_collection))
+
+    def index_document(self, source: str) -> int:
+        """(Re)compute the centroids of one document from its stored child vectors."""
+        self.__ensure_collection()
+        self.delete_source(source)
+        return self.__upsert(self.vector_db.iter_dense_vectors(self.child_collection, source=source))
+
+    def delete_source(self, source: str) -> None:
+        if not self.__client.collection_exists(self.collection_name):
+            return
+        self.__client.delete(
+            collection_name=self.collection_name,
+            points_selector=qmodels.FilterSelector(filter=qmodels.Filter(must=[
+                qmodels.FieldCondition(key="source", match=qmodels.MatchValue(value=source))
+            ])),
+        )
+        self.__invalidate()
+
+    def clear(self) -> None:
+        if self.__client.collection_exists(self.collection_name):
+            self.__client.delete_collection(self.collection_name)
+        self.__ensure_collection()
+        self.__invalidate()
+
+    def __upsert(self, vectors) -> int:
+        groups = {}
+        for metadata, vector in vectors:
+            source = metadata.get("source", "")
+            section = _section_key(metadata)
+            keys = [("document", source, "")] + ([("section", source, section)] if section else [])
+            headings = {str(metadata[h]) for h in ("H1", "H2", "H3") if metadata.get(h)}
+            for key in keys:
+                group = groups.setdefault(key, {"sum": np.zeros(len(vector)), "count": 0, "parents": set(), "headings": set()})
+                group["sum"] += vector
+                group["count"] += 1
+                group["parents"].add(metadata.get("parent_id", ""))
+                group["headings"] |= headings
+
+        points = []
+        for (level, source, section), group in groups.items():
+            centroid = group["sum"] / group["count"]
+            centroid /= np.linalg.norm(centroid) or 1.0
+            points.append(qmodels.PointStruct(
+                id=str(uuid.uuid5(uuid.NAMESPACE_URL, f"{level}\0{source}\0{section}")),
+                vector=centroid.tolist(),
+                payload={
+                    "level": level,
+                    "source": source,
+                    "section": section,
+                    "headings": " | ".join(sorted(group["headings"])),
+                    "parent_ids": sorted(group["parents"]),
+                    "child_count": group["count"],
+                },
+            ))
+        for i in range(0, len(points), 256):
+            self.__client.upsert(collection_name=self.collection_name, points=points[i:i + 256])
+        self.__invalidate()
+        return len(points)
+
+    def __invalidate(self) -> None:
+        with self.__lock:
+            self.__bm25 = None
+
+    def __heading_index(self):
+        with self.__lock:
+            if self.__bm25 is not None:
+                return self.__bm25
+        entries, offset = [], None
+        while True:
+            points, offset = self.__client.scroll(
+                collection_name=self.collection_name, scroll_filter=self.__level_filter(), limit=1024, offset=offset,
+                with_payload=True, with_vectors=False,
+            )
+            entries.extend(point.payload for point in points)
+            if offset is None:
+                break
+        index = (entries, HeadingBM25([e["headings"] for e in entries]))
+        with self.__lock:
+            self.__bm25 = index
+        return index
+
+    def __level_filter(self):
+        return qmodels.Filter(must=[qmodels.FieldCondition(key="level", match=qmodels.MatchValue(value=self.level))])
+
+    def route(self, query: str, top_m: Optional[int] = None) -> List[Dict]:
+        """Payloads of the top-M documents or sections for ``query``, best first."""
+        top_m = top_m or self.top_m
+        if not self.__client.collection_exists(self.collection_name):
+            return []
+        with telemetry.span("routing.route", level=self.level, top_m=top_m) as route_span:
+            hits = self.__client.query_points(
+                collection_name=self.collection_name,
+                query=self.__embeddings.embed_query(query),
+                query_filter=self.__level_filter(),
+                limit=top_m * 2 if self.heading_bm25 else top_m,
+                with_payload=True,
+            ).points
+            ranked = [hit.payload for hit in hits]
+            if self.heading_bm25:
+                ranked = self.__fuse_headings(query, ranked, top_m)
+            route_span.set_attribute("routed", len(ranked))
+        return ranked[:top_m]
+
+    def __fuse_headings(self, query: str, dense_ranked: List[Dict], top_m: int) -> List[Dict]:
+        entries, bm25 = self.__heading_index()
+        scores = bm25.scores(query)
+        key = lambda payload: (payload["source"], payload["section"])
+        fused, payloads = {}, {}
+        for rank, payload in enumerate(dense_ranked):
+            fused[key(payload)] = fused.get(key(payload), 0.0) + 1 / (_RRF_K + rank + 1)
+            payloads[key(payload)] = payload
+        heading_ranked = sorted((i for i, s in enumerate(scores) if s > 0), key=lambda i: -scores[i])[:top_m * 2]
+        for rank, i in enumerate(heading_ranked):
+            fused[key(entries[i])] = fused.get(key(entries[i]), 0.0) + 1 / (_RRF_K + rank + 1)
+            payloads.setdefault(key(entries[i]), entries[i])
+        return [payloads[k] for k in sorted(fused, key=lambda k: -fused[k])]
+
+    def search_filter(self, query: str, top_m: Optional[int] = None) -> Optional[qmodels.Filter]:
+        """Child-collection filter restricting search to the routed scope; ``None`` searches everything."""
+        routed = self.route(query, top_m)
+        if not routed:
+            return None
+        if self.level == "document":
+            key, values = "metadata.source", [payload["source"] for payload in routed]
+        else:
+            key, values = "metadata.parent_id", [pid for payload in routed for pid in payload["parent_ids"]]
+        return qmodels.Filter(must=[qmodels.FieldCondition(key=key, match=qmodels.MatchAny(any=values))])
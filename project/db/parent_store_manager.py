@@ -1,17 +1,49 @@
 import json
+import re
 import shutil
+import threading
 import config
+import telemetry
+from collections import OrderedDict
+from glob import escape as glob_escape
 from pathlib import Path
 from typing import List, Dict
 
 class ParentStoreManager:
     __store_path: Path
 
-    def __init__(self, store_path=config.PARENT_STORE_PATH):
+    def __init__(self, store_path=config.PARENT_STORE_PATH, cache_size=config.PARENT_CACHE_SIZE):
         self.__store_path = Path(store_path) 
         self.__store_path.mkdir(parents=True, exist_ok=True)
+        self.__cache_size = cache_size
+        self.__cache = OrderedDict()
+        self.__cache_lock = threading.Lock()
+
+    def __cache_get(self, parent_id: str):
+        with self.__cache_lock:
+            data = self.__cache.get(parent_id)
+            if data is not None:
+                self.__cache.move_to_end(parent_id)
+            return data
+
+    def __cache_put(self, parent_id: str, data: Dict) -> None:
+        if self.__cache_size <= 0:
+            return
+        with self.__cache_lock:
+            self.__cache[parent_id] = data
+            self.__cache.move_to_end(parent_id)
+            while len(self.__cache) > self.__cache_size:
+                self.__cache.popitem(last=False)
+
+    def __cache_drop(self, parent_id: str = None) -> None:
+        with self.__cache_lock:
+            if parent_id is None:
+                self.__cache.clear()
+            else:
+                self.__cache.pop(parent_id, None)
 
     def save(self, parent_id: str, content: str, metadata: Dict) -> None:
+        self.__cache_drop(parent_id)
         file_path = self.__store_path / f"{parent_id}.json"
         file_path.write_text(
             json.dumps({"page_content": content,"metadata": metadata}, ensure_ascii=False, indent=2),
@@ -23,10 +55,15 @@ class ParentStoreManager:
             self.save(parent_id, doc.page_content, doc.metadata)
 
     def load(self, parent_id: str) -> Dict:
-        file_path = self.__store_path / (
-            parent_id if parent_id.lower().endswith(".json") else f"{parent_id}.json"
-        )
-        return json.loads(file_path.read_text(encoding="utf-8"))
+        parent_id = parent_id[:-len(".json")] if parent_id.lower().endswith(".json") else parent_id
+        with telemetry.span("parent_store.load", parent_id=parent_id) as load_span:
+            data = self.__cache_get(parent_id)
+            load_span.set_attribute("cache_hit", data is not None)
+            if data is None:
+                file_path = self.__store_path / f"{parent_id}.json"
+                data = json.loads(file_path.read_text(encoding="utf-8"))
+                self.__cache_put(parent_id, data)
+        return data
     
     def load_many(self, parent_ids: List[str]) -> List[Dict]:
         unique_ids = sorted(set(parent_ids))
@@ -41,7 +78,36 @@ class ParentStoreManager:
             })
         return results
     
+    def prefetch(self, parent_ids: List[str]) -> None:
+        """Warm the in-memory cache; missing ids are ignored."""
+        for parent_id in set(parent_ids):
+            try:
+                self.load(parent_id)
+            except (OSError, ValueError):
+                continue
+
+    def delete_document(self, doc_name: str) -> int:
+        """Delete all parent chunks of one document (ids ``<doc_name>_parent_<n>``); returns the count."""
+        pattern = re.compile(rf"{re.escape(doc_name)}_parent_\d+")
+        removed = 0
+        for file_path in self.__store_path.glob(f"{glob_escape(doc_name)}_parent_*.json"):
+            if pattern.fullmatch(file_path.stem):
+                self.__cache_drop(file_path.stem)
+                file_path.unlink(missing_ok=True)
+                removed += 1
+        return removed
+
+    def iter_files(self):
+        """Stored parent files in name order (for snapshots)."""
+        return iter(sorted(self.__store_path.glob("*.json")))
+
+    def restore_file(self, name: str, data: bytes) -> None:
+        name = Path(name).name
+        self.__cache_drop(Path(name).stem)
+        (self.__store_path / name).write_bytes(data)
+
     def clear_store(self) -> None:
+        self.__cache_drop()
         if self.__store_path.exists():
             shutil.rmtree(self.__store_path)
         self.__store_path.mkdir(parents=True, exist_ok=True)
\ No newline at end of file
@@ -1,17 +1,111 @@
+import threading
 import config
+import telemetry
+from collections import OrderedDict
+from langchain_core.embeddings import Embeddings
 from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_qdrant import QdrantVectorStore, FastEmbedSparse, RetrievalMode
+from langchain_qdrant import QdrantVectorStore, FastEmbedSparse, RetrievalMode, SparseEmbeddings
 from qdrant_client import QdrantClient
 from qdrant_client.http import models as qmodels
 from pathlib import Path
+from core.model_registry import get_model_registry
+
+RETRIEVAL_MODES = {
+    "hybrid": RetrievalMode.HYBRID,
+    "dense": RetrievalMode.DENSE,
+    "sparse": RetrievalMode.SPARSE,
+}
+
+class QueryEmbeddingCache:
+    """Thread-safe LRU of query embeddings keyed by query text; ``max_entries`` 0 disables it."""
+
+    def __init__(self, max_entries=config.QUERY_EMBEDDING_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.__entries = OrderedDict()
+        self.__lock = threading.Lock()
+        self.__stats = {"hits": 0, "misses": 0}
+
+    def get_or_compute(self, text, fn):
+        if self.max_entries <= 0:
+            return fn()
+        with self.__lock:
+            if text in self.__entries:
+                self.__entries.move_to_end(text)
+                self.__stats["hits"] += 1
+                return self.__entries[text]
+            self.__stats["misses"] += 1
+        value = fn()
+        with self.__lock:
+            self.__entries[text] = value
+            self.__entries.move_to_end(text)
+            while len(self.__entries) > self.max_entries:
+                self.__entries.popitem(last=False)
+        return value
+
+    def stats(self) -> dict:
+        with self.__lock:
+            return {**self.__stats, "entries": len(self.__entries)}
+
+class InstrumentedEmbeddings(Embeddings):
+    """Dense embeddings wrapper that records an ``embedding.dense.*`` span per call and caches query embeddings."""
+
+    def __init__(self, inner: Embeddings, query_cache_size=config.QUERY_EMBEDDING_CACHE_SIZE):
+        self.inner = inner
+        self.query_cache = QueryEmbeddingCache(query_cache_size)
+
+    def embed_documents(self, texts):
+        with telemetry.span("embedding.dense.documents", texts=len(texts)):
+            return self.inner.embed_documents(texts)
+
+    def embed_query(self, text):
+        return self.query_cache.get_or_compute(text, lambda: self.__embed_query(text))
+
+    def __embed_query(self, text):
+        with telemetry.span("embedding.dense.query"):
+            return self.inner.embed_query(text)
+
+class InstrumentedSparseEmbeddings(SparseEmbeddings):
+    """Sparse embeddings wrapper that records an ``embedding.sparse.*`` span per call and caches query embeddings."""
+
+    def __init__(self, inner: SparseEmbeddings, query_cache_size=config.QUERY_EMBEDDING_CACHE_SIZE):
+        self.inner = inner
+        self.query_cache = QueryEmbeddingCache(query_cache_size)
+
+    def embed_documents(self, texts):
+        with telemetry.span("embedding.sparse.documents", texts=len(texts)):
+            return self.inner.embed_documents(texts)
+
+    def embed_query(self, text):
+        return self.query_cache.get_or_compute(text, lambda: self.__embed_query(text))
+
+    def __embed_query(self, text):
+        with telemetry.span("embedding.sparse.query"):
+            return self.inner.embed_query(text)
 
 class VectorDbManager:
     __client: QdrantClient
-    __dense_embeddings: HuggingFaceEmbeddings
-    __sparse_embeddings: FastEmbedSparse
-    def __init__(self):
+    __dense_embeddings: InstrumentedEmbeddings
+    __sparse_embeddings: InstrumentedSparseEmbeddings
+    def __init__(self, registry=None):
+        # 模型与 Qdrant 客户端按引用计数在进程内共享：多个 RAGSystem（多集合/多租户）只加载一份
+        self.__registry = registry or get_model_registry()
+        self.__held = [
+            ("qdrant", str(Path(config.QDRANT_DB_PATH).resolve())),
+            ("dense", config.DENSE_MODEL),
+            ("sparse", config.SPARSE_MODEL),
+        ]
+        self.__client = self.__registry.acquire(*self.__held[0], self.__open_client)
+        self.__dense_embeddings = self.__registry.acquire(
+            *self.__held[1], lambda: InstrumentedEmbeddings(HuggingFaceEmbeddings(model_name=config.DENSE_MODEL))
+        )
+        self.__sparse_embeddings = self.__registry.acquire(
+            *self.__held[2], lambda: InstrumentedSparseEmbeddings(FastEmbedSparse(model_name=config.SPARSE_MODEL))
+        )
+
+    @staticmethod
+    def __open_client() -> QdrantClient:
         try:
-            self.__client = QdrantClient(path=config.QDRANT_DB_PATH)
+            return QdrantClient(path=config.QDRANT_DB_PATH)
         except RuntimeError as e:
             msg = str(e)
             if "already accessed by another instance" in msg:
@@ -28,8 +122,12 @@ class VectorDbManager:
                     f"Original error: {msg}"
                 ) from e
             raise
-        self.__dense_embeddings = HuggingFaceEmbeddings(model_name=config.DENSE_MODEL)
-        self.__sparse_embeddings = FastEmbedSparse(model_name=config.SPARSE_MODEL)
+
+    def close(self) -> None:
+        """Drop this manager's references; shared models and the client are freed with the last holder."""
+        held, self.__held = self.__held, []
+        for kind, key in held:
+            self.__registry.release(kind, key)
 
     def create_collection(self, collection_name):
         if not self.__client.collection_exists(collection_name):
@@ -51,14 +149,117 @@ class VectorDbManager:
         except Exception as e:
             print(f"Warning: could not delete collection {collection_name}: {e}")
 
-    def get_collection(self, collection_name) -> QdrantVectorStore:
+    def delete_by_source(self, collection_name, source) -> None:
+        """Delete every child chunk whose metadata ``source`` matches (used to roll back a document)."""
+        if not self.__client.collection_exists(collection_name):
+            return
+        self.__client.delete(
+            collection_name=collection_name,
+            points_selector=qmodels.FilterSelector(filter=qmodels.Filter(must=[
+                qmodels.FieldCondition(key="metadata.source", match=qmodels.MatchValue(value=source))
+            ])),
+        )
+
+    def iter_dense_vectors(self, collection_name, source=None, batch_size=256):
+        """Yield ``(metadata, dense_vector)`` for stored child chunks, optionally only those of one ``source``."""
+        if not self.__client.collection_exists(collection_name):
+            return
+        scroll_filter = None
+        if source is not None:
+            scroll_filter = qmodels.Filter(must=[
+                qmodels.FieldCondition(key="metadata.source", match=qmodels.MatchValue(value=source))
+            ])
+        offset = None
+        while True:
+            points, offset = self.__client.scroll(
+                collection_name=collection_name, scroll_filter=scroll_filter, limit=batch_size, offset=offset,
+                with_payload=True, with_vectors=True,
+            )
+            for point in points:
+                vector = point.vector
+                if isinstance(vector, dict):
+                    # 混合集合中稠密向量是未命名向量
+                    vector = vector.get("")
+                if vector is not None:
+                    yield (point.payload or {}).get("metadata", {}), vector
+            if offset is None:
+                break
+
+    def list_sources(self, collection_name, batch_size=1024) -> set:
+        """Distinct ``metadata.source`` values of the stored child chunks."""
+        sources, offset = set(), None
+        if not self.__client.collection_exists(collection_name):
+            return sources
+        while True:
+            points, offset = self.__client.scroll(
+                collection_name=collection_name, limit=batch_size, offset=offset,
+                with_payload=["metadata.source"], with_vectors=False,
+            )
+            sources.update(((point.payload or {}).get("metadata") or {}).get("source", "") for point in points)
+            if offset is None:
+                return sources
+
+    def export_points(self, collection_name, batch_size=1024):
+        """Yield batches of stored points as plain dicts (id, payload and all named vectors), for snapshots."""
+        if not self.__client.collection_exists(collection_name):
+            return
+        offset = None
+        while True:
+            points, offset = self.__client.scroll(
+                collection_name=collection_name, limit=batch_size, offset=offset, with_payload=True, with_vectors=True,
+            )
+            batch = []
+            for point in points:
+                vectors = point.vector if isinstance(point.vector, dict) else {"": point.vector}
+                batch.append({
+                    "id": point.id,
+                    "payload": point.payload,
+                    "vectors": {
+                        name: {"indices": v.indices, "values": v.values} if isinstance(v, qmodels.SparseVector) else v
+                        for name, v in vectors.items()
+                    },
+                })
+            if batch:
+                yield batch
+            if offset is None:
+                break
+
+    def import_points(self, collection_name, batch) -> None:
+        """Upsert points produced by ``export_points`` without re-embedding them."""
+        self.__client.upsert(collection_name=collection_name, points=[
+            qmodels.PointStruct(
+                id=record["id"],
+                payload=record["payload"],
+                vector={
+                    name: qmodels.SparseVector(**v) if isinstance(v, dict) else v
+                    for name, v in record["vectors"].items()
+                },
+            )
+            for record in batch
+        ])
+
+    def get_client(self) -> QdrantClient:
+        return self.__client
+
+    def get_dense_embeddings(self) -> Embeddings:
+        return self.__dense_embeddings
+
+    def get_embedding_cache_stats(self) -> dict:
+        return {
+            "dense": self.__dense_embeddings.query_cache.stats(),
+            "sparse": self.__sparse_embeddings.query_cache.stats(),
+        }
+
+    def get_collection(self, collection_name, retrieval_mode=config.RETRIEVAL_MODE) -> QdrantVectorStore:
+        if retrieval_mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode {retrieval_mode!r}; expected one of {', '.join(RETRIEVAL_MODES)}")
         try:
             return QdrantVectorStore(
                     client=self.__client,
                     collection_name=collection_name,
                     embedding=self.__dense_embeddings,
                     sparse_embedding=self.__sparse_embeddings,
-                    retrieval_mode=RetrievalMode.HYBRID,
+                    retrieval_mode=RETRIEVAL_MODES[retrieval_mode],
                     sparse_vector_name=config.SPARSE_VECTOR_NAME
                 )
         except Exception as e:
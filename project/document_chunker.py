@@ -1,22 +1,128 @@
 import os
 import glob
+import threading
 import config
+import telemetry
+from collections import Counter
+from functools import lru_cache
 from pathlib import Path
 from langchain_text_splitters import MarkdownHeaderTextSplitter, RecursiveCharacterTextSplitter
 
+# 按 token 切分时优先在段落、换行与中英文句末断开，中文文本没有空格可用
+TOKEN_MODE_SEPARATORS = ["\n\n", "\n", "。", "！", "？", "；", ". ", "! ", "? ", "; ", "，", ", ", " ", ""]
+
+@lru_cache(maxsize=None)
+def load_tokenizer(model_name=config.DENSE_MODEL):
+    from transformers import AutoTokenizer
+    return AutoTokenizer.from_pretrained(model_name, use_fast=True)
+
+# HF 快速分词器不可并发调用（"Already borrowed"），多个入库 worker 共享同一实例时串行化
+_TOKENIZER_LOCK = threading.Lock()
+
+class TokenLengthStats:
+    """Distribution of child-chunk token lengths (special tokens included) against the model limit.
+
+    Lengths are kept as a histogram (length -> count), so memory is bounded by the number of
+    distinct lengths rather than growing with every chunk ingested.
+    """
+
+    def __init__(self, max_tokens=config.DENSE_MAX_SEQ_LENGTH):
+        self.max_tokens = max_tokens
+        self.__histogram = Counter()
+        self.__lock = threading.Lock()
+
+    def add(self, lengths) -> None:
+        with self.__lock:
+            self.__histogram.update(lengths)
+
+    def stats(self) -> dict:
+        with self.__lock:
+            histogram = sorted(self.__histogram.items())
+        count = sum(n for _, n in histogram)
+        if not count:
+            return {"chunks": 0, "max_tokens": self.max_tokens}
+
+        def pick(q):
+            rank, seen = min(count - 1, int(q * count)), 0
+            for length, n in histogram:
+                seen += n
+                if seen > rank:
+                    return length
+            return histogram[-1][0]
+
+        total = sum(length * n for length, n in histogram)
+        over = [(length, n) for length, n in histogram if length > self.max_tokens]
+        return {
+            "chunks": count,
+            "max_tokens": self.max_tokens,
+            "mean": total / count,
+            "p10": pick(0.10),
+            "p50": pick(0.50),
+            "p90": pick(0.90),
+            "p99": pick(0.99),
+            "max": histogram[-1][0],
+            "truncated_chunks": sum(n for _, n in over),
+            "truncated_tokens": sum((length - self.max_tokens) * n for length, n in over),
+            # 平均每个子块占用了模型上下文的比例，越接近 1 点数越少
+            "fill_ratio": sum(min(length, self.max_tokens) * n for length, n in histogram) / (count * self.max_tokens),
+        }
+
 class DocumentChuncker:
-    def __init__(self):
+    def __init__(self, child_chunk_size=config.CHILD_CHUNK_SIZE, child_chunk_overlap=config.CHILD_CHUNK_OVERLAP,
+                 chunking_mode=config.CHUNKING_MODE, child_chunk_tokens=config.CHILD_CHUNK_TOKENS,
+                 child_chunk_overlap_tokens=config.CHILD_CHUNK_OVERLAP_TOKENS, token_stats=config.CHUNK_TOKEN_STATS):
         self.__parent_splitter = MarkdownHeaderTextSplitter(
             headers_to_split_on=config.HEADERS_TO_SPLIT_ON, 
             strip_headers=False
         )
-        self.__child_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=config.CHILD_CHUNK_SIZE, 
-            chunk_overlap=config.CHILD_CHUNK_OVERLAP
-        )
+        self.chunking_mode = chunking_mode
+        self.__tokenizer = load_tokenizer() if chunking_mode == "tokens" or token_stats else None
+        self.token_stats = TokenLengthStats() if self.__tokenizer is not None else None
+        # 递归切分会反复测量相同片段，缓存后每个片段只分词一次
+        self.__count_tokens = lru_cache(maxsize=65536)(self.__token_length)
+        if chunking_mode == "tokens":
+            # 为 [CLS]/[SEP] 等特殊 token 预留位置，保证子块不会被模型截断
+            budget = config.DENSE_MAX_SEQ_LENGTH - self.__tokenizer.num_special_tokens_to_add()
+            if child_chunk_tokens > budget:
+                print(f"CHILD_CHUNK_TOKENS={child_chunk_tokens} exceeds the model limit; using {budget}")
+                child_chunk_tokens = budget
+            self.__child_splitter = RecursiveCharacterTextSplitter(
+                chunk_size=child_chunk_tokens,
+                chunk_overlap=min(child_chunk_overlap_tokens, child_chunk_tokens // 2),
+                length_function=self.__count_tokens,
+                separators=TOKEN_MODE_SEPARATORS,
+                keep_separator="end",
+                add_start_index=True
+            )
+        else:
+            self.__child_splitter = RecursiveCharacterTextSplitter(
+                chunk_size=child_chunk_size,
+                chunk_overlap=child_chunk_overlap,
+                # 记录子块在父块中的字符偏移，检索父块时可据此只截取相关片段
+                add_start_index=True
+            )
         self.__min_parent_size = config.MIN_PARENT_SIZE
         self.__max_parent_size = config.MAX_PARENT_SIZE
 
+    def __token_length(self, text):
+        with _TOKENIZER_LOCK:
+            return len(self.__tokenizer(text, add_special_tokens=False, verbose=False)["input_ids"])
+
+    def __record_token_lengths(self, child_chunks, doc_path):
+        """Count tokens for all children in one batched tokenizer call and flag chunks the model would truncate."""
+        if self.token_stats is None or not child_chunks:
+            return
+        with _TOKENIZER_LOCK:
+            encoded = self.__tokenizer([c.page_content for c in child_chunks], add_special_tokens=True, verbose=False)
+        lengths = [len(ids) for ids in encoded["input_ids"]]
+        for chunk, n in zip(child_chunks, lengths):
+            chunk.metadata["token_count"] = n
+        self.token_stats.add(lengths)
+        truncated = sum(1 for n in lengths if n > self.token_stats.max_tokens)
+        if truncated:
+            print(f"⚠️ {doc_path.name}: {truncated}/{len(lengths)} child chunks exceed "
+                  f"{self.token_stats.max_tokens} tokens and will be truncated by the embedding model")
+
     def create_chunks(self, path_dir=config.MARKDOWN_DIR):
         all_parent_chunks, all_child_chunks = [], []
 
@@ -31,15 +137,22 @@ class DocumentChuncker:
     def create_chunks_single(self, md_path):
         doc_path = Path(md_path)
         
-        with open(doc_path, "r", encoding="utf-8") as f:
-            parent_chunks = self.__parent_splitter.split_text(f.read())
+        with telemetry.span("chunk.header_split"):
+            with open(doc_path, "r", encoding="utf-8") as f:
+                parent_chunks = self.__parent_splitter.split_text(f.read())
         
-        merged_parents = self.__merge_small_parents(parent_chunks)
-        split_parents = self.__split_large_parents(merged_parents)
-        cleaned_parents = self.__clean_small_chunks(split_parents)
+        with telemetry.span("chunk.merge_small"):
+            merged_parents = self.__merge_small_parents(parent_chunks)
+        with telemetry.span("chunk.split_large"):
+            split_parents = self.__split_large_parents(merged_parents)
+        with telemetry.span("chunk.clean_small"):
+            cleaned_parents = self.__clean_small_chunks(split_parents)
         
         all_parent_chunks, all_child_chunks = [], []
-        self.__create_child_chunks(all_parent_chunks, all_child_chunks, cleaned_parents, doc_path)
+        with telemetry.span("chunk.children"):
+            self.__create_child_chunks(all_parent_chunks, all_child_chunks, cleaned_parents, doc_path)
+        with telemetry.span("chunk.token_count", chunks=len(all_child_chunks)):
+            self.__record_token_lengths(all_child_chunks, doc_path)
         return all_parent_chunks, all_child_chunks
 
     def __merge_small_parents(self, chunks):
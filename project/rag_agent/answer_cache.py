@@ -0,0 +1,97 @@
+import threading
+import numpy as np
+import config
+
+class SemanticAnswerCache:
+    """Per-sub-question answer cache keyed by the dense embedding of the rewritten question."""
+
+    def __init__(self, embeddings, similarity_threshold=config.ANSWER_CACHE_SIMILARITY, max_entries=config.ANSWER_CACHE_MAX_ENTRIES):
+        self.embeddings = embeddings
+        self.similarity_threshold = similarity_threshold
+        self.max_entries = max_entries
+        self.__questions = []
+        self.__answers = []
+        self.__vectors = []
+        self.__matrix = None
+        self.__pending = {}
+        self.__generation = 0
+        self.__lock = threading.Lock()
+        self.__hits = 0
+        self.__misses = 0
+        self.__invalidations = 0
+
+    def __embed(self, text: str) -> np.ndarray:
+        vector = np.asarray(self.embeddings.embed_query(text), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    @property
+    def generation(self) -> int:
+        """Bumped by every ``invalidate``; read it before ``lookup`` and hand it back to ``store``."""
+        with self.__lock:
+            return self.__generation
+
+    def lookup(self, question: str):
+        vector = self.__embed(question)
+        with self.__lock:
+            # 仅复用问题向量；它与语料无关，因此 invalidate 不清空
+            self.__pending[question] = vector
+            if len(self.__pending) > self.max_entries:
+                self.__pending.pop(next(iter(self.__pending)))
+            if self.__vectors:
+                if self.__matrix is None:
+                    self.__matrix = np.vstack(self.__vectors)
+                scores = self.__matrix @ vector
+                best = int(np.argmax(scores))
+                if scores[best] >= self.similarity_threshold:
+                    self.__hits += 1
+                    return self.__answers[best]
+            self.__misses += 1
+            return None
+
+    def store(self, question: str, answer: str, generation: int) -> None:
+        """Cache ``answer`` unless the corpus changed since ``generation`` was read."""
+        with self.__lock:
+            if generation != self.__generation:
+                return
+            vector = self.__pending.pop(question, None)
+        if vector is None:
+            vector = self.__embed(question)
+
+        with self.__lock:
+            if generation != self.__generation:
+                # The corpus changed while this answer was being produced.
+                return
+            if question in self.__questions:
+                idx = self.__questions.index(question)
+                self.__answers[idx] = answer
+                return
+            self.__questions.append(question)
+            self.__answers.append(answer)
+            self.__vectors.append(vector)
+            while len(self.__questions) > self.max_entries:
+                self.__questions.pop(0)
+                self.__answers.pop(0)
+                self.__vectors.pop(0)
+            self.__matrix = None
+
+    def invalidate(self) -> None:
+        with self.__lock:
+            self.__questions.clear()
+            self.__answers.clear()
+            self.__vectors.clear()
+            self.__matrix = None
+            self.__generation += 1
+            self.__invalidations += 1
+
+    def stats(self) -> dict:
+        with self.__lock:
+            lookups = self.__hits + self.__misses
+            return {
+                "entries": len(self.__questions),
+                "lookups": lookups,
+                "hits": self.__hits,
+                "misses": self.__misses,
+                "hit_rate": (self.__hits / lookups) if lookups else 0.0,
+                "invalidations": self.__invalidations,
+            }
@@ -0,0 +1,81 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+import config
+
+# Wall-clock deadline of the branch whose LLM call is running on this thread (0 = none)
+_deadline = contextvars.ContextVar("agent_deadline", default=0.0)
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a step is cut off at the branch deadline."""
+
+def _branch_limit(per_question: int, per_request: int, n_branches: int) -> int:
+    limits = []
+    if per_question > 0:
+        limits.append(per_question)
+    if per_request > 0:
+        limits.append(max(1, per_request // max(1, n_branches)))
+    return min(limits) if limits else 0
+
+def branch_budget(n_branches: int, request_started_at: float = 0.0) -> dict:
+    """Budget for one process_question branch; per-request limits are split evenly across branches. 0 means unlimited."""
+    deadlines = []
+    if config.AGENT_TIMEOUT_SECONDS > 0:
+        deadlines.append(time.time() + config.AGENT_TIMEOUT_SECONDS)
+    if config.REQUEST_TIMEOUT_SECONDS > 0 and request_started_at:
+        deadlines.append(request_started_at + config.REQUEST_TIMEOUT_SECONDS)
+    return {
+        "deadline": min(deadlines) if deadlines else 0.0,
+        "max_tool_calls": _branch_limit(config.AGENT_MAX_TOOL_CALLS, config.REQUEST_MAX_TOOL_CALLS, n_branches),
+        "max_prompt_tokens": _branch_limit(config.AGENT_MAX_PROMPT_TOKENS, config.REQUEST_MAX_PROMPT_TOKENS, n_branches),
+    }
+
+@contextmanager
+def deadline_scope(deadline: float):
+    """Make ``deadline`` visible to LLM calls made inside the block (see ``remaining_seconds``)."""
+    token = _deadline.set(deadline or 0.0)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+def remaining_seconds():
+    """Seconds left before the current branch deadline, or None when no deadline applies."""
+    deadline = _deadline.get()
+    if not deadline:
+        return None
+    return max(0.0, deadline - time.time())
+
+def run_until(fn, deadline: float):
+    """Run ``fn`` and give up at ``deadline``; the call keeps running on its own daemon thread."""
+    if not deadline:
+        return fn()
+    done, outcome = threading.Event(), {}
+    context = contextvars.copy_context()
+
+    def target():
+        try:
+            outcome["result"] = context.run(fn)
+        except BaseException as e:
+            outcome["error"] = e
+        finally:
+            done.set()
+
+    threading.Thread(target=target, daemon=True).start()
+    if not done.wait(max(0.0, deadline - time.time())):
+        raise DeadlineExceeded("Step did not finish before the branch deadline")
+    if "error" in outcome:
+        raise outcome["error"]
+    return outcome["result"]
+
+def budget_exhausted(state) -> str:
+    """Return the name of the exhausted budget, or an empty string."""
+    budget = state.get("budget") or {}
+    if budget.get("deadline") and time.time() >= budget["deadline"]:
+        return "time"
+    if budget.get("max_tool_calls") and state.get("tool_calls_used", 0) >= budget["max_tool_calls"]:
+        return "tool_calls"
+    if budget.get("max_prompt_tokens") and state.get("prompt_tokens_used", 0) >= budget["max_prompt_tokens"]:
+        return "prompt_tokens"
+    return ""
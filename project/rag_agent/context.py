@@ -0,0 +1,54 @@
+import json
+from langchain_core.messages import AIMessage, ToolMessage
+import config
+
+COMPACTED_MARKER = "[compacted]"
+
+def estimate_tokens(text) -> int:
+    """Cheap token estimate: ~4 Latin characters per token, ~1 token per CJK character."""
+    text = text if isinstance(text, str) else str(text)
+    non_ascii = sum(1 for ch in text if ord(ch) > 127)
+    return (len(text) - non_ascii) // 4 + non_ascii + 1
+
+def compact_tool_output(content: str, excerpt_chars: int = config.COMPACT_EXCERPT_CHARS) -> str:
+    """Shrink a tool result to short excerpts, keeping parent ids and sources for citations."""
+    try:
+        items = json.loads(content)
+    except (TypeError, ValueError):
+        items = None
+
+    if isinstance(items, list) and all(isinstance(item, dict) for item in items):
+        compacted = []
+        for item in items:
+            metadata = item.get("metadata") or {}
+            compacted.append({
+                "parent_id": item.get("parent_id", metadata.get("parent_id", "")),
+                "source": item.get("source", metadata.get("source", "")),
+                "excerpt": (item.get("content") or "")[:excerpt_chars],
+            })
+        return f"{COMPACTED_MARKER} " + json.dumps(compacted, ensure_ascii=False)
+
+    return f"{COMPACTED_MARKER} " + str(content)[:excerpt_chars]
+
+def compact_messages(messages, token_budget: int = config.AGENT_CONTEXT_TOKEN_BUDGET,
+                     excerpt_chars: int = config.COMPACT_EXCERPT_CHARS) -> list:
+    """Return replacement ToolMessages that bring the history under ``token_budget``.
+
+    Only tool outputs the model has already seen (i.e. followed by an AIMessage) are
+    compacted, oldest first; the latest unread results are always passed through intact.
+    """
+    total = sum(estimate_tokens(m.content) for m in messages)
+    if token_budget <= 0 or total <= token_budget:
+        return []
+
+    last_ai_index = max((i for i, m in enumerate(messages) if isinstance(m, AIMessage)), default=-1)
+    replacements = []
+    for msg in messages[:last_ai_index]:
+        if total <= token_budget:
+            break
+        if not isinstance(msg, ToolMessage) or str(msg.content).startswith(COMPACTED_MARKER):
+            continue
+        new_content = compact_tool_output(msg.content, excerpt_chars)
+        total -= estimate_tokens(msg.content) - estimate_tokens(new_content)
+        replacements.append(ToolMessage(content=new_content, tool_call_id=msg.tool_call_id, name=msg.name, id=msg.id))
+    return replacements
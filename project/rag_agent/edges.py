@@ -1,12 +1,23 @@
 from typing import Literal
 from langgraph.types import Send
 from .graph_state import State
+from .budget import branch_budget
 
-def route_after_rewrite(state: State) -> Literal["human_input", "process_question"]:
+def route_after_rewrite(state: State) -> Literal["human_input", "process_question", "aggregate"]:
     if not state.get("questionIsClear", False):
         return "human_input"
-    else:
-        return [
-                Send("process_question", {"question": query, "question_index": idx, "messages": []})
-                for idx, query in enumerate(state["rewrittenQuestions"])
+    cached = set(state.get("cachedQuestionIndexes") or [])
+    pending = [(idx, query) for idx, query in enumerate(state["rewrittenQuestions"]) if idx not in cached]
+    if not pending:
+        return "aggregate"
+    budget = branch_budget(len(pending), state.get("requestStartedAt", 0.0))
+    return [
+                Send("process_question", {
+                    "question": query,
+                    "question_index": idx,
+                    "speculative_key": state.get("speculative_key", ""),
+                    "budget": budget,
+                    "messages": []
+                })
+                for idx, query in pending
             ]
\ No newline at end of file
@@ -0,0 +1,48 @@
+import re
+import threading
+import config
+
+# Words that usually point back at earlier turns; queries containing them need the rewrite step.
+_REFERRING_WORDS = {
+    "it", "its", "this", "that", "these", "those", "they", "them", "their",
+    "he", "she", "him", "her", "above", "previous", "earlier", "same", "again",
+    "also", "else", "other", "another", "former", "latter",
+}
+_REFERRING_CJK = ("它", "这", "那", "他", "她", "上面", "上述", "之前", "刚才", "还有", "其他", "其它")
+_CJK_RE = re.compile(r"[一-鿿]")
+_WORD_RE = re.compile(r"[A-Za-z']+")
+
+def is_self_contained_query(query: str, conversation: str = "",
+                            max_words: int = config.FAST_PATH_MAX_QUERY_WORDS) -> bool:
+    """Cheap pre-check: True for a first-turn, single, short question with no back-references."""
+    if conversation or not isinstance(query, str):
+        return False
+    text = query.strip()
+    if not text:
+        return False
+    if text.count("?") + text.count("？") > 1 or ";" in text or "；" in text or "\n" in text:
+        return False
+
+    words = [w.lower() for w in _WORD_RE.findall(text)]
+    cjk_chars = len(_CJK_RE.findall(text))
+    if any(w in _REFERRING_WORDS for w in words) or any(term in text for term in _REFERRING_CJK):
+        return False
+    size = len(words) + cjk_chars // 2
+    return 3 <= size <= max_words
+
+class RouteStats:
+    """Counts the route each request took through the fast-path branches and the LLM calls they saved."""
+
+    def __init__(self):
+        self.__routes = {}
+        self.__llm_calls_saved = 0
+        self.__lock = threading.Lock()
+
+    def record(self, route: str, llm_calls_saved: int = 0) -> None:
+        with self.__lock:
+            self.__routes[route] = self.__routes.get(route, 0) + 1
+            self.__llm_calls_saved += llm_calls_saved
+
+    def stats(self) -> dict:
+        with self.__lock:
+            return {"routes": dict(self.__routes), "llm_calls_saved": self.__llm_calls_saved}
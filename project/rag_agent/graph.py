@@ -2,40 +2,88 @@ from langgraph.graph import START, END, StateGraph
 from langgraph.checkpoint.memory import InMemorySaver
 from langgraph.prebuilt import ToolNode, tools_condition
 from functools import partial
+import config
 
 from .graph_state import State
 from .nodes import *
 from .edges import *
+from .fast_paths import is_self_contained_query
 
-def create_agent_graph(llm, tools_list):
+def create_agent_graph(
+    llm,
+    tools_list,
+    combined_front_end=config.COMBINED_FRONT_END,
+    speculative_retriever=None,
+    answer_cache=None,
+    context_token_budget=config.AGENT_CONTEXT_TOKEN_BUDGET,
+    fast_path_rewrite=config.FAST_PATH_REWRITE,
+    fast_path_aggregate=config.FAST_PATH_AGGREGATE,
+    rewrite_precheck=is_self_contained_query,
+    route_stats=None,
+):
+    # Stable tool-schema order keeps the agent's request prefix byte-identical across requests
+    tools_list = sorted(tools_list, key=lambda t: t.name)
     llm_with_tools = llm.bind_tools(tools_list)
+    llm_final_answer = llm.bind_tools(tools_list, tool_choice="none")
     tool_node = ToolNode(tools_list)
 
+    # rewrite_precheck(query, conversation) -> bool may be swapped for e.g. a small-model classifier
+    front_end_kwargs = {
+        "llm": llm,
+        "speculative_retriever": speculative_retriever,
+        "rewrite_precheck": rewrite_precheck if fast_path_rewrite else None,
+        "route_stats": route_stats,
+    }
+
     checkpointer = InMemorySaver()
 
     print("Compiling agent graph...")
     agent_builder = StateGraph(AgentState)
-    agent_builder.add_node("agent", partial(agent_node, llm_with_tools=llm_with_tools))
-    agent_builder.add_node("tools", tool_node)
+    agent_builder.add_node("agent", partial(agent_node, llm_with_tools=llm_with_tools, llm_final_answer=llm_final_answer, speculative_retriever=speculative_retriever))
+    agent_builder.add_node("tools", partial(run_tools, tool_node=tool_node))
     agent_builder.add_node("extract_answer", extract_final_answer)
+    if context_token_budget > 0:
+        agent_builder.add_node("compact_context", partial(compact_context, token_budget=context_token_budget))
     
     agent_builder.add_edge(START, "agent")    
     agent_builder.add_conditional_edges("agent", tools_condition, {"tools": "tools", END: "extract_answer"})
-    agent_builder.add_edge("tools", "agent")    
+    if context_token_budget > 0:
+        agent_builder.add_edge("tools", "compact_context")
+        agent_builder.add_edge("compact_context", "agent")
+    else:
+        agent_builder.add_edge("tools", "agent")    
     agent_builder.add_edge("extract_answer", END)
     
     agent_subgraph = agent_builder.compile()
     
     graph_builder = StateGraph(State)
-    graph_builder.add_node("summarize", partial(analyze_chat_and_summarize, llm=llm))
-    graph_builder.add_node("analyze_rewrite", partial(analyze_and_rewrite_query, llm=llm))
+    if combined_front_end:
+        graph_builder.add_node("analyze_rewrite", partial(analyze_chat_and_rewrite, **front_end_kwargs))
+    else:
+        graph_builder.add_node("summarize", partial(analyze_chat_and_summarize, llm=llm))
+        graph_builder.add_node("analyze_rewrite", partial(analyze_and_rewrite_query, **front_end_kwargs))
     graph_builder.add_node("human_input", human_input_node)
     graph_builder.add_node("process_question", agent_subgraph)
-    graph_builder.add_node("aggregate", partial(aggregate_responses, llm=llm))
+    graph_builder.add_node("aggregate", partial(aggregate_responses, llm=llm, speculative_retriever=speculative_retriever, answer_cache=answer_cache, passthrough_single_answer=fast_path_aggregate, route_stats=route_stats))
+    if answer_cache is not None:
+        graph_builder.add_node("answer_cache_lookup", partial(lookup_cached_answers, answer_cache=answer_cache))
+    if speculative_retriever is not None:
+        graph_builder.add_node("speculative_retrieve", partial(start_speculative_retrieval, speculative_retriever=speculative_retriever))
     
-    graph_builder.add_edge(START, "summarize")
-    graph_builder.add_edge("summarize", "analyze_rewrite")
-    graph_builder.add_conditional_edges("analyze_rewrite", route_after_rewrite)
+    if combined_front_end:
+        graph_builder.add_edge(START, "analyze_rewrite")
+    else:
+        graph_builder.add_edge(START, "summarize")
+        graph_builder.add_edge("summarize", "analyze_rewrite")
+    if speculative_retriever is not None:
+        # Runs alongside the front-end LLM calls; the search itself continues in a background worker.
+        graph_builder.add_edge(START, "speculative_retrieve")
+        graph_builder.add_edge("speculative_retrieve", END)
+    if answer_cache is not None:
+        graph_builder.add_edge("analyze_rewrite", "answer_cache_lookup")
+        graph_builder.add_conditional_edges("answer_cache_lookup", route_after_rewrite)
+    else:
+        graph_builder.add_conditional_edges("analyze_rewrite", route_after_rewrite)
     graph_builder.add_edge("human_input", "analyze_rewrite")
     graph_builder.add_edge(["process_question"], "aggregate")
     graph_builder.add_edge("aggregate", END)
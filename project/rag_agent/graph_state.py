@@ -3,7 +3,7 @@ from langgraph.graph import MessagesState
 
 def accumulate_or_reset(existing: List[dict], new: List[dict]) -> List[dict]:
     if new and any(item.get('__reset__') for item in new):
-        return []
+        return [item for item in new if not item.get('__reset__')]
     return existing + new
 
 class State(MessagesState):
@@ -12,11 +12,19 @@ class State(MessagesState):
     conversation_summary: str = ""
     originalQuery: str = "" 
     rewrittenQuestions: List[str] = []
+    speculative_key: str = ""
+    cachedQuestionIndexes: List[int] = []
+    answerCacheGeneration: int = -1
+    requestStartedAt: float = 0.0
     agent_answers: Annotated[List[dict], accumulate_or_reset] = []
 
 class AgentState(MessagesState):
     """State for individual agent subgraph"""
     question: str = ""
     question_index: int = 0
+    speculative_key: str = ""
+    budget: dict = {}
+    tool_calls_used: int = 0
+    prompt_tokens_used: int = 0
     final_answer: str = ""
     agent_answers: List[dict] = []
\ No newline at end of file
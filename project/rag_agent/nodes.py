@@ -1,38 +1,45 @@
-from langchain_core.messages import SystemMessage, HumanMessage, RemoveMessage, AIMessage
+import time
+import textwrap
+from functools import lru_cache
+from langchain_core.messages import SystemMessage, HumanMessage, RemoveMessage, AIMessage, ToolMessage
+from langchain_core.runnables import RunnableConfig
+from langchain_core.runnables.config import patch_config
+from langgraph.config import get_config, get_stream_writer
 from .graph_state import State, AgentState
-from .schemas import QueryAnalysis
+from .schemas import QueryAnalysis, ConversationAnalysis
 from .prompts import *
+from .budget import budget_exhausted, deadline_scope, run_until, DeadlineExceeded
+from .context import compact_messages
+
+NO_ANSWER_TEXT = "Unable to generate an answer."
+
+@lru_cache(maxsize=None)
+def _static_system_message(prompt_fn) -> SystemMessage:
+    # Every node leads with a byte-identical system message so the provider can reuse
+    # its cached prompt prefix; all per-request content goes into later messages.
+    return SystemMessage(content=textwrap.dedent(prompt_fn()).strip())
+
+def _format_conversation_history(messages) -> str:
+    if len(messages) < 4:
+        return ""
 
-def analyze_chat_and_summarize(state: State, llm):
-    if len(state["messages"]) < 4:
-        return {"conversation_summary": ""}
-    
     relevant_msgs = [
-        msg for msg in state["messages"][:-1]
+        msg for msg in messages[:-1]
         if isinstance(msg, (HumanMessage, AIMessage))
         and not getattr(msg, "tool_calls", None)
     ]
 
     if not relevant_msgs:
-        return {"conversation_summary": ""}
-    
+        return ""
+
     conversation = "Conversation history:\n"
     for msg in relevant_msgs[-6:]:
         role = "User" if isinstance(msg, HumanMessage) else "Assistant"
         conversation += f"{role}: {msg.content}\n"
+    return conversation
 
-    summary_response = llm.with_config(temperature=0.2).invoke([SystemMessage(content=get_conversation_summary_prompt())] + [HumanMessage(content=conversation)])
-    return {"conversation_summary": summary_response.content, "agent_answers": [{"__reset__": True}]}
-
-def analyze_and_rewrite_query(state: State, llm):
+def _query_analysis_update(state: State, response, speculative_retriever=None) -> dict:
     last_message = state["messages"][-1]
-    conversation_summary = state.get("conversation_summary", "")
-
-    context_section = (f"Conversation Context:\n{conversation_summary}\n" if conversation_summary.strip() else "") + f"User Query:\n{last_message.content}\n"
-
-    llm_with_structure = llm.with_config(temperature=0.1).with_structured_output(QueryAnalysis)
-    response = llm_with_structure.invoke([SystemMessage(content=get_query_analysis_prompt())] + [HumanMessage(content=context_section)])
-
     if response.is_clear:
         delete_all = [
             RemoveMessage(id=m.id)
@@ -43,26 +50,185 @@ def analyze_and_rewrite_query(state: State, llm):
             "questionIsClear": True,
             "messages": delete_all,
             "originalQuery": last_message.content,
-            "rewrittenQuestions": response.questions
+            "rewrittenQuestions": response.questions,
+            "speculative_key": last_message.id or ""
         }
     else:
+        if speculative_retriever and last_message.id:
+            speculative_retriever.discard(last_message.id)
         clarification = response.clarification_needed or "I need more information to understand your question."
         return {
             "questionIsClear": False,
             "messages": [AIMessage(content=clarification)]
         }
 
+def _record_route(route_stats, route, llm_calls_saved=0):
+    if route_stats is not None:
+        route_stats.record(route, llm_calls_saved)
+
+def _rewrite_fast_path(state: State, rewrite_precheck, route_stats=None, speculative_retriever=None):
+    """Skip the rewrite LLM call when the pre-check deems the query already self-contained."""
+    if rewrite_precheck is None:
+        return None
+    last_message = state["messages"][-1]
+    if not rewrite_precheck(last_message.content, _format_conversation_history(state["messages"])):
+        return None
+    _record_route(route_stats, "rewrite_bypassed", llm_calls_saved=1)
+    response = QueryAnalysis(is_clear=True, questions=[last_message.content.strip()], clarification_needed="")
+    return _query_analysis_update(state, response, speculative_retriever)
+
+def analyze_chat_and_summarize(state: State, llm):
+    started_at = time.time()
+    conversation = _format_conversation_history(state["messages"])
+    if not conversation:
+        return {"conversation_summary": "", "requestStartedAt": started_at}
+
+    summary_response = llm.with_config(temperature=0.2).invoke([_static_system_message(get_conversation_summary_prompt)] + [HumanMessage(content=conversation)])
+    return {"conversation_summary": summary_response.content, "agent_answers": [{"__reset__": True}], "requestStartedAt": started_at}
+
+def analyze_and_rewrite_query(state: State, llm, speculative_retriever=None, rewrite_precheck=None, route_stats=None):
+    fast_update = _rewrite_fast_path(state, rewrite_precheck, route_stats, speculative_retriever)
+    if fast_update is not None:
+        return fast_update
+    _record_route(route_stats, "rewrite_llm")
+
+    last_message = state["messages"][-1]
+    conversation_summary = state.get("conversation_summary", "")
+
+    context_section = f"User Query:\n{last_message.content}\n" + (f"\nConversation Context:\n{conversation_summary}\n" if conversation_summary.strip() else "")
+
+    llm_with_structure = llm.with_config(temperature=0.1).with_structured_output(QueryAnalysis)
+    response = llm_with_structure.invoke([_static_system_message(get_query_analysis_prompt)] + [HumanMessage(content=context_section)])
+
+    return _query_analysis_update(state, response, speculative_retriever)
+
+def analyze_chat_and_rewrite(state: State, llm, speculative_retriever=None, rewrite_precheck=None, route_stats=None):
+    """Single-call front end: summary, clarity check and rewrite in one structured output."""
+    started_at = time.time()
+    fast_update = _rewrite_fast_path(state, rewrite_precheck, route_stats, speculative_retriever)
+    if fast_update is not None:
+        return {"conversation_summary": "", "agent_answers": [{"__reset__": True}], "requestStartedAt": started_at, **fast_update}
+    _record_route(route_stats, "rewrite_llm")
+
+    last_message = state["messages"][-1]
+    conversation = _format_conversation_history(state["messages"])
+    user_content = f"User Query:\n{last_message.content}\n" + ("\n" + conversation if conversation else "")
+
+    try:
+        llm_with_structure = llm.with_config(temperature=0.1).with_structured_output(ConversationAnalysis)
+        response = llm_with_structure.invoke([_static_system_message(get_combined_analysis_prompt)] + [HumanMessage(content=user_content)])
+    except Exception as e:
+        print(f"Combined analysis failed, falling back to two-step path: {e}")
+        response = None
+
+    if response is None or (response.is_clear and not response.questions):
+        summary_update = analyze_chat_and_summarize(state, llm)
+        rewrite_update = analyze_and_rewrite_query({**state, "conversation_summary": summary_update["conversation_summary"]}, llm, speculative_retriever)
+        return {**summary_update, **rewrite_update}
+
+    return {
+        "conversation_summary": response.conversation_summary if conversation else "",
+        "agent_answers": [{"__reset__": True}],
+        "requestStartedAt": started_at,
+        **_query_analysis_update(state, response, speculative_retriever)
+    }
+
+def start_speculative_retrieval(state: State, speculative_retriever):
+    # Keyed by the id of the incoming message so the front-end nodes running in the
+    # same superstep can reference the search without waiting for this node's write.
+    last_message = state["messages"][-1]
+    if last_message.id:
+        speculative_retriever.start(last_message.id, last_message.content)
+    return {}
+
+def lookup_cached_answers(state: State, answer_cache):
+    if not state.get("questionIsClear", False):
+        return {}
+
+    # Read before the lookups: answers produced from here on are only cached if no ingest intervened
+    generation = answer_cache.generation
+    cached_answers, cached_indexes = [], []
+    for idx, question in enumerate(state["rewrittenQuestions"]):
+        answer = answer_cache.lookup(question)
+        if answer is not None:
+            cached_answers.append({"index": idx, "question": question, "answer": answer, "cached": True})
+            cached_indexes.append(idx)
+
+    return {
+        "cachedQuestionIndexes": cached_indexes,
+        "answerCacheGeneration": generation,
+        "agent_answers": [{"__reset__": True}] + cached_answers
+    }
+
 def human_input_node(state: State):
     return {}
 
-def agent_node(state: AgentState, llm_with_tools):
-    sys_msg = SystemMessage(content=get_rag_agent_system_prompt())    
+def _format_candidate_context(candidates) -> str:
+    if not candidates:
+        return ""
+    lines = [
+        f"- [{c.get('source', '')} | parent_id: {c.get('parent_id', '')}] {c.get('content', '')}"
+        for c in candidates
+    ]
+    return (
+        "\n\nCandidate excerpts from a preliminary search on the original user query "
+        "(may be incomplete; verify with your own search):\n" + "\n".join(lines)
+    )
+
+def agent_node(state: AgentState, llm_with_tools, llm_final_answer=None, speculative_retriever=None):
+    sys_msg = _static_system_message(get_rag_agent_system_prompt)
     if not state.get("messages"):
-        human_msg = HumanMessage(content=state["question"])
-        response = llm_with_tools.invoke([sys_msg] + [human_msg])
-        return {"messages": [human_msg, response]}
-    
-    return {"messages": [llm_with_tools.invoke([sys_msg] + state["messages"])]}
+        content = state["question"]
+        if speculative_retriever and state.get("speculative_key"):
+            content += _format_candidate_context(speculative_retriever.collect(state["speculative_key"]))
+        human_msg = HumanMessage(content=content)
+        new_messages, history = [human_msg], [human_msg]
+    else:
+        new_messages, history = [], state["messages"]
+
+    exhausted = budget_exhausted(state) if llm_final_answer is not None else ""
+    if not exhausted:
+        deadline = (state.get("budget") or {}).get("deadline", 0.0)
+        try:
+            # The remaining time becomes the provider request timeout (see ScheduledChatDeepSeek)
+            with deadline_scope(deadline):
+                response = llm_with_tools.invoke([sys_msg] + history)
+        except Exception:
+            if llm_final_answer is None or not deadline or time.time() < deadline:
+                raise
+            exhausted = "time"
+    if exhausted:
+        print(f"Agent budget exhausted ({exhausted}) for question {state.get('question_index', 0)}; forcing final answer.")
+        response = llm_final_answer.invoke([sys_msg] + history + [HumanMessage(content=get_budget_exhausted_prompt())])
+        # Drop any tool calls so the subgraph always terminates here.
+        response = AIMessage(content=response.content or NO_ANSWER_TEXT)
+
+    usage = getattr(response, "usage_metadata", None) or {}
+    return {
+        "messages": new_messages + [response],
+        "tool_calls_used": state.get("tool_calls_used", 0) + len(getattr(response, "tool_calls", None) or []),
+        "prompt_tokens_used": state.get("prompt_tokens_used", 0) + usage.get("input_tokens", 0)
+    }
+
+def run_tools(state: AgentState, config: RunnableConfig, tool_node):
+    """Execute the requested tools, cutting them off at the branch deadline."""
+    deadline = (state.get("budget") or {}).get("deadline", 0.0)
+    # Tools read the branch's sub-question from here (e.g. to excerpt parents when no query is given)
+    config = patch_config(config, configurable={**(config.get("configurable") or {}), "agent_question": state.get("question", "")})
+    try:
+        return run_until(lambda: tool_node.invoke(state, config), deadline)
+    except DeadlineExceeded:
+        tool_calls = state["messages"][-1].tool_calls
+        print(f"Tool calls timed out for question {state.get('question_index', 0)}; answering with what was retrieved.")
+        return {"messages": [
+            ToolMessage(content="Tool call timed out: the time budget for this question is used up.",
+                        tool_call_id=call["id"], name=call["name"])
+            for call in tool_calls
+        ]}
+
+def compact_context(state: AgentState, token_budget):
+    replacements = compact_messages(state["messages"], token_budget)
+    return {"messages": replacements} if replacements else {}
 
 def extract_final_answer(state: AgentState):
     for msg in reversed(state["messages"]):
@@ -77,25 +243,51 @@ def extract_final_answer(state: AgentState):
             }
             return res
     return {
-        "final_answer": "Unable to generate an answer.",
+        "final_answer": NO_ANSWER_TEXT,
         "agent_answers": [{
             "index": state["question_index"],
             "question": state["question"],
-            "answer": "Unable to generate an answer."
+            "answer": NO_ANSWER_TEXT
         }]
     }
 
-def aggregate_responses(state: State, llm):
+def aggregate_responses(state: State, llm, speculative_retriever=None, answer_cache=None, passthrough_single_answer=False, route_stats=None):
+    if speculative_retriever and state.get("speculative_key"):
+        speculative_retriever.discard(state["speculative_key"])
+
     if not state.get("agent_answers"):
         return {"messages": [AIMessage(content="No answers were generated.")]}
 
     sorted_answers = sorted(state["agent_answers"], key=lambda x: x["index"])
 
+    if answer_cache is not None and state.get("answerCacheGeneration", -1) >= 0:
+        for ans in sorted_answers:
+            if not ans.get("cached") and ans["answer"] != NO_ANSWER_TEXT:
+                answer_cache.store(ans["question"], ans["answer"], state["answerCacheGeneration"])
+
+    if passthrough_single_answer and len(sorted_answers) == 1 and len(state.get("rewrittenQuestions") or []) <= 1:
+        # A single sub-answer has nothing to merge; return it as-is instead of re-synthesizing.
+        _record_route(route_stats, "aggregate_passthrough", llm_calls_saved=1)
+        answer = sorted_answers[0]["answer"]
+        if answer == NO_ANSWER_TEXT:
+            answer = "Sorry, I could not find any information to answer your question."
+        return {"messages": [AIMessage(content=answer)]}
+    _record_route(route_stats, "aggregate_llm")
+
     formatted_answers = ""
     for i, ans in enumerate(sorted_answers, start=1):
         formatted_answers += (f"\nAnswer {i}:\n"f"{ans['answer']}\n")
 
     user_message = HumanMessage(content=f"""Original user question: {state["originalQuery"]}\nRetrieved answers:{formatted_answers}""")
-    synthesis_response = llm.invoke([SystemMessage(content=get_aggregation_prompt())] + [user_message])
+    synthesis_messages = [_static_system_message(get_aggregation_prompt)] + [user_message]
+    if (get_config().get("configurable") or {}).get("stream_answer"):
+        # Only the final synthesis is streamed; every other model call stays a regular (hedged) invoke
+        writer, content = get_stream_writer(), ""
+        for chunk in llm.stream(synthesis_messages):
+            if chunk.content:
+                writer({"token": chunk.content})
+                content += chunk.content
+        return {"messages": [AIMessage(content=content)]}
+    synthesis_response = llm.invoke(synthesis_messages)
     
     return {"messages": [AIMessage(content=synthesis_response.content)]}
\ No newline at end of file
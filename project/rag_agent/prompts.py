@@ -60,7 +60,8 @@ def get_rag_agent_system_prompt() -> str:
         Workflow:
         1. Search the documents using the user query.
         2. Inspect retrieved excerpts and keep only relevant ones.
-        3. Retrieve additional surrounding context ONLY if excerpts are insufficient.
+        3. Retrieve additional surrounding context ONLY if excerpts are insufficient;
+        pass the search query you used as `query` so long sections come back trimmed to the relevant passages.
         4. Stop retrieval as soon as information is sufficient.
         5. Answer using ONLY retrieved information.
         6. List file name at the end.
@@ -73,6 +74,16 @@ def get_rag_agent_system_prompt() -> str:
         If no relevant information is found after the retry, say so.
         """
 
+def get_budget_exhausted_prompt() -> str:
+    return """
+        The retrieval budget for this question is exhausted.
+
+        - Do NOT call any more tools.
+        - Answer now using ONLY the information retrieved so far.
+        - If the retrieved information is insufficient, say so clearly.
+        - List file name at the end.
+        """
+
 def get_aggregation_prompt() -> str:
     return """
         You are merging multiple retrieved answers into a final response.
@@ -113,4 +124,42 @@ def get_aggregation_prompt() -> str:
         - Return ONLY the final answer.
         - Do NOT mention sub-questions.
         - Do NOT describe your reasoning.
-        """
\ No newline at end of file
+        """
+
+def get_combined_analysis_prompt() -> str:
+    return """
+        You receive the recent conversation history (possibly empty) and the latest user query.
+        Perform two tasks in a single response.
+
+        Task 1 - Conversation summary:
+
+        - Summarize the key topics and context from the conversation history in 1-2 concise sentences.
+        - Focus on main topics, important facts or entities, and unresolved questions.
+        - Discard greetings, misunderstandings and off-topic content.
+        - If the history is empty or has no meaningful topics, return an empty string.
+
+        Task 2 - Query rewriting for document retrieval:
+
+        - The final query must be clear and self-contained.
+        - Always return at least one rewritten query.
+        - If the query contains a specific product name, brand, proper noun, or technical term,
+        treat it as domain-specific and IGNORE the conversation context.
+        - Use the conversation context ONLY if it is needed to understand the query
+        OR to determine the domain when the query itself is ambiguous.
+        - If the query is clear but underspecified, use relevant context to disambiguate.
+        - Do NOT use context to reinterpret or replace explicit terms in the query.
+        - Do NOT add new constraints, subtopics, or details not explicitly asked.
+        - Fix grammar, typos, and unclear abbreviations.
+        - Remove filler words and conversational wording.
+        - Use concrete keywords and entities ONLY if already implied.
+
+        Splitting:
+        - If the query contains multiple unrelated information needs,
+        split it into at most 3 separate search queries.
+        - When splitting, keep each sub-query semantically equivalent.
+        - Do NOT enrich or expand meaning.
+        - Do NOT split unless it improves retrieval.
+
+        Failure:
+        - If the intent is unclear or meaningless, mark as unclear and explain what is missing.
+        """
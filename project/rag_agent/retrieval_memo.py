@@ -0,0 +1,60 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+class RetrievalMemo:
+    """Request-scoped memo shared by the parallel process_question branches of one request.
+
+    The first caller for a key computes the value; concurrent callers wait on the same
+    in-flight future (single flight). Failures are not memoized. Entries for a request are
+    dropped by ``release``; ``max_requests`` bounds memory if a request is never released.
+    """
+
+    def __init__(self, max_requests=256):
+        self.max_requests = max_requests
+        self.__requests = OrderedDict()
+        self.__lock = threading.Lock()
+        self.__stats = {"computed": 0, "deduplicated": 0, "joined_in_flight": 0, "released": 0, "evicted": 0}
+
+    def get_or_compute(self, request_id, key, fn):
+        if not request_id:
+            return fn()
+
+        with self.__lock:
+            entries = self.__requests.get(request_id)
+            if entries is None:
+                entries = self.__requests[request_id] = {}
+                while len(self.__requests) > self.max_requests:
+                    self.__requests.popitem(last=False)
+                    self.__stats["evicted"] += 1
+            future = entries.get(key)
+            owner = future is None
+            if owner:
+                future = entries[key] = Future()
+                self.__stats["computed"] += 1
+            elif future.done():
+                self.__stats["deduplicated"] += 1
+            else:
+                self.__stats["joined_in_flight"] += 1
+
+        if not owner:
+            return future.result()
+
+        try:
+            result = fn()
+        except BaseException as e:
+            with self.__lock:
+                entries.pop(key, None)
+            future.set_exception(e)
+            raise
+        future.set_result(result)
+        return result
+
+    def release(self, request_id) -> None:
+        with self.__lock:
+            if self.__requests.pop(request_id, None) is not None:
+                self.__stats["released"] += 1
+
+    def stats(self) -> dict:
+        with self.__lock:
+            return {**self.__stats, "active_requests": len(self.__requests)}
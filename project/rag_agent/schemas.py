@@ -10,4 +10,18 @@ class QueryAnalysis(BaseModel):
     )
     clarification_needed: str = Field(
         description="Explanation if the question is unclear."
-    )
\ No newline at end of file
+    )
+
+class ConversationAnalysis(BaseModel):
+    conversation_summary: str = Field(
+        description="1-2 sentence summary of the relevant conversation history, or an empty string."
+    )
+    is_clear: bool = Field(
+        description="Indicates if the user's question is clear and answerable."
+    )
+    questions: List[str] = Field(
+        description="List of rewritten, self-contained questions."
+    )
+    clarification_needed: str = Field(
+        description="Explanation if the question is unclear."
+    )
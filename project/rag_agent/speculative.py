@@ -0,0 +1,50 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import List
+import config
+
+class SpeculativeRetriever:
+    """Runs a hybrid search on the raw user query while the front-end LLM calls are in flight."""
+
+    def __init__(self, tool_factory, k=config.SPECULATIVE_K, max_pending=64, max_workers=2):
+        self.tool_factory = tool_factory
+        self.k = k
+        self.max_pending = max_pending
+        self.__executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="speculative")
+        self.__pending = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def _search_and_prefetch(self, query: str) -> List[dict]:
+        results = self.tool_factory._search_child_chunks(query, self.k)
+        parent_ids = [r["parent_id"] for r in results if r.get("parent_id")]
+        if parent_ids:
+            self.tool_factory.parent_store_manager.prefetch(parent_ids)
+        return results
+
+    def start(self, key: str, query: str) -> None:
+        future = self.__executor.submit(self._search_and_prefetch, query)
+        with self.__lock:
+            self.__pending[key] = future
+            while len(self.__pending) > self.max_pending:
+                _, stale = self.__pending.popitem(last=False)
+                stale.cancel()
+
+    def collect(self, key: str, timeout: float = config.SPECULATIVE_WAIT_SECONDS) -> List[dict]:
+        with self.__lock:
+            future = self.__pending.get(key)
+        if future is None:
+            return []
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            return []
+        except Exception as e:
+            print(f"Speculative retrieval failed: {e}")
+            return []
+
+    def discard(self, key: str) -> None:
+        with self.__lock:
+            future = self.__pending.pop(key, None)
+        if future is not None:
+            future.cancel()
@@ -1,23 +1,83 @@
 from typing import List
+from pathlib import Path
+from langchain_core.runnables import RunnableConfig
 from langchain_core.tools import tool
+from qdrant_client.http import models as qmodels
 from db.parent_store_manager import ParentStoreManager
+from core.model_registry import get_model_registry
+import config
+import telemetry
+
+def _build_excerpt(content: str, spans: List[tuple], context_chars: int, max_chars: int) -> str:
+    """Merge windows around ranked (start, end) spans into one excerpt of at most ``max_chars``."""
+    windows, budget = [], max_chars
+    for start, end in spans:
+        if budget <= 0:
+            break
+        w_start = max(0, start - context_chars)
+        w_end = min(len(content), end + context_chars, w_start + budget)
+        windows.append((w_start, w_end))
+        budget -= w_end - w_start
+
+    merged = []
+    for w_start, w_end in sorted(windows):
+        if merged and w_start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], w_end))
+        else:
+            merged.append((w_start, w_end))
+
+    parts = [content[w_start:w_end] for w_start, w_end in merged]
+    prefix = "..." if merged and merged[0][0] > 0 else ""
+    suffix = "..." if merged and merged[-1][1] < len(content) else ""
+    return prefix + "\n...\n".join(parts) + suffix
 
 class ToolFactory:
     
-    def __init__(self, collection):
+    def __init__(self, collection, retrieval_memo=None, score_threshold=config.SEARCH_SCORE_THRESHOLD, parent_store=None,
+                 dedup_index=None, router=None):
         self.collection = collection
-        self.parent_store_manager = ParentStoreManager()
+        self.score_threshold = score_threshold
+        # Sharing the ingestion-side store keeps one parent cache that writes invalidate
+        self.__parent_store_key = None
+        if parent_store is None:
+            self.__parent_store_key = str(Path(config.PARENT_STORE_PATH).resolve())
+            parent_store = get_model_registry().acquire("parent_store", self.__parent_store_key, ParentStoreManager)
+        self.parent_store_manager = parent_store
+        self.retrieval_memo = retrieval_memo
+        self.dedup_index = dedup_index
+        self.router = router
+
+    def close(self):
+        """Release the parent store if this factory acquired it itself (no ``parent_store`` passed)."""
+        if self.__parent_store_key is not None:
+            get_model_registry().release("parent_store", self.__parent_store_key)
+            self.__parent_store_key = None
+
+    def _memoized(self, run_config, key, fn):
+        """Share identical retrieval work across the parallel branches of one request."""
+        request_id = ((run_config or {}).get("configurable") or {}).get("request_id")
+        if self.retrieval_memo is None or not request_id:
+            return fn()
+        return self.retrieval_memo.get_or_compute(request_id, key, fn)
     
-    def _search_child_chunks(self, query: str, k: int) -> List[dict]:
+    def _search_child_chunks(self, query: str, k: int, run_config: RunnableConfig = None) -> List[dict]:
         """Search for the top K most relevant child chunks.
         
         Args:
             query: Search query string
             k: Number of results to return
         """
+        return self._memoized(run_config, ("search", query, k), lambda: self._run_child_search(query, k))
+
+    def _run_child_search(self, query: str, k: int) -> List[dict]:
         try:
-            results = self.collection.similarity_search(query, k=k, score_threshold=0.7)
-            return [
+            # 两阶段检索：先路由到 top-M 文档/章节，再在范围内检索子块
+            search_filter = self.router.search_filter(query) if self.router is not None else None
+            with telemetry.span("qdrant.search", k=k, routed=search_filter is not None) as search_span:
+                results = self.collection.similarity_search(query, k=k, score_threshold=self.score_threshold,
+                                                            filter=search_filter)
+                search_span.set_attribute("results", len(results))
+            hits = [
                 {
                     "content": doc.page_content,
                     "parent_id": doc.metadata.get("parent_id", ""),
@@ -25,17 +85,93 @@ class ToolFactory:
                 }
                 for doc in results
             ]
+            if self.dedup_index is not None:
+                hits = self._collapse_duplicates(hits, [doc.metadata.get("dup_cluster") for doc in results])
+            return hits
         except Exception as e:
             print(f"Error searching child chunks: {e}")
             return []
     
-    def _retrieve_parent_chunks(self, parent_ids: List[str]) -> List[dict]:
-        """Retrieve full parent chunks by their IDs.
+    def _collapse_duplicates(self, hits: List[dict], clusters: List[str]) -> List[dict]:
+        """Keep the best hit per duplicate cluster and list the other documents holding the same text."""
+        references = self.dedup_index.references(clusters)
+        collapsed, seen = [], set()
+        for hit, cluster in zip(hits, clusters):
+            if cluster:
+                if cluster in seen:
+                    continue
+                seen.add(cluster)
+                also_in = [ref for ref in references.get(cluster, []) if ref["parent_id"] != hit["parent_id"]]
+                if also_in:
+                    hit["also_in"] = also_in
+            collapsed.append(hit)
+        return collapsed
+
+    def _retrieve_parent_chunks(self, parent_ids: List[str], query: str = "", run_config: RunnableConfig = None) -> List[dict]:
+        """Retrieve parent chunks by their IDs.
     
         Args:
             parent_ids: List of parent chunk IDs to retrieve
+            query: The search query that found these parents; long parents are trimmed to the passages around the matching excerpts
         """
-        return self.parent_store_manager.load_many(parent_ids)
+        parents = []
+        for parent_id in sorted(set(parent_ids)):
+            data = self._memoized(run_config, ("parent", parent_id), lambda pid=parent_id: self.parent_store_manager.load(pid))
+            parents.append({
+                "content": data["page_content"],
+                "parent_id": parent_id,
+                "metadata": data["metadata"]
+            })
+        if not config.PARENT_EXCERPT_MODE:
+            return parents
+        # Models often omit the optional argument; the branch's sub-question is the next best query
+        query = query.strip() or ((run_config or {}).get("configurable") or {}).get("agent_question", "")
+        if not query:
+            return parents
+        return self._excerpt_parents(parents, query)
+
+    def _excerpt_parents(self, parents: List[dict], query: str) -> List[dict]:
+        max_chars = config.PARENT_EXCERPT_MAX_CHARS
+        long_parents = {p["parent_id"]: p for p in parents if len(p["content"]) > max_chars}
+        if not long_parents:
+            return parents
+
+        try:
+            with telemetry.span("qdrant.excerpt_search", parents=len(long_parents)):
+                hits = self.collection.similarity_search(
+                    query,
+                    k=4 * len(long_parents),
+                    filter=qmodels.Filter(must=[qmodels.FieldCondition(
+                        key="metadata.parent_id", match=qmodels.MatchAny(any=list(long_parents))
+                    )])
+                )
+        except Exception as e:
+            print(f"Error searching within parents, returning full parents: {e}")
+            return parents
+
+        spans = {}
+        for doc in hits:
+            parent = long_parents.get(doc.metadata.get("parent_id", ""))
+            if parent is None:
+                continue
+            start = doc.metadata.get("start_index")
+            if start is None:
+                # Chunks indexed before offsets were recorded
+                start = parent["content"].find(doc.page_content)
+            if start is not None and start >= 0:
+                spans.setdefault(parent["parent_id"], []).append((start, start + len(doc.page_content)))
+
+        results = []
+        for parent in parents:
+            parent_spans = spans.get(parent["parent_id"])
+            if parent["parent_id"] not in long_parents:
+                results.append(parent)
+            elif parent_spans:
+                excerpt = _build_excerpt(parent["content"], parent_spans, config.PARENT_EXCERPT_CONTEXT_CHARS, max_chars)
+                results.append({**parent, "content": excerpt, "excerpted": True})
+            else:
+                results.append({**parent, "content": parent["content"][:max_chars] + "...", "excerpted": True})
+        return results
     
     def create_tools(self) -> List:
         """Crea e restituisce la lista di tools."""
@@ -0,0 +1,34 @@
+"""Export or import a portable index snapshot (child vectors, parent chunks, Markdown and catalog).
+
+    python snapshot_tool.py export snapshots/index.tar.zst
+    python snapshot_tool.py import snapshots/index.tar.zst
+
+Run it while app.py / api_app.py are stopped: it opens the same local Qdrant storage. A running
+API node can also serve a snapshot at ``GET /snapshot``.
+"""
+import argparse
+import json
+import time
+from core.rag_system import RAGSystem
+from core.document_manager import DocumentManager
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("action", choices=["export", "import"])
+    parser.add_argument("path", help="Snapshot file (.tar.zst)")
+    args = parser.parse_args()
+
+    rag_system = RAGSystem()
+    rag_system.vector_db.create_collection(rag_system.collection_name)
+    doc_manager = DocumentManager(rag_system)
+    start = time.perf_counter()
+    try:
+        if args.action == "export":
+            manifest = doc_manager.export_snapshot(args.path)
+        else:
+            manifest = doc_manager.import_snapshot(args.path)
+    finally:
+        rag_system.close()
+    print(json.dumps(manifest["counts"], indent=2))
+    print(f"✓ Snapshot {args.action}ed in {time.perf_counter() - start:.1f}s: {args.path}")
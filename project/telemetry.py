@@ -0,0 +1,363 @@
+"""Structured tracing and Prometheus metrics.
+
+Spans are opened around graph nodes, tool and LLM calls (via ``TelemetryCallbackHandler``),
+embedding calls, Qdrant searches, parent-store loads and ingestion stages. Finished spans
+are written as OTLP/JSON lines to ``TRACE_EXPORT_PATH`` and aggregated into Prometheus
+histograms served on ``/metrics``. When telemetry is disabled ``span()`` returns a shared
+no-op object, so instrumented code pays one flag check.
+"""
+import atexit
+import contextvars
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from langchain_core.callbacks import BaseCallbackHandler
+import config
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Attributes copied from a parent span to its children so every span can be filtered by request.
+_INHERITED_ATTRIBUTES = ("request_id", "thread_id")
+
+_current_span = contextvars.ContextVar("rag_current_span", default=None)
+
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "attributes", "start_ns", "end_ns", "error", "_token", "_cpu_start")
+
+    def __init__(self, name, parent=None, attributes=None):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else f"{random.getrandbits(128):032x}"
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent.span_id if parent else ""
+        self.attributes = {k: parent.attributes[k] for k in _INHERITED_ATTRIBUTES if parent and k in parent.attributes}
+        self.attributes.update(attributes or {})
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.error = ""
+        self._token = None
+        self._cpu_start = time.process_time() if _tracer.capture_resources else None
+
+    @property
+    def duration_seconds(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e9
+
+    def set_attribute(self, key, value) -> None:
+        self.attributes[key] = value
+
+    def end(self, error=None) -> None:
+        if self.end_ns:
+            return
+        self.end_ns = time.time_ns()
+        if self._cpu_start is not None:
+            # Process-wide CPU time, so it includes worker threads of embedding libraries.
+            self.attributes["cpu_seconds"] = time.process_time() - self._cpu_start
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+        _tracer.finish(self)
+
+    def __enter__(self):
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current_span.reset(self._token)
+        self.end(exc)
+        return False
+
+    def to_otlp(self) -> dict:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [_otlp_attribute(k, v) for k, v in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+class _NoopSpan:
+    def set_attribute(self, key, value) -> None:
+        pass
+
+    def end(self, error=None) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def _otlp_attribute(key, value) -> dict:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+class MetricsRegistry:
+    """Minimal Prometheus histogram/counter store rendered in the text exposition format."""
+
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = buckets
+        self.__histograms = {}
+        self.__counters = {}
+        self.__help = {}
+        self.__lock = threading.Lock()
+
+    def observe(self, name: str, value: float, help_text: str = "", **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self.__lock:
+            self.__help.setdefault(name, (help_text, "histogram"))
+            entry = self.__histograms.get(key)
+            if entry is None:
+                entry = self.__histograms[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def inc(self, name: str, amount: float = 1, help_text: str = "", **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self.__lock:
+            self.__help.setdefault(name, (help_text, "counter"))
+            self.__counters[key] = self.__counters.get(key, 0) + amount
+
+    def render(self) -> str:
+        def fmt(labels, extra=()):
+            pairs = [f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"' for k, v in (*labels, *extra)]
+            return "{" + ",".join(pairs) + "}" if pairs else ""
+
+        lines, declared = [], set()
+        with self.__lock:
+            for (name, labels), (counts, total, count) in sorted(self.__histograms.items()):
+                if name not in declared:
+                    declared.add(name)
+                    lines += [f"# HELP {name} {self.__help[name][0]}", f"# TYPE {name} histogram"]
+                for bound, bucket_count in zip(self.buckets, counts):
+                    lines.append(f"{name}_bucket{fmt(labels, [('le', bound)])} {bucket_count}")
+                lines.append(f"{name}_bucket{fmt(labels, [('le', '+Inf')])} {count}")
+                lines.append(f"{name}_sum{fmt(labels)} {total}")
+                lines.append(f"{name}_count{fmt(labels)} {count}")
+            for (name, labels), value in sorted(self.__counters.items()):
+                if name not in declared:
+                    declared.add(name)
+                    lines += [f"# HELP {name} {self.__help[name][0]}", f"# TYPE {name} counter"]
+                lines.append(f"{name}{fmt(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class OTLPFileExporter:
+    """Appends finished spans as OTLP/JSON ``ExportTraceServiceRequest`` lines, in batches."""
+
+    def __init__(self, path, batch_size=64, service_name="agentic-rag"):
+        self.path = Path(path)
+        self.batch_size = batch_size
+        self.service_name = service_name
+        self.__buffer = []
+        self.__lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        with self.__lock:
+            self.__buffer.append(span)
+            if len(self.__buffer) < self.batch_size:
+                return
+            batch, self.__buffer = self.__buffer, []
+        self.__write(batch)
+
+    def flush(self) -> None:
+        with self.__lock:
+            batch, self.__buffer = self.__buffer, []
+        if batch:
+            self.__write(batch)
+
+    def __write(self, batch) -> None:
+        payload = {"resourceSpans": [{
+            "resource": {"attributes": [_otlp_attribute("service.name", self.service_name)]},
+            "scopeSpans": [{"scope": {"name": "agentic-rag"}, "spans": [s.to_otlp() for s in batch]}],
+        }]}
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self.path.open("a", encoding="utf-8") as f:
+                f.write(json.dumps(payload, ensure_ascii=False) + "\n")
+        except OSError as e:
+            print(f"Warning: could not write traces to {self.path}: {e}")
+
+
+class Tracer:
+    def __init__(self, enabled=False, export_path="", metrics=None, capture_resources=False):
+        self.enabled = enabled
+        self.capture_resources = capture_resources
+        self.exporter = OTLPFileExporter(export_path) if export_path else None
+        self.metrics = metrics or MetricsRegistry()
+        self.__listeners = []
+
+    def add_listener(self, fn) -> None:
+        """Call ``fn(span)`` for every finished span (used by the benchmarks)."""
+        self.__listeners.append(fn)
+
+    def remove_listener(self, fn) -> None:
+        if fn in self.__listeners:
+            self.__listeners.remove(fn)
+
+    def start_span(self, name, attributes=None, parent=None):
+        if not self.enabled:
+            return _NOOP_SPAN
+        return Span(name, parent or _current_span.get(), attributes)
+
+    def finish(self, span: Span) -> None:
+        status = "error" if span.error else "ok"
+        self.metrics.observe("rag_span_duration_seconds", span.duration_seconds,
+                             help_text="Duration of instrumented operations", span=span.name)
+        self.metrics.inc("rag_spans_total", help_text="Finished instrumented operations", span=span.name, status=status)
+        if self.exporter is not None:
+            self.exporter.export(span)
+        for listener in self.__listeners:
+            listener(span)
+
+    def flush(self) -> None:
+        if self.exporter is not None:
+            self.exporter.flush()
+
+
+_tracer = Tracer(config.TELEMETRY_ENABLED, config.TRACE_EXPORT_PATH if config.TRACE_EXPORT_ENABLED else "")
+atexit.register(lambda: _tracer.flush())
+
+
+def get_tracer() -> Tracer:
+    return _tracer
+
+
+def configure(enabled=None, export_path=None, capture_resources=None) -> Tracer:
+    """Switch telemetry on/off at runtime; ``export_path=""`` disables the trace file.
+
+    ``capture_resources`` adds a ``cpu_seconds`` attribute (process CPU time) to every span.
+    """
+    if enabled is not None:
+        _tracer.enabled = enabled
+    if capture_resources is not None:
+        _tracer.capture_resources = capture_resources
+    if export_path is not None:
+        _tracer.flush()
+        _tracer.exporter = OTLPFileExporter(export_path) if export_path else None
+    return _tracer
+
+
+def span(name, **attributes):
+    """Context manager timing a block as a child of the current span."""
+    if not _tracer.enabled:
+        return _NOOP_SPAN
+    return Span(name, _current_span.get(), attributes)
+
+
+def start_metrics_server(port=config.METRICS_PORT, host="0.0.0.0"):
+    """Serve ``/metrics`` in the Prometheus text format from a daemon thread."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split("?", 1)[0] != "/metrics":
+                self.send_response(404)
+                self.end_headers()
+                return
+            data = _tracer.metrics.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    httpd = ThreadingHTTPServer((host, port), Handler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, daemon=True, name="metrics-server").start()
+    print(f"✓ Prometheus metrics on http://{host}:{httpd.server_address[1]}/metrics")
+    return httpd
+
+
+class TelemetryCallbackHandler(BaseCallbackHandler):
+    """Opens spans for LangGraph nodes, tool calls and chat-model calls.
+
+    Runs that are not nodes (internal chains, parsers) get no span of their own; their
+    children attach to the nearest instrumented ancestor.
+    """
+
+    def __init__(self):
+        self.__runs = {}
+        self.__lock = threading.Lock()
+
+    def __start(self, run_id, parent_run_id, name, metadata, attributes=None):
+        metadata = metadata or {}
+        with self.__lock:
+            parent = self.__runs.get(parent_run_id, (None, None, None))[1] if parent_run_id else None
+        if name is None:
+            with self.__lock:
+                self.__runs[run_id] = (None, parent, None)
+            return
+        attrs = {k: metadata[k] for k in _INHERITED_ATTRIBUTES if k in metadata}
+        attrs.update(attributes or {})
+        new_span = _tracer.start_span(name, attrs, parent=parent)
+        # Make the run's span current so telemetry.span() calls inside the node/tool/model nest under it
+        token = _current_span.set(new_span) if isinstance(new_span, Span) else None
+        with self.__lock:
+            self.__runs[run_id] = (new_span, new_span if isinstance(new_span, Span) else parent, token)
+
+    def __end(self, run_id, error=None):
+        with self.__lock:
+            own_span, _, token = self.__runs.pop(run_id, (None, None, None))
+        if token is not None:
+            try:
+                _current_span.reset(token)
+            except (ValueError, RuntimeError):
+                # Ended from a different context than it started in; that context is not reused
+                pass
+        if own_span is not None:
+            own_span.end(error)
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        node = (metadata or {}).get("langgraph_node")
+        is_node = node and kwargs.get("name") == node
+        self.__start(run_id, parent_run_id, f"node.{node}" if is_node else None, metadata)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self.__end(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self.__end(run_id, error)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        name = (serialized or {}).get("name") or kwargs.get("name") or "tool"
+        self.__start(run_id, parent_run_id, f"tool.{name}", metadata)
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self.__end(run_id)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self.__end(run_id, error)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        node = (metadata or {}).get("langgraph_node", "")
+        self.__start(run_id, parent_run_id, f"llm.{node or 'direct'}", metadata, {"node": node})
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self.__end(run_id)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self.__end(run_id, error)
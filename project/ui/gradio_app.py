@@ -2,6 +2,7 @@ import base64
 from pathlib import Path
 import json
 import re
+import time
 import uuid
 from datetime import datetime
 
@@ -9,12 +10,16 @@ import gradio as gr
 import pandas as pd
 from core.chat_interface import ChatInterface
 from core.document_manager import DocumentManager
+from core.ingest_queue import IngestionJobQueue
 from core.rag_system import RAGSystem
 
 
 APP_TITLE = "智慧问答助手"
 COMPANY_NAME = "北京城建设计院"
 LOGO_REL_PATH = Path("assets") / "logo_replace.png"
+JOB_POLL_SECONDS = 2.0
+FILE_PAGE_SIZE = 50
+JOB_STATUS_LABELS = {"queued": "排队中", "running": "处理中", "done": "已完成", "failed": "失败", "cancelled": "已取消"}
 
 
 def _img_to_data_uri(img_path: Path) -> str | None:
@@ -33,6 +38,8 @@ def create_gradio_ui():
     rag_system.initialize()
     
     doc_manager = DocumentManager(rag_system)
+    # 入库在后台线程执行，上传立即返回，不占用 Gradio 的请求处理
+    ingest_queue = IngestionJobQueue(doc_manager).start()
     chat_interface = ChatInterface(rag_system)
 
     def _coerce_to_text(val) -> str:
@@ -208,34 +215,85 @@ def create_gradio_ui():
         except Exception:
             return text
     
-    def format_file_list():
-        files = doc_manager.get_markdown_files()
-        if not files:
-            return "📭 知识库中暂无文档"
-        return "\n".join([f"{f}" for f in files])
+    def format_file_list(query="", page=1):
+        """Render one catalog page; returns (text, page, page info) for the list, page state and label."""
+        page = max(1, int(page or 1))
+        docs, total = doc_manager.list_documents(offset=(page - 1) * FILE_PAGE_SIZE, limit=FILE_PAGE_SIZE, query=query)
+        pages = max(1, -(-total // FILE_PAGE_SIZE))
+        if page > pages:
+            page = pages
+            docs, total = doc_manager.list_documents(offset=(page - 1) * FILE_PAGE_SIZE, limit=FILE_PAGE_SIZE, query=query)
+        if not docs:
+            text = "🔍 没有匹配的文档" if query else "📭 知识库中暂无文档"
+        else:
+            lines = []
+            for doc in docs:
+                details = []
+                if doc["page_count"]:
+                    details.append(f"{doc['page_count']} 页")
+                if doc["child_count"] is not None:
+                    details.append(f"父块 {doc['parent_count']} / 子块 {doc['child_count']}")
+                if doc["ingested_at"]:
+                    details.append(datetime.fromtimestamp(doc["ingested_at"]).strftime("%Y-%m-%d %H:%M"))
+                lines.append("  ".join([doc["original_name"], *details]))
+            text = "\n".join(lines)
+        return text, page, f"第 {page}/{pages} 页，共 {total} 个文档"
+    
+    def format_job_list():
+        jobs = ingest_queue.list_jobs(limit=10)
+        if not jobs:
+            return "暂无入库任务"
+        lines = []
+        for job in jobs:
+            line = (f"{job['id']}  {JOB_STATUS_LABELS.get(job['status'], job['status'])}  "
+                    f"{job['processed']}/{job['total']}  新增 {job['added']} | 跳过 {job['skipped']}")
+            if job["current"]:
+                line += f"  正在处理：{job['current']}"
+            if job["error"]:
+                line += f"  错误：{job['error']}"
+            lines.append(line)
+        return "\n".join(lines)
     
-    def upload_handler(files, progress=gr.Progress()):
+    def upload_handler(files):
         if not files:
-            return None, format_file_list()
-            
-        added, skipped = doc_manager.add_documents(
-            files, 
-            progress_callback=lambda p, desc: progress(p, desc=desc)
+            return None, format_job_list(), gr.update()
+        try:
+            job_id = ingest_queue.submit(files)
+        except ValueError as e:
+            gr.Warning(str(e))
+            return None, format_job_list(), gr.update()
+        gr.Info(f"📥 已提交入库任务，共 {len(files)} 个文件，将在后台处理")
+        return None, format_job_list(), job_id
+    
+    def cancel_job_handler(job_id):
+        job_id = (job_id or "").strip()
+        if job_id and ingest_queue.cancel(job_id):
+            gr.Info("已请求取消任务，当前文档处理完后停止")
+        else:
+            gr.Warning("未找到可取消的任务")
+        return format_job_list()
+    
+    def poll_jobs(query, page):
+        jobs = ingest_queue.list_jobs(limit=10)
+        # 仅在有任务进行中或刚结束时刷新文档列表
+        recently_active = any(
+            job["status"] == "running" or (job["finished_at"] and time.time() - job["finished_at"] < 2 * JOB_POLL_SECONDS)
+            for job in jobs
         )
-        
-        gr.Info(f"✅ 已添加：{added} | 已跳过：{skipped}")
-        return None, format_file_list()
+        if not recently_active:
+            return format_job_list(), gr.update(), gr.update(), gr.update()
+        return format_job_list(), *format_file_list(query, page)
     
     def clear_handler():
         doc_manager.clear_all()
         gr.Info("🗑️ 已删除所有文档")
         return format_file_list()
     
-    def chat_handler(msg, hist):
-        return chat_interface.chat(msg, hist)
+    def chat_handler(msg, hist, session_id=None):
+        return chat_interface.chat(msg, hist, session_id=session_id)
     
-    def clear_chat_handler():
-        chat_interface.clear_session()
+    def clear_chat_handler(session_id=None):
+        chat_interface.clear_session(session_id)
     
     repo_root = Path(__file__).resolve().parents[2]
     logo_path = repo_root / LOGO_REL_PATH
@@ -260,7 +318,7 @@ def create_gradio_ui():
         
         with gr.Tab("文档管理", elem_id="doc-management-tab"):
             gr.Markdown("## 添加新文档")
-            gr.Markdown("支持上传 PDF 或 Markdown 文件；重复文件将自动跳过。")
+            gr.Markdown("支持上传 PDF 或 Markdown 文件；重复文件将自动跳过。文件在后台入库，进度见下方任务列表。")
             
             files_input = gr.UploadButton(
                 label="选择 PDF/Markdown 文件并导入",
@@ -271,9 +329,25 @@ def create_gradio_ui():
                 file_types=[".pdf", ".md", ".markdown"],
             )
             
+            gr.Markdown("## 入库任务")
+            job_list = gr.Textbox(
+                value=format_job_list(),
+                interactive=False,
+                lines=4,
+                max_lines=10,
+                show_label=False
+            )
+            with gr.Row():
+                job_id_input = gr.Textbox(placeholder="任务 ID", show_label=False, scale=4)
+                cancel_job_btn = gr.Button("取消任务", size="md", scale=1)
+            job_timer = gr.Timer(JOB_POLL_SECONDS)
+            
             gr.Markdown("## 知识库当前文档")
+            initial_files, _, initial_page_info = format_file_list()
+            file_search = gr.Textbox(placeholder="按文件名搜索", show_label=False)
+            file_page = gr.State(1)
             file_list = gr.Textbox(
-                value=format_file_list(),
+                value=initial_files,
                 interactive=False,
                 lines = 7,
                 max_lines=10,
@@ -281,6 +355,11 @@ def create_gradio_ui():
                 show_label=False
             )
             
+            with gr.Row():
+                prev_page_btn = gr.Button("上一页", size="md")
+                page_info = gr.Markdown(initial_page_info)
+                next_page_btn = gr.Button("下一页", size="md")
+            
             with gr.Row():
                 refresh_btn = gr.Button("刷新列表", size="md")
                 clear_btn = gr.Button("清空全部", variant="stop", size="md")
@@ -288,19 +367,27 @@ def create_gradio_ui():
             files_input.upload(
                 upload_handler,
                 [files_input],
-                [files_input, file_list],
+                [files_input, job_list, job_id_input],
                 show_progress="corner",
             )
-            refresh_btn.click(format_file_list, None, file_list)
-            clear_btn.click(clear_handler, None, file_list)
+            cancel_job_btn.click(cancel_job_handler, [job_id_input], job_list)
+            file_outputs = [file_list, file_page, page_info]
+            job_timer.tick(poll_jobs, [file_search, file_page], [job_list, *file_outputs], show_progress="hidden")
+            file_search.submit(lambda q: format_file_list(q, 1), [file_search], file_outputs)
+            prev_page_btn.click(lambda q, p: format_file_list(q, p - 1), [file_search, file_page], file_outputs)
+            next_page_btn.click(lambda q, p: format_file_list(q, p + 1), [file_search, file_page], file_outputs)
+            refresh_btn.click(format_file_list, [file_search, file_page], file_outputs)
+            clear_btn.click(clear_handler, None, file_outputs)
         
         with gr.Tab("对话"):
+            # 每个浏览器会话独立的对话记忆（LangGraph thread_id），并发用户互不干扰
+            session_id = gr.State(lambda: str(uuid.uuid4()))
             chatbot = gr.Chatbot(
                 height=600, 
                 placeholder="可以围绕已上传的知识库文档向我提问。",
                 show_label=False,
             )
-            chatbot.clear(clear_chat_handler)
+            chatbot.clear(clear_chat_handler, inputs=[session_id])
 
             msg = gr.Textbox(
                 placeholder="请输入你的问题（将基于知识库文档作答）",
@@ -320,19 +407,19 @@ def create_gradio_ui():
             else:
                 download_xlsx = gr.File(label="下载xlsx", interactive=False, visible=False)
 
-            def _respond(user_message, history):
+            def _respond(user_message, history, session):
                 text = (user_message or "").strip()
                 if not text:
                     return "", history, gr.update(visible=False, value=None)
-                bot = chat_handler(text, history)
+                bot = chat_handler(text, history, session)
                 new_history = list(history or [])
                 new_history.append({"role": "user", "content": text})
                 new_history.append({"role": "assistant", "content": bot})
                 # 新消息发送后，隐藏旧的下载，避免误下旧文件
                 return "", new_history, gr.update(visible=False, value=None)
 
-            def _clear_chat():
-                clear_chat_handler()
+            def _clear_chat(session):
+                clear_chat_handler(session)
                 return [], gr.update(visible=False, value=None)
 
             def _export_last_answer_to_xlsx(history):
@@ -357,9 +444,9 @@ def create_gradio_ui():
                 gr.Info("✅ 已生成（智能整理）xlsx，可点击下载。")
                 return gr.update(value=str(out_path), visible=True)
 
-            send_btn.click(_respond, inputs=[msg, chatbot], outputs=[msg, chatbot, download_xlsx])
-            msg.submit(_respond, inputs=[msg, chatbot], outputs=[msg, chatbot, download_xlsx])
-            clear_chat_btn.click(_clear_chat, inputs=None, outputs=[chatbot, download_xlsx])
+            send_btn.click(_respond, inputs=[msg, chatbot, session_id], outputs=[msg, chatbot, download_xlsx], api_name="chat")
+            msg.submit(_respond, inputs=[msg, chatbot, session_id], outputs=[msg, chatbot, download_xlsx], api_name=False)
+            clear_chat_btn.click(_clear_chat, inputs=[session_id], outputs=[chatbot, download_xlsx], api_name="clear_chat")
             export_xlsx_btn.click(_export_last_answer_to_xlsx, inputs=[chatbot], outputs=[download_xlsx])
             smart_export_xlsx_btn.click(_smart_export_last_answer_to_xlsx, inputs=[chatbot], outputs=[download_xlsx])
 